@@ -217,10 +217,13 @@ class PageViewAdmin(admin.ModelAdmin):
 
 @admin.register(AssistantQuestion)
 class AssistantQuestionAdmin(admin.ModelAdmin):
-    list_display = ['content_short', 'created_at']
-    list_filter = ['created_at']
-    search_fields = ['content']
-    readonly_fields = ['content', 'created_at']
+    list_display = ['content_short', 'source', 'approved', 'latency_ms', 'created_at']
+    list_filter = ['source', 'approved', 'cache_hit', 'created_at']
+    list_editable = ['approved']
+    search_fields = ['content', 'answer']
+    readonly_fields = ['content', 'source', 'cache_hit', 'latency_ms', 'prompt_tokens', 'completion_tokens', 'created_at']
+    fields = ['content', 'answer', 'approved', 'source', 'cache_hit', 'latency_ms', 'prompt_tokens', 'completion_tokens',
+              'created_at']
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
 
@@ -0,0 +1,586 @@
+"""
+Appels à l'API de l'assistant (DeepSeek, format OpenAI chat/completions).
+Les connexions HTTP sont réutilisées (keep-alive) : une session requests partagée pour la vue
+synchrone (WSGI), un client httpx.AsyncClient par boucle d'événements pour la vue asynchrone (ASGI),
+qui n'occupe aucun worker pendant l'attente de la réponse du modèle.
+En mode flux (stream), les fragments de réponse du modèle (SSE « data: ») sont relayés au fur et à mesure
+au navigateur en NDJSON : une ligne {"delta": "..."} par fragment, puis {"done": true} ou {"error": "..."}.
+L'historique envoyé par le navigateur est compacté avant l'appel (compact_history) : prompt système et derniers
+échanges conservés tels quels, échanges plus anciens résumés, messages tronqués, budget en jetons et en octets.
+Les réponses du modèle sont gardées dans un cache LRU en mémoire (ResponseCache), indexé par la conversation
+normalisée et la version du prompt système.
+Les appels au modèle passent par UpstreamCall : nombre d'appels simultanés borné (ASSISTANT_MAX_IN_FLIGHT)
+et disjoncteur (core.circuit) ; service saturé ou en panne, le visiteur reçoit aussitôt UNAVAILABLE_MESSAGE
+au lieu d'attendre la fin du délai.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+import weakref
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+
+from .circuit import CircuitBreaker
+
+# Prompt système pour l'assistant FASOWEB (DeepSeek) - orienté conversion
+ASSISTANT_SYSTEM_PROMPT = """Tu es l'assistant commercial de FASOWEB, agence web au Burkina Faso (Ouagadougou, Bobo-Dioulasso). Ton objectif : aider au maximum ET convertir les visiteurs en clients.
+
+Ton rôle :
+- Répondre à toutes les questions : sites vitrine, e-commerce, SEO, refonte, maintenance, tarifs, délais, processus.
+- Donner des fourchettes de prix indicatives quand on te demande : site vitrine (souvent entre 200 000 et 800 000 FCFA selon la complexité), e-commerce (à partir d’environ 500 000 FCFA), SEO / accompagnement (forfaits selon objectifs). Toujours préciser que ces montants sont indicatifs et qu’un devis gratuit permet un chiffrage précis.
+- Rappeler que l’accompagnement FASOWEB est continu et illimité après livraison : support, conseils, évolutions, pas de limite dans le temps pour nos clients.
+- Inciter à nous contacter pour un devis personnalisé : formulaire sur le site, WhatsApp, email, téléphone. Proposer d’ouvrir le formulaire de devis ou de discuter sur WhatsApp pour aller plus loin.
+
+Règles : Réponds en français, concis et chaleureux. À la fin de CHAQUE réponse, invite à cliquer sur « Demander un devis gratuit » ou « Écrire sur WhatsApp » en bas du chat. Chaque réponse doit aider ET inciter à passer à l'action."""
+
+DEFAULT_API_URL = 'https://api.deepseek.com/v1/chat/completions'
+UNAVAILABLE_MESSAGE = 'Service temporairement indisponible. Vous pouvez nous contacter directement.'
+
+
+class AssistantError(Exception):
+    """Erreur à renvoyer au client : message, statut HTTP et éventuel délai avant nouvel essai (s)."""
+
+    def __init__(self, message, status=502, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+
+# Au-delà, les messages plus anciens de l'historique reçu ne sont même pas lus
+MAX_HISTORY_MESSAGES = 100
+SUMMARY_PREFIX = 'Résumé des échanges précédents avec ce visiteur. Questions déjà posées : '
+SUMMARY_QUESTION_CHARS = 150
+
+
+def build_messages(body):
+    """
+    Construit la liste des messages pour l'API depuis le corps JSON de la requête :
+    { "message": "..." } ou { "messages": [ { "role": "user", "content": "..." } ] }.
+    L'historique est compacté selon le budget (compact_history).
+    """
+    messages = [{'role': 'system', 'content': ASSISTANT_SYSTEM_PROMPT}]
+    if 'messages' in body and isinstance(body['messages'], list):
+        for m in body['messages'][-MAX_HISTORY_MESSAGES:]:
+            if isinstance(m, dict) and m.get('role') in ('user', 'assistant') and isinstance(m.get('content'), str) \
+                    and m['content'].strip():
+                messages.append({'role': m['role'], 'content': m['content'].strip()})
+    elif body.get('message'):
+        messages.append({'role': 'user', 'content': str(body['message']).strip()})
+    else:
+        raise AssistantError('Message manquant.', status=400)
+    if not any(m.get('role') == 'user' for m in messages[1:]):
+        raise AssistantError('Aucun message utilisateur.', status=400)
+    return compact_history(messages)
+
+
+def estimate_tokens(text):
+    """Estimation grossière du nombre de jetons (environ 4 caractères par jeton)."""
+    return len(text) // 4 + 1
+
+
+def payload_size(messages):
+    """Taille de la requête envoyée au modèle : (octets, jetons estimés)."""
+    size = len(json.dumps(build_payload(messages), ensure_ascii=False).encode('utf-8'))
+    return size, sum(estimate_tokens(m['content']) for m in messages)
+
+
+def _truncate(text, max_chars):
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + ' […]'
+
+
+def summarize_turns(turns):
+    """Résumé extractif des échanges retirés : les questions du visiteur, raccourcies."""
+    questions = [_truncate(m['content'], SUMMARY_QUESTION_CHARS) for m in turns if m['role'] == 'user']
+    if not questions:
+        return None
+    return {'role': 'system', 'content': SUMMARY_PREFIX + ' ; '.join(questions)}
+
+
+def compact_history(messages):
+    """
+    Applique le budget d'historique à une liste [prompt système, messages...] :
+    - chaque message est tronqué à ASSISTANT_MAX_MESSAGE_CHARS caractères ;
+    - les ASSISTANT_HISTORY_TURNS derniers messages sont gardés, les plus anciens remplacés par un résumé ;
+    - tant que ASSISTANT_HISTORY_MAX_TOKENS ou ASSISTANT_HISTORY_MAX_BYTES est dépassé, les plus anciens
+      messages (résumé compris) sont retirés ; le dernier message du visiteur est toujours gardé.
+    """
+    max_chars = getattr(settings, 'ASSISTANT_MAX_MESSAGE_CHARS', 2000)
+    keep = max(1, getattr(settings, 'ASSISTANT_HISTORY_TURNS', 8))
+    max_tokens = getattr(settings, 'ASSISTANT_HISTORY_MAX_TOKENS', 3000)
+    max_bytes = getattr(settings, 'ASSISTANT_HISTORY_MAX_BYTES', 32000)
+
+    system, history = messages[0], [
+        {'role': m['role'], 'content': _truncate(m['content'], max_chars)} for m in messages[1:]
+    ]
+    older, history = history[:-keep], history[-keep:]
+    # Les échanges gardés commencent par une question du visiteur
+    while len(history) > 1 and history[0]['role'] == 'assistant':
+        older.append(history.pop(0))
+    summary = summarize_turns(older)
+    if summary is not None:
+        summary['content'] = _truncate(summary['content'], max_chars)
+        history.insert(0, summary)
+
+    compacted = [system] + history
+    while len(compacted) > 2:
+        size, tokens = payload_size(compacted)
+        if size <= max_bytes and tokens <= max_tokens:
+            break
+        del compacted[1]
+    return compacted
+
+
+def last_user_message(messages):
+    return next((m.get('content', '') for m in reversed(messages[1:]) if m.get('role') == 'user'), '').strip()
+
+
+def build_payload(messages, stream=False):
+    payload = {
+        'model': 'deepseek-chat',
+        'messages': messages,
+        'max_tokens': 1024,
+        'temperature': 0.7,
+    }
+    if stream:
+        payload['stream'] = True
+        # Dernier fragment : consommation en jetons (usage)
+        payload['stream_options'] = {'include_usage': True}
+    return payload
+
+
+# Version du prompt et des paramètres du modèle : toute modification invalide le cache des réponses
+PROMPT_VERSION = hashlib.blake2b(
+    json.dumps([ASSISTANT_SYSTEM_PROMPT, build_payload([])], sort_keys=True).encode('utf-8'), digest_size=8,
+).hexdigest()
+
+_SPACES_RE = re.compile(r'\s+')
+_PUNCT_SPACES_RE = re.compile(r'\s+([?!.,;:])')
+
+
+def normalize_text(text):
+    """Minuscules, sans accents, espaces réduits, ponctuation finale retirée."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCT_SPACES_RE.sub(r'\1', _SPACES_RE.sub(' ', text).strip())
+    return text.rstrip('?!. ')
+
+
+def conversation_key(messages):
+    """Clé de cache d'une conversation (hors prompt système, en tête de liste), préfixée par la version du prompt."""
+    turns = [f'{m["role"]}:{normalize_text(m["content"])}' for m in messages[1:]]
+    digest = hashlib.blake2b('\n'.join(turns).encode('utf-8'), digest_size=16).hexdigest()
+    return f'{PROMPT_VERSION}:{digest}'
+
+
+class ResponseCache:
+    """Cache LRU borné avec durée de vie, partagé par les threads du processus."""
+
+    def __init__(self, max_size=1000, ttl=86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Cache des réponses du processus, ou None si désactivé (ASSISTANT_RESPONSE_CACHE_SIZE = 0)."""
+    global _response_cache
+    size = getattr(settings, 'ASSISTANT_RESPONSE_CACHE_SIZE', 1000)
+    if not size:
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(size, getattr(settings, 'ASSISTANT_RESPONSE_CACHE_TTL', 86400))
+    return _response_cache
+
+
+def cached_response(messages):
+    response_cache = get_response_cache()
+    return response_cache.get(conversation_key(messages)) if response_cache is not None else None
+
+
+def cache_response(messages, content):
+    response_cache = get_response_cache()
+    if response_cache is not None and content:
+        response_cache.set(conversation_key(messages), content)
+
+
+def _headers(api_key):
+    return {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json',
+    }
+
+
+def _api_url():
+    return getattr(settings, 'DEEPSEEK_API_URL', DEFAULT_API_URL)
+
+
+def _timeout():
+    return getattr(settings, 'ASSISTANT_HTTP_TIMEOUT', 60)
+
+
+def parse_completion(data):
+    """Extrait le texte de la réponse de l'API."""
+    choice = (data.get('choices') or [None])[0]
+    if not choice or 'message' not in choice:
+        raise AssistantError('Réponse invalide du service.')
+    return (choice.get('message') or {}).get('content') or ''
+
+
+def parse_usage(data):
+    """Jetons consommés d'après le champ usage de la réponse (None si absent)."""
+    usage = data.get('usage') if isinstance(data.get('usage'), dict) else {}
+    return {'prompt_tokens': usage.get('prompt_tokens'), 'completion_tokens': usage.get('completion_tokens')}
+
+
+STREAM_DONE = object()
+
+
+def parse_stream_line(line, meta=None):
+    """
+    Interprète une ligne du flux SSE du modèle : texte du fragment, STREAM_DONE en fin de flux,
+    None pour les lignes sans texte (commentaires, rôle, lignes vides).
+    La consommation en jetons du dernier fragment est reportée dans meta.
+    """
+    if not line.startswith('data:'):
+        return None
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return STREAM_DONE
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return None
+    if meta is not None and chunk.get('usage'):
+        meta.update(parse_usage(chunk))
+    choice = (chunk.get('choices') or [None])[0] or {}
+    return (choice.get('delta') or {}).get('content') or None
+
+
+def ndjson_line(**data):
+    return json.dumps(data, ensure_ascii=False) + '\n'
+
+
+def _http_error(status_code, err_body, exc):
+    # Erreur HTTP (401, 429, 500...) : récupérer le détail si possible
+    try:
+        err_msg = err_body.get('error', {}).get('message', str(exc)) if isinstance(err_body.get('error'), dict) else str(exc)
+    except Exception:
+        err_msg = str(exc)
+    if settings.DEBUG:
+        return AssistantError(
+            f'Erreur API DeepSeek ({status_code or "?"}): {err_msg}. Contactez-nous si le problème persiste.'
+        )
+    return AssistantError(UNAVAILABLE_MESSAGE)
+
+
+def _connection_error(exc):
+    if settings.DEBUG:
+        return AssistantError(f'Connexion impossible: {str(exc)}. Vérifiez votre connexion ou réessayez plus tard.')
+    return AssistantError(UNAVAILABLE_MESSAGE)
+
+
+# --- Limitation des appels simultanés et disjoncteur ---
+
+_slots = None
+_breaker = None
+_guard_lock = threading.Lock()
+
+
+def get_slots():
+    """Sémaphore des appels en cours vers le modèle (par processus, partagé par WSGI et ASGI)."""
+    global _slots
+    if _slots is None:
+        with _guard_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(getattr(settings, 'ASSISTANT_MAX_IN_FLIGHT', 50))
+    return _slots
+
+
+def get_breaker():
+    global _breaker
+    if _breaker is None:
+        with _guard_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    failure_threshold=getattr(settings, 'ASSISTANT_BREAKER_FAILURES', 5),
+                    reset_timeout=getattr(settings, 'ASSISTANT_BREAKER_RESET', 30),
+                    slow_call=getattr(settings, 'ASSISTANT_BREAKER_SLOW_CALL', 20),
+                )
+    return _breaker
+
+
+class UpstreamCall:
+    """
+    Un appel au modèle : réserve une place parmi les appels simultanés et consulte le disjoncteur,
+    sinon lève AssistantError(UNAVAILABLE_MESSAGE, 503) sans attendre. Utilisable en bloc with
+    (succès ou échec selon l'exception) ou à la main pour les flux (succeeded / failed puis release).
+    """
+
+    def __init__(self):
+        self._slots = get_slots()
+        self._breaker = get_breaker()
+        if not self._slots.acquire(blocking=False):
+            raise AssistantError(UNAVAILABLE_MESSAGE, status=503)
+        if not self._breaker.allow():
+            self._slots.release()
+            raise AssistantError(UNAVAILABLE_MESSAGE, status=503)
+        self._released = False
+        self._start = time.monotonic()
+
+    def succeeded(self):
+        self._breaker.record_success(time.monotonic() - self._start)
+
+    def failed(self):
+        self._breaker.record_failure()
+
+    def elapsed_ms(self):
+        return int((time.monotonic() - self._start) * 1000)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._slots.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.succeeded()
+        else:
+            self.failed()
+        self.release()
+
+
+# --- Client synchrone (WSGI) ---
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Session requests partagée par le processus (pool de connexions keep-alive)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                size = getattr(settings, 'ASSISTANT_HTTP_POOL_SIZE', 20)
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def complete(messages, api_key, meta=None):
+    """
+    Appel synchrone : retourne le texte de la réponse ou lève AssistantError.
+    meta (dict) reçoit la durée de l'appel (latency_ms) et les jetons consommés.
+    """
+    with UpstreamCall() as call:
+        try:
+            r = get_session().post(_api_url(), headers=_headers(api_key), json=build_payload(messages),
+                                   timeout=_timeout())
+            r.raise_for_status()
+            data = r.json()
+        except requests.HTTPError as e:
+            try:
+                err_body = e.response.json() if e.response is not None else {}
+            except Exception:
+                err_body = {}
+            raise _http_error(e.response.status_code if e.response is not None else None, err_body, e)
+        except requests.RequestException as e:
+            raise _connection_error(e)
+        content = parse_completion(data)
+    if meta is not None:
+        meta.update(parse_usage(data), latency_ms=call.elapsed_ms())
+    return content
+
+
+def open_stream(messages, api_key, meta=None):
+    """
+    Ouvre la réponse en flux du modèle (erreurs HTTP levées en AssistantError avant tout envoi
+    au navigateur) et retourne le générateur de lignes NDJSON.
+    La place d'appel simultané est gardée jusqu'à la fin du flux ; le disjoncteur juge le délai de la première réponse.
+    """
+    call = UpstreamCall()
+    try:
+        r = get_session().post(_api_url(), headers=_headers(api_key), json=build_payload(messages, stream=True),
+                               timeout=_timeout(), stream=True)
+        r.raise_for_status()
+    except requests.HTTPError as e:
+        call.failed()
+        call.release()
+        try:
+            err_body = e.response.json() if e.response is not None else {}
+        except Exception:
+            err_body = {}
+        raise _http_error(e.response.status_code if e.response is not None else None, err_body, e)
+    except requests.RequestException as e:
+        call.failed()
+        call.release()
+        raise _connection_error(e)
+    call.succeeded()
+
+    def relay():
+        try:
+            # chunk_size=None : chaque fragment est relayé dès sa réception
+            for line in r.iter_lines(chunk_size=None, decode_unicode=True):
+                delta = parse_stream_line(line or '', meta)
+                if delta is STREAM_DONE:
+                    break
+                if delta:
+                    yield ndjson_line(delta=delta)
+            if meta is not None:
+                meta['latency_ms'] = call.elapsed_ms()
+            yield ndjson_line(done=True)
+        except requests.RequestException:
+            call.failed()
+            yield ndjson_line(error=UNAVAILABLE_MESSAGE)
+        finally:
+            r.close()
+            call.release()
+    lines = relay()
+    # Flux jamais lu (navigateur parti avant le premier fragment) : libérer la place quand même
+    weakref.finalize(lines, call.release)
+    return lines
+
+
+# --- Client asynchrone (ASGI) ---
+
+# Un client par boucle d'événements : un AsyncClient ne peut pas être partagé entre boucles
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Client httpx partagé par la boucle courante (pool de connexions keep-alive)."""
+    import asyncio
+
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(
+            max_connections=getattr(settings, 'ASSISTANT_HTTP_MAX_CONNECTIONS', 500),
+            max_keepalive_connections=getattr(settings, 'ASSISTANT_HTTP_POOL_SIZE', 20),
+        )
+        client = httpx.AsyncClient(limits=limits, timeout=_timeout())
+        _async_clients[loop] = client
+    return client
+
+
+async def acomplete(messages, api_key, meta=None):
+    """Appel asynchrone : retourne le texte de la réponse ou lève AssistantError (meta : voir complete)."""
+    import httpx
+
+    with UpstreamCall() as call:
+        try:
+            r = await get_async_client().post(_api_url(), headers=_headers(api_key), json=build_payload(messages))
+            r.raise_for_status()
+            data = r.json()
+        except httpx.HTTPStatusError as e:
+            try:
+                err_body = e.response.json()
+            except Exception:
+                err_body = {}
+            raise _http_error(e.response.status_code, err_body, e)
+        except httpx.HTTPError as e:
+            raise _connection_error(e)
+        content = parse_completion(data)
+    if meta is not None:
+        meta.update(parse_usage(data), latency_ms=call.elapsed_ms())
+    return content
+
+
+async def aopen_stream(messages, api_key, meta=None):
+    """Version asynchrone de open_stream : retourne un générateur asynchrone de lignes NDJSON."""
+    import httpx
+
+    client = get_async_client()
+    request = client.build_request('POST', _api_url(), headers=_headers(api_key),
+                                   json=build_payload(messages, stream=True))
+    call = UpstreamCall()
+    try:
+        r = await client.send(request, stream=True)
+    except BaseException as e:
+        call.failed()
+        call.release()
+        if isinstance(e, httpx.HTTPError):
+            raise _connection_error(e)
+        raise
+    if r.is_error:
+        call.failed()
+        call.release()
+        try:
+            await r.aread()
+            err_body = r.json()
+        except Exception:
+            err_body = {}
+        await r.aclose()
+        raise _http_error(r.status_code, err_body, httpx.HTTPStatusError(f'HTTP {r.status_code}', request=request, response=r))
+    call.succeeded()
+
+    async def relay():
+        try:
+            async for line in r.aiter_lines():
+                delta = parse_stream_line(line, meta)
+                if delta is STREAM_DONE:
+                    break
+                if delta:
+                    yield ndjson_line(delta=delta)
+            if meta is not None:
+                meta['latency_ms'] = call.elapsed_ms()
+            yield ndjson_line(done=True)
+        except httpx.HTTPError:
+            call.failed()
+            yield ndjson_line(error=UNAVAILABLE_MESSAGE)
+        finally:
+            await r.aclose()
+            call.release()
+    lines = relay()
+    weakref.finalize(lines, call.release)
+    return lines
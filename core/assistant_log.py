@@ -0,0 +1,85 @@
+"""
+Journal des questions posées à l'assistant (AssistantQuestion).
+Chaque échange est enregistré une seule fois, à la fin, avec la réponse, la source, la durée de l'appel
+au modèle et les jetons consommés. Deux modes d'écriture (réglage ASSISTANT_LOG_MODE) :
+- 'buffered' : l'enregistrement est déposé dans un tampon en mémoire vidé en arrière-plan par lots
+  (bulk_create) : aucune écriture en base pendant la réponse au visiteur ;
+- 'sync' : insertion immédiate.
+"""
+import threading
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .buffers import BufferedWriter
+from .models import AssistantQuestion
+
+QuestionRecord = namedtuple(
+    'QuestionRecord', 'content answer source cache_hit latency_ms prompt_tokens completion_tokens',
+)
+
+
+def _question(record):
+    return AssistantQuestion(
+        content=record.content,
+        answer=record.answer or '',
+        source=record.source,
+        cache_hit=record.cache_hit,
+        latency_ms=record.latency_ms,
+        prompt_tokens=record.prompt_tokens,
+        completion_tokens=record.completion_tokens,
+    )
+
+
+def save_questions(records):
+    """Enregistre un lot de questions (QuestionRecord) en une seule insertion."""
+    return AssistantQuestion.objects.bulk_create([_question(record) for record in records])
+
+
+_question_buffer = None
+_question_buffer_lock = threading.Lock()
+
+
+def get_question_buffer():
+    """Tampon des questions du processus (créé au premier appel, réglages ASSISTANT_LOG_*)."""
+    global _question_buffer
+    if _question_buffer is None:
+        with _question_buffer_lock:
+            if _question_buffer is None:
+                _question_buffer = BufferedWriter(
+                    save_questions,
+                    max_size=getattr(settings, 'ASSISTANT_LOG_BUFFER_MAX_SIZE', 10000),
+                    batch_size=getattr(settings, 'ASSISTANT_LOG_BUFFER_BATCH_SIZE', 50),
+                    interval_ms=getattr(settings, 'ASSISTANT_LOG_FLUSH_INTERVAL_MS', 2000),
+                    name='assistant-question-buffer',
+                )
+    return _question_buffer
+
+
+def log_question(content, answer='', source=AssistantQuestion.SOURCE_LLM, meta=None):
+    """Enregistre un échange ; meta : latency_ms, prompt_tokens, completion_tokens (voir core.assistant.complete)."""
+    if not content:
+        return
+    meta = meta or {}
+    record = QuestionRecord(
+        content=content,
+        answer=answer,
+        source=source,
+        cache_hit=source == AssistantQuestion.SOURCE_CACHE,
+        latency_ms=meta.get('latency_ms'),
+        prompt_tokens=meta.get('prompt_tokens'),
+        completion_tokens=meta.get('completion_tokens'),
+    )
+    if getattr(settings, 'ASSISTANT_LOG_MODE', 'buffered') == 'buffered':
+        get_question_buffer().put(record)
+    else:
+        save_questions([record])
+
+
+async def alog_question(content, answer='', source=AssistantQuestion.SOURCE_LLM, meta=None):
+    """Version asynchrone : le dépôt dans le tampon ne bloque pas, seule l'insertion immédiate passe par un thread."""
+    if getattr(settings, 'ASSISTANT_LOG_MODE', 'buffered') == 'buffered':
+        log_question(content, answer, source, meta)
+    else:
+        await sync_to_async(log_question)(content, answer, source, meta)
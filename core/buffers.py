@@ -0,0 +1,113 @@
+"""
+Tampon d'écriture en mémoire, vidé en arrière-plan.
+Les producteurs (middleware, vues) déposent des enregistrements compacts dans une file bornée ;
+un thread dédié les vide par lots (toutes les N entrées ou toutes les M millisecondes)
+via une fonction d'écriture (typiquement un bulk_create). Si la file est pleine, l'enregistrement
+est abandonné et compté, plutôt que de bloquer la requête. Vidage garanti à l'arrêt du worker (atexit).
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """File bornée + thread de vidage périodique."""
+
+    def __init__(self, flush_func, max_size=10000, batch_size=100, interval_ms=1000, name='buffered-writer'):
+        self.flush_func = flush_func
+        self.batch_size = max(1, batch_size)
+        self.interval = max(interval_ms, 1) / 1000.0
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_size)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+        self.flushed = 0
+
+    def start(self):
+        """Démarre le thread de vidage (idempotent)."""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def put(self, record):
+        """
+        Dépose un enregistrement sans jamais bloquer.
+        Retourne False si la file est pleine (l'enregistrement est abandonné et compté).
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Vide la file dans le thread appelant. Retourne le nombre d'enregistrements écrits."""
+        total = 0
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+                try:
+                    self.flush_func(batch)
+                    total += len(batch)
+                except Exception:
+                    logger.exception('%s : échec d\'écriture d\'un lot de %d enregistrements', self.name, len(batch))
+        if total:
+            with self._stats_lock:
+                self.flushed += total
+        return total
+
+    def close(self):
+        """Arrête le thread et vide ce qui reste (appelé à l'arrêt du worker)."""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=max(self.interval * 2, 5))
+        self.flush()
+
+    def stats(self):
+        """Compteurs du tampon (pour supervision)."""
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'dropped': self.dropped,
+                'flushed': self.flushed,
+            }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.flush()
+            finally:
+                # Le thread garde sa propre connexion : la recycler si elle est périmée
+                close_old_connections()
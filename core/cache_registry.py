@@ -0,0 +1,135 @@
+"""
+Registre des dépendances de cache : chaque vue ou fragment mis en cache déclare les modèles qu'il lit.
+Chaque modèle a une version dans le cache Django (tag « model:<nom> ») : l'heure (ns) de sa dernière
+modification, posée à chaque enregistrement ou suppression par les signaux branchés par connect_signals
+(core.signals). Une écriture coûte une seule écriture en cache, quel que soit le nombre d'entrées qui en dépendent.
+Une entrée mise en cache garde les versions des tags dont elle dépend ; si l'une a changé depuis,
+l'entrée est périmée. Aucun parcours ni suppression de clés.
+La plus grande version d'une vue sert aussi de date de dernière modification (Last-Modified, core.pagecache).
+Chaque modification envoie aussi le signal content_changed (purge du proxy : core.httpcache).
+Les versions doivent vivre dans un cache partagé entre les workers (réglage CACHE_BACKEND : Redis ou table en base) :
+avec un cache propre à chaque processus, une modification faite par un worker ne périme rien chez les autres.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal
+
+# nom de la vue (url_name) ou du fragment → (modèles lus, fragments inclus)
+DEPENDENCIES = {}
+
+_resolved = {}
+
+# Envoyé après chaque changement de version (argument model_name)
+content_changed = Signal()
+
+
+def register(name, models=(), includes=()):
+    DEPENDENCIES[name] = (tuple(models), tuple(includes))
+    _resolved.clear()
+
+
+def models_for(name):
+    """Modèles lus par une vue ou un fragment, fragments inclus compris (triés, sans doublon)."""
+    if name not in _resolved:
+        models, includes = DEPENDENCIES[name]
+        found = set(models)
+        for include in includes:
+            found.update(models_for(include))
+        _resolved[name] = tuple(sorted(found))
+    return _resolved[name]
+
+
+def tag(model_name):
+    return f'model:{model_name.lower()}'
+
+
+def tags_for(name):
+    return [tag(model_name) for model_name in models_for(name)]
+
+
+def version_key(tag_name):
+    return f'cache_version:{tag_name}'
+
+
+def version_keys(name):
+    return [version_key(tag_name) for tag_name in tags_for(name)]
+
+
+def versions(name, found=None):
+    """
+    Versions courantes des tags de name, dans l'ordre de tags_for.
+    found : résultat d'un get_many contenant déjà version_keys(name) (un seul aller-retour pour l'appelant).
+    """
+    keys = version_keys(name)
+    if found is None:
+        found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # Version inconnue (cache vidé, jamais écrite) : la date du jour, postérieure à toute version déjà vue
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        found = {**found, **cache.get_many(missing)}
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def last_modified(version_tuple):
+    """Date de dernière modification (timestamp en secondes) correspondant à des versions."""
+    return max(version_tuple, default=0) / 1e9
+
+
+def bump(model_name):
+    """Périme toutes les entrées qui dépendent du modèle (O(1))."""
+    cache.set(version_key(tag(model_name)), time.time_ns(), None)
+    content_changed.send(sender=bump, model_name=model_name)
+
+
+def watched_models():
+    return sorted({model_name for models, _ in DEPENDENCIES.values() for model_name in models})
+
+
+def _model_changed(sender, **kwargs):
+    bump(sender.__name__)
+
+
+def _relation_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump(type(instance).__name__)
+
+
+def connect_signals():
+    """Branche post_save / post_delete (et m2m_changed des relations) de chaque modèle surveillé."""
+    from django.apps import apps
+
+    for model_name in watched_models():
+        model = apps.get_model('core', model_name)
+        uid = f'cache_registry_{model_name}'
+        post_save.connect(_model_changed, sender=model, dispatch_uid=f'{uid}_save')
+        post_delete.connect(_model_changed, sender=model, dispatch_uid=f'{uid}_delete')
+        for field in model._meta.many_to_many:
+            m2m_changed.connect(_relation_changed, sender=field.remote_field.through,
+                                dispatch_uid=f'{uid}_{field.name}')
+
+
+# Fragments présents sur toutes les pages (menu, pied de page, bouton WhatsApp : core.context_processors)
+register('navigation', ['Service', 'WhatsAppConfig'])
+
+# Pages publiques (url_name)
+register('home', ['Testimonial', 'Partner', 'Portfolio', 'Technology', 'Service', 'AnonymousCTA', 'PageBanner', 'FAQ'],
+         includes=['navigation'])
+register('services_list', ['Service', 'CompanyStats'], includes=['navigation'])
+register('service_detail', ['Service', 'PageBanner'], includes=['navigation'])
+register('maintenance_page', ['Service', 'PageBanner'], includes=['navigation'])
+register('about', ['TeamMember', 'CompanyStats'], includes=['navigation'])
+register('team', ['TeamMember'], includes=['navigation'])
+register('blog_list', ['Article', 'Category', 'Tag'], includes=['navigation'])
+register('blog_detail', ['Article', 'Category', 'Tag'], includes=['navigation'])
+register('blog_category', ['Article', 'Category', 'Tag'], includes=['navigation'])
+register('blog_tag', ['Article', 'Category', 'Tag'], includes=['navigation'])
+register('seo_ouagadougou', includes=['navigation'])
+register('seo_bobo', includes=['navigation'])
+register('legal', includes=['navigation'])
+register('privacy', includes=['navigation'])
+register('django.contrib.sitemaps.views.sitemap', ['Article', 'Service'])
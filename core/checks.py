@@ -0,0 +1,39 @@
+"""
+Contrôles au démarrage (manage.py check, runserver, déploiement) des réglages dont l'erreur passerait inaperçue.
+"""
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Warning, register
+
+from .ratelimit import has_atomic_backend
+
+
+@register()
+def check_rate_limit_cache(app_configs, **kwargs):
+    """Limiteur de l'assistant (core.ratelimit) : le cache doit permettre une mise à jour atomique du seau."""
+    backend = caches['default']
+    if has_atomic_backend(backend):
+        return []
+    return [Warning(
+        f'Le cache {type(backend).__name__} ne permet pas de mise à jour atomique : '
+        'des appels simultanés peuvent dépasser les limites de l\'assistant.',
+        hint='CACHE_BACKEND=redis (REDIS_URL), ou CACHE_BACKEND=db avec SQLite en transactions IMMEDIATE.',
+        id='core.W001',
+    )]
+
+
+@register()
+def check_geoip_database(app_configs, **kwargs):
+    """Base GeoIP locale (core.geoip) : absente, les visites sont enregistrées sans pays ni ville."""
+    path = getattr(settings, 'GEOIP_DATABASE_PATH', '')
+    if getattr(settings, 'GEOIP_BACKEND', 'local') != 'local' or (path and os.path.isfile(path)):
+        return []
+    return [Warning(
+        f'Base GeoIP locale introuvable ({path or "GEOIP_DATABASE_PATH vide"}) : '
+        'les visites seront enregistrées sans pays ni ville.',
+        hint='Télécharger la base (INSTALLATION_PRODUCTION.md, « Installer la base de géolocalisation ») '
+             'ou GEOIP_BACKEND=none.',
+        id='core.W002',
+    )]
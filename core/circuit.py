@@ -0,0 +1,65 @@
+"""
+Disjoncteur (circuit breaker) pour un service externe lent ou en panne.
+Fermé : les appels passent. Après N échecs consécutifs (un appel trop lent compte comme un échec),
+il s'ouvre : les appels sont refusés immédiatement pendant reset_timeout secondes. Il passe ensuite
+en semi-ouvert : un seul appel d'essai est autorisé ; s'il réussit le disjoncteur se referme, sinon
+il se rouvre pour une nouvelle période.
+"""
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Disjoncteur partagé par les threads (et boucles d'événements) d'un processus."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, slow_call=None):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """L'appel peut-il partir ? En semi-ouvert, un seul essai à la fois."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self._probe_started = None
+            # Essai en cours : refusé, sauf si l'essai précédent n'a jamais rendu compte
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_started = now
+            return True
+
+    def record_success(self, duration=0.0):
+        if self.slow_call is not None and duration > self.slow_call:
+            self.record_failure()
+            return
+        with self._lock:
+            self.failures = 0
+            self.state = CLOSED
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probe_started = None
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures}
@@ -0,0 +1,22 @@
+"""
+Adresse IP du visiteur. Derrière Nginx (proxy_pass vers 127.0.0.1:8000), REMOTE_ADDR est celle du proxy pour
+tous les visiteurs : l'adresse réelle est lue dans l'en-tête CLIENT_IP_HEADER (X-Real-IP posé par Nginx, ou
+X-Forwarded-For), seulement si la requête vient d'un proxy de confiance (TRUSTED_PROXIES). Sinon, REMOTE_ADDR.
+"""
+import ipaddress
+
+from django.conf import settings
+
+
+def client_ip(request):
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    header = getattr(settings, 'CLIENT_IP_HEADER', '')
+    if not header or remote_addr not in getattr(settings, 'TRUSTED_PROXIES', ()):
+        return remote_addr
+    value = request.headers.get(header, '')
+    # X-Forwarded-For : la dernière adresse est celle ajoutée par notre proxy (les précédentes viennent du client)
+    candidate = value.split(',')[-1].strip()
+    try:
+        return str(ipaddress.ip_address(candidate))
+    except ValueError:
+        return remote_addr
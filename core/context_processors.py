@@ -1,23 +1,62 @@
-from .models import Service, WhatsAppConfig
-from .forms import ContactForm
+"""
+Context processors. Les données de navigation (WhatsApp, services actifs) sont gardées en mémoire
+par processus et reconstruites quand WhatsAppConfig ou Service changent : les versions du fragment
+'navigation' (core.cache_registry) sont lues dans le cache partagé entre workers (CACHE_BACKEND), donc une
+modification faite par un worker est vue par tous. Au plus NAVIGATION_MAX_AGE secondes dans tous les cas
+(cache propre au processus en développement, versions perdues).
+"""
+import threading
+import time
+
 from django.db import DatabaseError
 
+from . import cache_registry
+from .forms import ContactForm
+from .models import Service, WhatsAppConfig
+
+NAVIGATION_MAX_AGE = 300
+
+_navigation = None
+_navigation_version = None
+_navigation_expires = 0
+_navigation_lock = threading.Lock()
+
+
+def get_navigation():
+    """Retourne (whatsapp_config, services) depuis la mémoire du processus, ou la base si la version a changé."""
+    global _navigation, _navigation_version, _navigation_expires
+    version = cache_registry.versions('navigation')
+
+    def stale():
+        return _navigation is None or _navigation_version != version or time.monotonic() >= _navigation_expires
+
+    if stale():
+        with _navigation_lock:
+            if stale():
+                _navigation = (
+                    WhatsAppConfig.objects.filter(active=True).first(),
+                    list(Service.objects.filter(active=True).order_by('order', 'name')),
+                )
+                _navigation_version = version
+                _navigation_expires = time.monotonic() + NAVIGATION_MAX_AGE
+    return _navigation
+
 
 def navigation(request):
     """Context processor pour la navigation."""
     try:
-        whatsapp_config = WhatsAppConfig.objects.filter(active=True).first()
-        services = Service.objects.filter(active=True).order_by('order', 'name')
+        whatsapp_config, services = get_navigation()
     except (DatabaseError, Exception):
         # En cas d'erreur de base de données, retourner des valeurs par défaut
         whatsapp_config = None
         services = []
-    
+
+    # Modale de devis, incluse sur toutes les pages publiques
     try:
         form = ContactForm()
     except Exception:
         form = None
-    
+
     return {
         'services': services,
         'form': form,
@@ -0,0 +1,127 @@
+"""
+Déduplication des visites sur 24 h sans requête en base.
+Une visite est identifiée par (chemin, session ou IP). Backends (réglage PAGEVIEW_DEDUP_BACKEND) :
+- 'cache' : cache Django configuré, une clé par visite avec TTL 24 h (cache.add est atomique) ;
+- 'bloom' : filtres de Bloom en mémoire par worker, un par tranche de temps, les tranches
+  sortant de la fenêtre sont jetées (mémoire bornée, rares faux positifs) ;
+- 'db' : ancienne requête exists() sur PageView, faite au moment de l'écriture.
+Par défaut (réglage vide) : 'cache' si le cache est partagé entre workers (Redis, table en base), sinon 'db' :
+avec un cache propre à chaque processus, chaque worker recompterait les visites déjà vues par les autres.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+DEDUP_WINDOW_SECONDS = 24 * 3600
+
+
+def _visit_key(path, visitor):
+    return hashlib.blake2b(f'{path}\x00{visitor}'.encode('utf-8'), digest_size=16).digest()
+
+
+class CacheVisitDedup:
+    """Déduplication via le cache Django (partagé entre workers si le cache l'est, ex. Redis)."""
+
+    def __init__(self, alias='default', window=DEDUP_WINDOW_SECONDS):
+        self.alias = alias
+        self.window = window
+
+    def seen(self, path, visitor, now=None):
+        """True si la visite a déjà été vue dans la fenêtre ; sinon la marque comme vue."""
+        key = 'pv_seen:' + _visit_key(path, visitor).hex()
+        return not caches[self.alias].add(key, 1, self.window)
+
+
+class BloomFilter:
+    """Filtre de Bloom simple (tableau de bits + double hachage)."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, digest):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def add(self, digest):
+        for p in self._positions(digest):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+
+class BloomVisitDedup:
+    """
+    Déduplication en mémoire (par worker) : la fenêtre de 24 h est découpée en tranches,
+    chacune avec son filtre de Bloom. Une visite est mémorisée entre (tranches - 1) et
+    tranches × durée d'une tranche, jamais plus de 24 h.
+    """
+
+    def __init__(self, capacity=20000, slices=24, window=DEDUP_WINDOW_SECONDS, error_rate=0.001):
+        self.capacity = capacity
+        self.slices = slices
+        self.slice_seconds = window / slices
+        self.error_rate = error_rate
+        self._filters = {}
+        self._lock = threading.Lock()
+
+    def seen(self, path, visitor, now=None):
+        """True si la visite a déjà été vue dans la fenêtre ; sinon la marque comme vue."""
+        digest = _visit_key(path, visitor)
+        current = int((now if now is not None else time.time()) // self.slice_seconds)
+        oldest = current - self.slices + 1
+        with self._lock:
+            for index in [i for i in self._filters if i < oldest]:
+                del self._filters[index]
+            if any(digest in f for i, f in self._filters.items() if i <= current):
+                return True
+            bloom = self._filters.get(current)
+            if bloom is None:
+                bloom = self._filters[current] = BloomFilter(self.capacity, self.error_rate)
+            bloom.add(digest)
+        return False
+
+
+def is_shared_cache(alias='default'):
+    """Le cache est-il commun à tous les workers (pas la mémoire du processus) ?"""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def default_backend():
+    return 'cache' if is_shared_cache(getattr(settings, 'PAGEVIEW_DEDUP_CACHE_ALIAS', 'default')) else 'db'
+
+
+_visit_dedup = None  # (nom du backend, instance)
+_visit_dedup_lock = threading.Lock()
+
+
+def get_visit_dedup():
+    """
+    Backend de déduplication du processus, ou None pour 'db'
+    (la déduplication se fait alors en base au moment de l'écriture).
+    """
+    global _visit_dedup
+    backend = getattr(settings, 'PAGEVIEW_DEDUP_BACKEND', '') or default_backend()
+    if backend == 'db':
+        return None
+    with _visit_dedup_lock:
+        if _visit_dedup is None or _visit_dedup[0] != backend:
+            if backend == 'bloom':
+                instance = BloomVisitDedup(
+                    capacity=getattr(settings, 'PAGEVIEW_DEDUP_BLOOM_CAPACITY', 20000),
+                )
+            else:
+                instance = CacheVisitDedup(
+                    alias=getattr(settings, 'PAGEVIEW_DEDUP_CACHE_ALIAS', 'default'),
+                )
+            _visit_dedup = (backend, instance)
+        return _visit_dedup[1]
@@ -0,0 +1,160 @@
+"""
+Réponses locales de l'assistant : index TF-IDF des FAQ actives et des réponses validées
+(AssistantQuestion.approved). Une question suffisamment proche d'une entrée (similarité cosinus
+au-dessus de ASSISTANT_LOCAL_ANSWER_THRESHOLD) reçoit la réponse enregistrée, sans appel au modèle.
+Seule la première question d'une conversation est concernée : une relance dépend du contexte (core.views).
+L'index est construit en mémoire par processus et reconstruit quand les FAQ ou les réponses validées
+changent (numéro de version en cache, incrémenté par les signaux de core.signals).
+"""
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import FAQ, AssistantQuestion
+
+INDEX_VERSION_KEY = 'assistant_answer_index_version'
+
+CALL_TO_ACTION = (
+    '\n\nPour un chiffrage adapté à votre projet, cliquez sur « Demander un devis gratuit » '
+    'ou « Écrire sur WhatsApp » en bas du chat.'
+)
+
+STOPWORDS = frozenset(
+    'a au aux avec ce ces cet cette d de des du elle en est et etre il ils je j l la le les leur '
+    'lui m ma me mes moi mon n ne nos notre nous on ou par pas pour qu que qui s sa se ses son '
+    'sur t ta te tes toi ton tu un une vos votre vous y c ca quoi quel quelle quels quelles '
+    'combien comment faut peut peux pouvez puis svp bonjour merci sont etes ai as avez ont suis '
+    'fait faite faire veux voudrai souhaite besoin'.split()
+)
+
+# Formes ramenées à un terme commun (après suppression des accents et du pluriel)
+SYNONYMS = {
+    'prix': 'tarif', 'cout': 'tarif', 'coute': 'tarif', 'couter': 'tarif', 'budget': 'tarif', 'montant': 'tarif',
+    'delai': 'delai', 'temps': 'delai', 'duree': 'delai',
+    'referencement': 'seo', 'google': 'seo',
+    'boutique': 'ecommerce', 'commerce': 'ecommerce', 'vendre': 'ecommerce',
+    'joindre': 'contacter', 'contact': 'contacter',
+}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Minuscules sans accents, mots vides retirés, pluriels simples ramenés au singulier, synonymes unifiés."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if token in SYNONYMS:
+            tokens.append(SYNONYMS[token])
+            continue
+        if len(token) > 3 and token[-1] in 'sx':
+            token = token[:-1]
+        tokens.append(SYNONYMS.get(token, token))
+    return tokens
+
+
+class AnswerIndex:
+    """
+    Index TF-IDF (tf logarithmique, vecteurs normalisés) sur des couples question / réponse.
+    Le score mêle la similarité avec la question enregistrée (prépondérante) et avec l'entrée complète.
+    """
+    QUESTION_WEIGHT = 0.75
+
+    def __init__(self, entries):
+        # entries : [(question, réponse, source)]
+        self.entries = list(entries)
+        questions = [Counter(tokenize(q)) for q, _, _ in self.entries]
+        documents = [q + Counter(tokenize(a)) for q, (_, a, _) in zip(questions, self.entries)]
+        n = len(documents)
+        df = Counter(term for doc in documents for term in doc)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        # Terme absent de toutes les entrées : aussi rare que possible. Il compte dans la norme de la question,
+        # sinon « Combien coûte l'hébergement ? » se réduirait à « tarif » et recevrait la réponse sur les tarifs
+        self.unknown_idf = math.log(1 + n) + 1
+        self.question_vectors = [self._vector(q) for q in questions]
+        self.document_vectors = [self._vector(doc) for doc in documents]
+
+    def _vector(self, counts):
+        vector = {
+            term: (1 + math.log(tf)) * self.idf.get(term, self.unknown_idf)
+            for term, tf in counts.items()
+        }
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {term: w / norm for term, w in vector.items()}
+
+    def search(self, question):
+        """Retourne (score, question, réponse, source) de la meilleure entrée, ou None."""
+        query = self._vector(Counter(tokenize(question)))
+        if not query:
+            return None
+        best, best_score = None, 0.0
+        for entry, q_vector, d_vector in zip(self.entries, self.question_vectors, self.document_vectors):
+            score = (
+                self.QUESTION_WEIGHT * sum(w * q_vector.get(term, 0.0) for term, w in query.items())
+                + (1 - self.QUESTION_WEIGHT) * sum(w * d_vector.get(term, 0.0) for term, w in query.items())
+            )
+            if score > best_score:
+                best, best_score = entry, score
+        if best is None:
+            return None
+        return (best_score,) + tuple(best)
+
+
+def build_index():
+    entries = [(q, a, 'faq') for q, a in FAQ.objects.filter(active=True).values_list('question', 'answer')]
+    entries += [
+        (q, a, 'approved')
+        for q, a in AssistantQuestion.objects.filter(approved=True).exclude(answer='').values_list('content', 'answer')
+    ]
+    return AnswerIndex(entries)
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def invalidate_index():
+    """Force la reconstruction de l'index dans tous les processus (cache partagé)."""
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        # Clé absente (cache vidé) : repartir d'une valeur qu'aucun processus ne peut avoir déjà vue
+        cache.set(INDEX_VERSION_KEY, time.time_ns(), None)
+
+
+def get_index():
+    global _index, _index_version
+    version = cache.get(INDEX_VERSION_KEY, 0)
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = build_index()
+                _index_version = version
+    return _index
+
+
+def find_local_answer(question):
+    """
+    Réponse locale pour une question, ou None si aucune entrée n'atteint le seuil de similarité.
+    Retourne (réponse, source, score).
+    """
+    threshold = getattr(settings, 'ASSISTANT_LOCAL_ANSWER_THRESHOLD', 0.65)
+    if not question or threshold > 1:
+        return None
+    match = get_index().search(question)
+    if not match or match[0] < threshold:
+        return None
+    score, _, answer, source = match
+    # Les réponses validées viennent du modèle et contiennent déjà l'invitation au devis
+    answer = answer.strip() + CALL_TO_ACTION if source == 'faq' else answer.strip()
+    return answer, source, score
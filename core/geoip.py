@@ -0,0 +1,374 @@
+"""
+Géolocalisation des IP pour le suivi des visites (pays, code pays, ville).
+Backends (réglage GEOIP_BACKEND) :
+- 'local' (défaut) : base de plages d'IP hors ligne, recherche dichotomique en mémoire.
+  Fichier GEOIP_DATABASE_PATH au format CSV (début, fin, code pays[, pays[, ville]],
+  IP en notation pointée ou entiers, ex. DB-IP Lite) ou MMDB (MaxMind, mappé en mémoire,
+  nécessite le paquet maxminddb) ;
+- 'http' : ip-api.com, synchrone (ancien comportement, déconseillé sur le chemin de la requête) ;
+- 'none' : pas de géolocalisation.
+Avec GEOIP_HTTP_ENRICHMENT (désactivé par défaut), les IP publiques inconnues de la base locale sont
+complétées en arrière-plan via ip-api.com, après l'insertion des visites : endpoint batch (100 IP par requête),
+au plus HTTP_BATCH_PER_MINUTE requêtes par minute (limite du service, compteur dans le cache partagé).
+"""
+import bisect
+import csv
+import ipaddress
+import json
+import logging
+import threading
+import time
+import urllib.request
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .buffers import BufferedWriter
+from .ratelimit import hit_rate_limit
+
+logger = logging.getLogger(__name__)
+
+EMPTY_GEO = (None, None, None)
+
+HTTP_BATCH_URL = 'http://ip-api.com/batch?fields=status,country,countryCode,city,query'
+HTTP_BATCH_SIZE = 100
+HTTP_BATCH_PER_MINUTE = 15
+
+
+def is_public_ip(ip_address):
+    """True pour une IP routable (ni privée, ni loopback, ni réservée)."""
+    try:
+        return ipaddress.ip_address(ip_address).is_global
+    except ValueError:
+        return False
+
+
+def _ip_to_int(value):
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    return int(ipaddress.ip_address(value))
+
+
+class IPRangeDatabase:
+    """
+    Plages d'IP triées (entiers) + tableau de localisations dédoublonnées.
+    Une recherche = une bisection, quelques microsecondes, aucun accès réseau.
+    """
+
+    def __init__(self):
+        # Par version d'IP : débuts, fins, index de localisation (tableaux compacts pour IPv4)
+        self._tables = {
+            4: (array('I'), array('I'), array('I')),
+            6: ([], [], array('I')),
+        }
+        self._locations = []
+        self._location_index = {}
+
+    @classmethod
+    def from_csv(cls, path):
+        db = cls()
+        rows = []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 3 or row[0].startswith('#'):
+                    continue
+                try:
+                    start, end = _ip_to_int(row[0]), _ip_to_int(row[1])
+                except ValueError:
+                    continue  # ligne d'en-tête ou invalide
+                if row[0].strip().isdigit():
+                    version = 4 if end < 2 ** 32 else 6
+                else:
+                    version = ipaddress.ip_address(row[0].strip()).version
+                code = row[2].strip().upper()[:2]
+                country = row[3].strip() if len(row) > 3 else ''
+                city = row[4].strip() if len(row) > 4 else ''
+                rows.append((version, start, end, (country or code, code, city)))
+        rows.sort(key=lambda r: (r[0], r[1]))
+        for version, start, end, location in rows:
+            db.add_range(version, start, end, location)
+        return db
+
+    def add_range(self, version, start, end, location):
+        """Ajoute une plage (à appeler dans l'ordre croissant des débuts)."""
+        index = self._location_index.get(location)
+        if index is None:
+            index = self._location_index[location] = len(self._locations)
+            self._locations.append(location)
+        starts, ends, locs = self._tables[version]
+        starts.append(start)
+        ends.append(end)
+        locs.append(index)
+
+    def __len__(self):
+        return sum(len(t[0]) for t in self._tables.values())
+
+    def lookup(self, ip_address):
+        try:
+            ip = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return EMPTY_GEO
+        starts, ends, locs = self._tables[ip.version]
+        n = int(ip)
+        i = bisect.bisect_right(starts, n) - 1
+        if i >= 0 and n <= ends[i]:
+            return self._locations[locs[i]]
+        return EMPTY_GEO
+
+
+class LocalGeoResolver:
+    """Résolution hors ligne (CSV chargé en mémoire, ou MMDB mappé en mémoire)."""
+
+    def __init__(self, path):
+        self.path = str(path) if path else ''
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.path.endswith('.mmdb'):
+            import maxminddb
+            return _MMDBDatabase(maxminddb.open_database(self.path, maxminddb.MODE_MMAP))
+        return IPRangeDatabase.from_csv(self.path)
+
+    def _get_db(self):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    try:
+                        self._db = self._load()
+                    except Exception:
+                        logger.warning('Base GeoIP locale indisponible (%s)', self.path or 'GEOIP_DATABASE_PATH vide')
+                        self._db = IPRangeDatabase()
+        return self._db
+
+    def lookup(self, ip_address):
+        if not is_public_ip(ip_address):
+            return EMPTY_GEO
+        return self._get_db().lookup(ip_address)
+
+
+class _MMDBDatabase:
+    """Adaptateur pour un lecteur maxminddb (GeoLite2 / DB-IP au format MMDB)."""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def lookup(self, ip_address):
+        try:
+            record = self.reader.get(ip_address)
+        except ValueError:
+            return EMPTY_GEO
+        if not record:
+            return EMPTY_GEO
+        country = record.get('country') or {}
+        names = country.get('names') or {}
+        city_names = (record.get('city') or {}).get('names') or {}
+        code = (country.get('iso_code') or '')[:2]
+        return (names.get('fr') or names.get('en') or code, code, city_names.get('fr') or city_names.get('en') or '')
+
+
+class HttpGeoResolver:
+    """
+    Pays, code pays et ville via ip-api.com.
+    Résultat mis en cache 24h par IP pour respecter la limite (45 req/min).
+    """
+
+    def lookup(self, ip_address):
+        if not is_public_ip(ip_address):
+            return EMPTY_GEO
+        cache_key = f"geo_ip_{ip_address}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        try:
+            url = f"http://ip-api.com/json/{ip_address}?fields=status,country,countryCode,city"
+            req = urllib.request.Request(url, headers={'User-Agent': 'FasowebStats/1.0'})
+            with urllib.request.urlopen(req, timeout=2) as resp:
+                data = resp.read().decode()
+            info = json.loads(data)
+            if info.get('status') == 'success':
+                result = (info.get('country') or '', (info.get('countryCode') or '')[:2], info.get('city') or '')
+                cache.set(cache_key, result, 86400)  # 24h
+                return result
+        except Exception:
+            pass
+        cache.set(cache_key, EMPTY_GEO, 300)  # 5 min en cas d'échec pour ne pas surcharger
+        return EMPTY_GEO
+
+    def lookup_many(self, ip_addresses):
+        """
+        {ip: (pays, code pays, ville)} pour plusieurs IP : cache d'abord, puis l'endpoint batch d'ip-api.com
+        par lots de HTTP_BATCH_SIZE, en attendant si la limite de requêtes par minute est atteinte.
+        """
+        ips = [ip for ip in dict.fromkeys(ip_addresses) if is_public_ip(ip)]
+        cached = cache.get_many([f'geo_ip_{ip}' for ip in ips])
+        results = {ip: cached[f'geo_ip_{ip}'] for ip in ips if f'geo_ip_{ip}' in cached}
+        missing = [ip for ip in ips if ip not in results]
+        for start in range(0, len(missing), HTTP_BATCH_SIZE):
+            results.update(self._fetch_batch(missing[start:start + HTTP_BATCH_SIZE]))
+        return results
+
+    def _fetch_batch(self, ips):
+        wait_for_http_slot()
+        results = dict.fromkeys(ips, EMPTY_GEO)
+        try:
+            req = urllib.request.Request(
+                HTTP_BATCH_URL, data=json.dumps(ips).encode(), method='POST',
+                headers={'User-Agent': 'FasowebStats/1.0', 'Content-Type': 'application/json'},
+            )
+            with urllib.request.urlopen(req, timeout=5) as resp:
+                rows = json.loads(resp.read().decode())
+        except Exception:
+            logger.warning('ip-api.com : échec de la requête batch (%d IP)', len(ips))
+            rows = []
+        for row in rows:
+            if row.get('status') == 'success' and row.get('query') in results:
+                results[row['query']] = (row.get('country') or '', (row.get('countryCode') or '')[:2], row.get('city') or '')
+        cache.set_many({f'geo_ip_{ip}': geo for ip, geo in results.items() if geo[1]}, 86400)
+        cache.set_many({f'geo_ip_{ip}': geo for ip, geo in results.items() if not geo[1]}, 300)
+        return results
+
+
+class NullGeoResolver:
+    def lookup(self, ip_address):
+        return EMPTY_GEO
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_geo_resolver():
+    """Résolveur du processus, selon GEOIP_BACKEND."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                backend = getattr(settings, 'GEOIP_BACKEND', 'local')
+                if backend == 'http':
+                    _resolver = HttpGeoResolver()
+                elif backend == 'none':
+                    _resolver = NullGeoResolver()
+                else:
+                    _resolver = LocalGeoResolver(getattr(settings, 'GEOIP_DATABASE_PATH', ''))
+    return _resolver
+
+
+def wait_for_http_slot():
+    """Attend qu'une requête batch vers ip-api.com soit permise (fenêtre d'une minute partagée entre workers)."""
+    while True:
+        retry_after = hit_rate_limit('geoip', 'ip-api-batch', {'minute': HTTP_BATCH_PER_MINUTE})
+        if not retry_after:
+            return
+        time.sleep(retry_after)
+
+
+GEO_VERSION_KEY = 'geoip:enrichment_version'
+
+
+def enrichment_version():
+    """Change à chaque géolocalisation après coup (ETag du temps réel : pays de visites déjà envoyées)."""
+    return cache.get(GEO_VERSION_KEY, 0)
+
+
+def _after_enrichment(pageview_ids):
+    """Visites géolocalisées après coup : cumuls quotidiens recalculés (faits sans le pays), version changée."""
+    from .stats import rebuild_daily_stats_for
+    rebuild_daily_stats_for(pageview_ids)
+    cache.set(GEO_VERSION_KEY, time.time_ns(), None)
+
+
+def enrich_ips(ip_addresses):
+    """
+    Complète via ip-api.com les visites sans pays pour ces IP (requêtes batch, résultats en cache),
+    puis recalcule les cumuls quotidiens des pages touchées. Retourne le nombre de lignes mises à jour.
+    """
+    from .models import PageView
+    updated = 0
+    enriched = []
+    for ip_address, (country, country_code, city) in HttpGeoResolver().lookup_many(ip_addresses).items():
+        if not country_code:
+            continue
+        ids = list(PageView.objects.filter(ip_address=ip_address, country_code='').values_list('pk', flat=True))
+        enriched.extend(ids)
+        updated += PageView.objects.filter(pk__in=ids).update(
+            country=country or '',
+            country_code=country_code,
+            city=city or '',
+        )
+    if enriched:
+        _after_enrichment(enriched)
+    return updated
+
+
+_enrichment_buffer = None
+_enrichment_lock = threading.Lock()
+
+
+def schedule_http_enrichment(ip_addresses):
+    """Met en file les IP à compléter en arrière-plan (si GEOIP_HTTP_ENRICHMENT est actif)."""
+    global _enrichment_buffer
+    if not getattr(settings, 'GEOIP_HTTP_ENRICHMENT', False):
+        return
+    if _enrichment_buffer is None:
+        with _enrichment_lock:
+            if _enrichment_buffer is None:
+                _enrichment_buffer = BufferedWriter(
+                    enrich_ips, max_size=1000, batch_size=HTTP_BATCH_SIZE, interval_ms=10000,
+                    name='geoip-enrichment',
+                )
+    for ip_address in ip_addresses:
+        if is_public_ip(ip_address):
+            _enrichment_buffer.put(ip_address)
+
+
+GEO_ENRICHMENT_CHECKPOINT = 'pageview_geo'
+# Visites d'id <= point de reprise encore réexaminées pendant ce délai : l'id est attribué à l'insertion,
+# une transaction plus lente (autre worker) peut donc être validée après des ids plus grands déjà traités
+GEO_RESCAN_SECONDS = 300
+
+
+def enrich_pageview_batch(after_id, batch_size=500, use_http=False):
+    """
+    Géolocalise un lot de visites sans pays d'id > after_id, plus celles d'id <= after_id des
+    GEO_RESCAN_SECONDS dernières secondes (validées en retard), chaque IP distincte n'étant
+    résolue qu'une fois, puis recalcule les cumuls quotidiens des pages touchées. Les IP
+    introuvables sont laissées telles quelles (le point de reprise avance quand même).
+    Retourne (dernier id traité, lignes mises à jour) ; dernier id = after_id si rien de nouveau.
+    """
+    from .models import PageView
+    pending = PageView.objects.filter(country_code='').order_by('pk').values_list('pk', 'ip_address')
+    batch = list(pending.filter(pk__gt=after_id)[:batch_size])
+    last_id = batch[-1][0] if batch else after_id
+    since = timezone.now() - timedelta(seconds=GEO_RESCAN_SECONDS)
+    batch += pending.filter(pk__lte=after_id, created_at__gte=since)[:batch_size]
+    if not batch:
+        return after_id, 0
+    ids_by_ip = {}
+    for pk, ip_address in batch:
+        ids_by_ip.setdefault(ip_address, []).append(pk)
+    resolver = get_geo_resolver()
+    ips = set(ids_by_ip)
+    if isinstance(resolver, HttpGeoResolver):
+        found = resolver.lookup_many(ips)
+    else:
+        found = {ip: resolver.lookup(ip) for ip in ips}
+        if use_http:
+            # IP inconnues de la base locale : ip-api.com par lots
+            found.update(HttpGeoResolver().lookup_many([ip for ip, geo in found.items() if not geo[1]]))
+    updated = 0
+    enriched = []
+    for ip_address, (country, country_code, city) in found.items():
+        if not country_code:
+            continue
+        enriched.extend(ids_by_ip[ip_address])
+        updated += PageView.objects.filter(pk__in=ids_by_ip[ip_address], country_code='').update(
+            country=country or '', country_code=country_code, city=city or '',
+        )
+    if enriched:
+        _after_enrichment(enriched)
+    return last_id, updated
@@ -0,0 +1,144 @@
+"""
+Politique Cache-Control pour un proxy (Nginx, Varnish) ou un CDN placé devant le site (CacheControlMiddleware).
+Réglage CACHE_CONTROL_POLICIES : nom de vue (url_name) → {'max_age', 's_maxage', 'stale_while_revalidate', 'vary'}.
+- Réponse partageable (visiteur anonyme, GET/HEAD, 200, aucun cookie ni jeton CSRF, pas de messages en attente) :
+  « public » avec toute la politique, et l'en-tête CACHE_TAG_HEADER listant les tags du registre des dépendances
+  (core.cache_registry) pour la purge par tag ;
+- sinon (jeton CSRF dans la page, cookie posé, utilisateur connecté, 304) : « private » avec le seul max-age ;
+- vues de CACHE_CONTROL_PRIVATE (tableau de bord, formulaires) : toujours « private ».
+
+Purge : à chaque modification d'un modèle surveillé (signal content_changed du registre), le tag du modèle est
+envoyé, après validation de la transaction, à CACHE_PURGE_URL (méthode CACHE_PURGE_METHOD, tags dans l'en-tête
+CACHE_TAG_HEADER). Envoi en arrière-plan et par lots (BufferedWriter) : aucune attente dans la requête.
+"""
+import threading
+import urllib.request
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from . import cache_registry
+from .buffers import BufferedWriter
+from .pagecache import has_pending_messages, is_anonymous
+
+
+def tag_header():
+    return getattr(settings, 'CACHE_TAG_HEADER', 'Cache-Tag')
+
+
+def cache_directives(policy, shared):
+    """Arguments de patch_cache_control pour une politique, partagée (proxy) ou propre au navigateur."""
+    directives = {'max_age': policy.get('max_age', 0)}
+    if not shared:
+        directives['private'] = True
+        return directives
+    directives['public'] = True
+    if policy.get('s_maxage') is not None:
+        directives['s_maxage'] = policy['s_maxage']
+    if policy.get('stale_while_revalidate'):
+        directives['stale_while_revalidate'] = policy['stale_while_revalidate']
+    return directives
+
+
+def uses_csrf_token(request, response):
+    """La page contient un jeton CSRF (get_token appelé) ou pose un cookie : elle est propre à ce visiteur."""
+    return bool(request.META.get('CSRF_COOKIE_NEEDS_UPDATE') or response.cookies)
+
+
+class CacheControlMiddleware:
+    """
+    Applique CACHE_CONTROL_POLICIES. À placer avant PageCacheMiddleware : sa politique remplace l'en-tête
+    posé par le cache de pages et s'applique aussi aux pages servies depuis ce cache.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.apply(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.apply(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Ici plutôt qu'au retour : request.user peut demander une requête en base (interdit en asynchrone)
+        match = request.resolver_match
+        if match is None:
+            return None
+        url_name = match.url_name
+        if url_name in getattr(settings, 'CACHE_CONTROL_PRIVATE', ()):
+            request._cache_control = (url_name, None, False)
+            return None
+        policy = getattr(settings, 'CACHE_CONTROL_POLICIES', {}).get(url_name)
+        if policy is not None and request.method in ('GET', 'HEAD'):
+            shared = is_anonymous(request) and not has_pending_messages(request)
+            request._cache_control = (url_name, policy, shared)
+        return None
+
+    def apply(self, request, response):
+        state = getattr(request, '_cache_control', None)
+        if state is None:
+            return
+        url_name, policy, shared = state
+        if policy is None:
+            patch_cache_control(response, private=True)
+            return
+        if response.status_code not in (200, 304) or response.streaming:
+            return
+        shared = shared and response.status_code == 200 and not uses_csrf_token(request, response)
+        # La politique fait foi : elle remplace l'en-tête posé plus bas (cache de pages)
+        del response['Cache-Control']
+        patch_cache_control(response, **cache_directives(policy, shared))
+        if policy.get('vary'):
+            patch_vary_headers(response, policy['vary'])
+        if shared and url_name in cache_registry.DEPENDENCIES:
+            response[tag_header()] = ' '.join(cache_registry.tags_for(url_name))
+
+
+def purge_tags(tags):
+    """Demande au proxy de purger les réponses portant ces tags (une seule requête pour le lot)."""
+    url = getattr(settings, 'CACHE_PURGE_URL', '')
+    if not url:
+        return
+    request = urllib.request.Request(
+        url,
+        method=getattr(settings, 'CACHE_PURGE_METHOD', 'PURGE'),
+        headers={tag_header(): ' '.join(sorted(set(tags))), 'User-Agent': 'FasowebPurge/1.0'},
+    )
+    with urllib.request.urlopen(request, timeout=2) as resp:
+        resp.read()
+
+
+_purge_buffer = None
+_purge_buffer_lock = threading.Lock()
+
+
+def get_purge_buffer():
+    """Tags à purger, envoyés par lots en arrière-plan (plusieurs écritures rapprochées : une requête)."""
+    global _purge_buffer
+    if _purge_buffer is None:
+        with _purge_buffer_lock:
+            if _purge_buffer is None:
+                _purge_buffer = BufferedWriter(purge_tags, max_size=1000, batch_size=100, interval_ms=500,
+                                               name='cache-purge-buffer')
+    return _purge_buffer
+
+
+def queue_purge(sender, model_name, **kwargs):
+    """Receveur de cache_registry.content_changed : purge après validation (le proxy relira la nouvelle version)."""
+    if not getattr(settings, 'CACHE_PURGE_URL', ''):
+        return
+    tag_name = cache_registry.tag(model_name)
+    transaction.on_commit(lambda: get_purge_buffer().put(tag_name))
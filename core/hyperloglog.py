@@ -0,0 +1,62 @@
+"""
+Esquisse HyperLogLog : estimation du nombre d'éléments distincts en mémoire fixe.
+Avec la précision par défaut (p = 12, 4096 registres d'un octet, 4 Ko) l'erreur type est d'environ 1,6 %.
+Deux esquisses se fusionnent (maximum registre par registre) : l'union de plusieurs jours
+s'estime sans revenir aux données brutes.
+"""
+import hashlib
+import math
+
+DEFAULT_PRECISION = 12
+
+
+class HyperLogLog:
+    """Esquisse HyperLogLog à registres d'un octet."""
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        if registers is None:
+            self.registers = bytearray(self.m)
+        else:
+            if len(registers) != self.m:
+                raise ValueError('Taille des registres incompatible avec la précision')
+            self.registers = bytearray(registers)
+
+    @classmethod
+    def from_bytes(cls, data, precision=DEFAULT_PRECISION):
+        return cls(precision, data)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add(self, value):
+        """Ajoute un élément (chaîne)."""
+        x = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        bits = 64 - self.precision
+        index = x >> bits
+        rest = x & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Fusionne une autre esquisse (union) dans celle-ci."""
+        if other.m != self.m:
+            raise ValueError('Précisions différentes')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Estimation du nombre d'éléments distincts."""
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Petites cardinalités : comptage linéaire
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
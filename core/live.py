@@ -0,0 +1,155 @@
+"""
+Flux en direct des visites pour le tableau de bord (Server-Sent Events).
+Les visites enregistrées par save_visits sont publiées dans un courtier en mémoire du processus :
+un tampon circulaire des derniers événements, numérotés par l'id de la PageView, et une condition
+qui réveille les connexions en attente. Une reconnexion (Last-Event-ID) rejoue les événements manqués
+depuis le tampon, ou depuis la base s'ils en sont sortis. Avec plusieurs processus, les visites écrites
+par un autre worker sont rattrapées depuis la base à chaque battement de cœur.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import PageView
+
+
+def serialize_visit(v):
+    """Représentation JSON d'une visite pour le tableau de bord."""
+    return {
+        'id': v.id,
+        'created_at': v.created_at.strftime('%d/%m/%Y %H:%M'),
+        'path': v.path[:50] + ('…' if len(v.path) > 50 else ''),
+        'referer': v.referer or '',
+        'country': v.country or '',
+        'code': v.country_code or '',
+        'city': v.city or '',
+        'device': v.get_device_type_display(),
+    }
+
+
+class VisitBroker:
+    """Publication / abonnement en mémoire, avec tampon circulaire des derniers événements."""
+
+    def __init__(self, buffer_size=500):
+        self._events = deque(maxlen=buffer_size)
+        self._evicted_id = 0  # id du dernier événement sorti du tampon
+        self._condition = threading.Condition()
+
+    def publish(self, events):
+        """Publie des événements (id, données) par id croissant et réveille les abonnés."""
+        if not events:
+            return
+        with self._condition:
+            for event in events:
+                if len(self._events) == self._events.maxlen:
+                    self._evicted_id = self._events[0][0]
+                self._events.append(event)
+            self._condition.notify_all()
+
+    def events_after(self, last_id):
+        """
+        Événements d'id supérieur à last_id présents dans le tampon.
+        Retourne None si des événements ont pu sortir du tampon (rattrapage en base nécessaire).
+        """
+        with self._condition:
+            if last_id is not None and last_id < self._evicted_id:
+                return None
+            return [event for event in self._events if last_id is None or event[0] > last_id]
+
+    def wait(self, last_id, timeout):
+        """Attend au plus timeout secondes des événements postérieurs à last_id."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                events = self.events_after(last_id)
+                if events is None or events:
+                    return events
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._condition.wait(remaining)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_visit_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = VisitBroker(getattr(settings, 'LIVE_STATS_BUFFER_SIZE', 500))
+    return _broker
+
+
+def publish_visits(pageviews):
+    """Publie les visites qui viennent d'être insérées (hors bots, ids connus)."""
+    events = [(pv.id, serialize_visit(pv)) for pv in pageviews if pv.id and not pv.is_bot]
+    get_visit_broker().publish(sorted(events, key=lambda event: event[0]))
+
+
+def _events_from_db(last_id, limit=100):
+    visits = PageView.objects.filter(is_bot=False, id__gt=last_id).order_by('-id')[:limit]
+    return [(v.id, serialize_visit(v)) for v in reversed(visits)]
+
+
+def format_event(event_id, data):
+    return f'id: {event_id}\nevent: visit\ndata: {json.dumps(data)}\n\n'
+
+
+def visit_stream(last_id=None, heartbeat=None, max_duration=None):
+    """
+    Générateur SSE : événements « visit » au fil de l'eau, commentaire de battement de cœur
+    en l'absence de visite. Se termine après max_duration secondes pour libérer le worker ;
+    le navigateur se reconnecte alors avec Last-Event-ID.
+    """
+    heartbeat = heartbeat or getattr(settings, 'LIVE_STATS_HEARTBEAT', 15)
+    max_duration = max_duration or getattr(settings, 'LIVE_STATS_MAX_DURATION', 300)
+    broker = get_visit_broker()
+    started = time.monotonic()
+    try:
+        yield f'retry: {getattr(settings, "LIVE_STATS_RETRY_MS", 3000)}\n\n'
+        if last_id is None:
+            # Nouvelle connexion : on part de la dernière visite connue
+            last_id = PageView.objects.filter(is_bot=False).order_by('-id').values_list('id', flat=True).first() or 0
+        else:
+            events = broker.events_after(last_id)
+            for event_id, data in (_events_from_db(last_id) if events is None else events):
+                yield format_event(event_id, data)
+                last_id = event_id
+        close_old_connections()
+        while time.monotonic() - started < max_duration:
+            events = broker.wait(last_id, heartbeat)
+            if events is None:
+                events = _events_from_db(last_id)
+            elif not events:
+                # Battement de cœur : rattrape les visites écrites par d'autres processus
+                events = _events_from_db(last_id)
+                close_old_connections()
+            for event_id, data in events:
+                yield format_event(event_id, data)
+                last_id = event_id
+            if not events:
+                yield ': heartbeat\n\n'
+    finally:
+        close_old_connections()
+
+
+async def avisit_stream(last_id=None, heartbeat=None, max_duration=None):
+    """
+    Variante asynchrone de visit_stream pour ASGI : chaque attente se fait dans un thread du pool,
+    sans bloquer le thread partagé des vues synchrones.
+    """
+    stream = visit_stream(last_id, heartbeat, max_duration)
+    next_chunk = sync_to_async(lambda: next(stream, None), thread_sensitive=False)
+    try:
+        while (chunk := await next_chunk()) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(stream.close, thread_sensitive=False)()
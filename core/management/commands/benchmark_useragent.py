@@ -0,0 +1,111 @@
+"""
+Micro-benchmark du classement des User-Agent (bot + type d'appareil).
+Compare l'ancienne implémentation (15 re.search + 3 balayages any() par appel, is_bot appelé deux fois)
+au classifieur compilé et mémorisé de core.useragent, sur un corpus de User-Agent réalistes.
+Usage: python manage.py benchmark_useragent [--requests 100000]
+"""
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import PageView
+from core.useragent import BOT_PATTERNS, classify_user_agent
+
+# Corpus pondéré : (User-Agent, poids approximatif dans le trafic)
+UA_CORPUS = [
+    ('Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36', 30),
+    ('Mozilla/5.0 (Linux; Android 13; SM-A145F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.6312.118 Mobile Safari/537.36', 12),
+    ('Mozilla/5.0 (Linux; Android 12; TECNO KG5n) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.6261.105 Mobile Safari/537.36', 10),
+    ('Mozilla/5.0 (Linux; Android 11; Infinix X6511) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Mobile Safari/537.36 OPR/80.0.2254.7', 6),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1', 8),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36', 14),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0', 4),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0', 3),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15', 3),
+    ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36', 2),
+    ('Mozilla/5.0 (iPad; CPU OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1', 2),
+    ('Mozilla/5.0 (Linux; Android 13; SM-T220) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36', 1),
+    ('Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36', 1),
+    ('Opera/9.80 (J2ME/MIDP; Opera Mini/5.1.21214/28.2725; U; fr) Presto/2.8.119 Version/11.10', 1),
+    ('Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)', 3),
+    ('Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)', 2),
+    ('Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)', 1),
+    ('facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)', 1),
+    ('WhatsApp/2.23.20.0 A', 2),
+    ('TelegramBot (like TwitterBot)', 1),
+    ('Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)', 1),
+    ('python-requests/2.31.0', 1),
+    ('curl/8.4.0', 1),
+]
+
+
+def legacy_is_bot(user_agent):
+    """Ancienne détection (une re.search par motif)."""
+    if not user_agent:
+        return False
+    user_agent_lower = user_agent.lower()
+    return any(re.search(pattern, user_agent_lower) for pattern in BOT_PATTERNS)
+
+
+def legacy_device_type(user_agent):
+    """Ancienne détection du type d'appareil (trois balayages any())."""
+    if not user_agent:
+        return PageView.DEVICE_OTHER
+    ua = user_agent.lower()
+    if any(x in ua for x in ('ipad', 'tablet', 'playbook', 'silk/', 'kftt', 'kindle', 'gt-p', 'sm-t', 'tab')):
+        return PageView.DEVICE_TABLET
+    if any(x in ua for x in ('mobile', 'android', 'iphone', 'ipod', 'webos', 'blackberry', 'opera mini', 'iemobile', 'windows phone')):
+        return PageView.DEVICE_MOBILE
+    if any(x in ua for x in ('windows', 'macintosh', 'linux', 'x11', 'cros', 'openbsd')):
+        return PageView.DEVICE_DESKTOP
+    return PageView.DEVICE_OTHER
+
+
+def legacy_request(user_agent):
+    # Comme l'ancien middleware : is_bot dans should_track, puis à la création de la ligne
+    if legacy_is_bot(user_agent):
+        return True, None
+    return legacy_is_bot(user_agent), legacy_device_type(user_agent)
+
+
+def new_request(user_agent):
+    is_bot, device_type = classify_user_agent(user_agent)
+    if is_bot:
+        return True, None
+    return classify_user_agent(user_agent)[0], device_type
+
+
+class Command(BaseCommand):
+    help = 'Compare l\'ancien et le nouveau classement des User-Agent (bot + appareil)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000, help='Nombre de requêtes simulées')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Vérification d'équivalence sur tout le corpus
+        for ua, _ in UA_CORPUS:
+            expected = (legacy_is_bot(ua), legacy_device_type(ua))
+            if classify_user_agent(ua) != expected:
+                self.stderr.write(self.style.ERROR(f'Résultat différent pour : {ua}'))
+                return
+
+        rng = random.Random(options['seed'])
+        agents = [ua for ua, _ in UA_CORPUS]
+        weights = [w for _, w in UA_CORPUS]
+        sample = rng.choices(agents, weights=weights, k=options['requests'])
+
+        results = {}
+        for label, func in (('ancien', legacy_request), ('nouveau', new_request)):
+            classify_user_agent.cache_clear()
+            start = time.perf_counter()
+            for ua in sample:
+                func(ua)
+            results[label] = time.perf_counter() - start
+
+        n = options['requests']
+        for label, elapsed in results.items():
+            self.stdout.write(f'{label:8s} : {elapsed * 1000:8.1f} ms au total, {elapsed / n * 1e6:6.2f} µs par requête')
+        self.stdout.write(self.style.SUCCESS(f'[OK] Gain : x{results["ancien"] / results["nouveau"]:.1f}'))
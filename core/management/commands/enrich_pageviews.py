@@ -0,0 +1,47 @@
+"""
+Commande Django pour géolocaliser après coup les visites enregistrées sans pays.
+Traite les visites par lots (une résolution par IP distincte), en reprenant au dernier id traité
+(les visites des dernières minutes en dessous de ce point sont réexaminées : validées en retard).
+Usage: python manage.py enrich_pageviews [--loop] [--interval 5] [--batch-size 500] [--since-id N]
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.geoip import GEO_ENRICHMENT_CHECKPOINT, enrich_pageview_batch
+from core.models import ProcessingCheckpoint
+
+
+class Command(BaseCommand):
+    help = 'Complète pays, code pays et ville des visites enregistrées sans géolocalisation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Nombre de visites par lot')
+        parser.add_argument('--since-id', type=int, default=None, help='Repartir de cet id (ignore le point de reprise)')
+        parser.add_argument('--loop', action='store_true', help='Tourner en continu (worker)')
+        parser.add_argument('--interval', type=float, default=5, help='Pause entre deux passes en mode --loop (secondes)')
+        parser.add_argument('--no-http', action='store_true', help='Base locale uniquement, sans ip-api.com')
+
+    def handle(self, *args, **options):
+        checkpoint, _ = ProcessingCheckpoint.objects.get_or_create(name=GEO_ENRICHMENT_CHECKPOINT)
+        if options['since_id'] is not None:
+            checkpoint.last_id = options['since_id']
+            checkpoint.save(update_fields=['last_id', 'updated_at'])
+        use_http = not options['no_http'] and getattr(settings, 'GEOIP_HTTP_ENRICHMENT', False)
+
+        while True:
+            total = 0
+            while True:
+                last_id, updated = enrich_pageview_batch(checkpoint.last_id, options['batch_size'], use_http)
+                total += updated
+                if last_id == checkpoint.last_id:
+                    break
+                checkpoint.last_id = last_id
+                checkpoint.save(update_fields=['last_id', 'updated_at'])
+                self.stdout.write(f'Lot jusqu\'à l\'id {last_id} : {updated} visite(s) géolocalisée(s)')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'[OK] {total} visite(s) géolocalisée(s), reprise à l\'id {checkpoint.last_id}'))
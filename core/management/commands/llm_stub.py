@@ -0,0 +1,139 @@
+"""
+Serveur LLM factice (format OpenAI chat/completions) pour tester l'assistant hors ligne.
+Chaque réponse est retardée de --latency secondes, comme un vrai modèle ; en mode flux ("stream": true),
+le premier fragment arrive après --ttft secondes et les suivants s'étalent jusqu'à --latency.
+Le nombre maximal de requêtes simultanées est affiché à l'arrêt.
+Usage: python manage.py llm_stub [--port 8765] [--latency 3] [--ttft 0.3]
+puis DEEPSEEK_API_URL=http://127.0.0.1:8765/v1/chat/completions et DEEPSEEK_API_KEY=stub
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+def stub_answer(messages):
+    """Texte de la réponse factice : reprend la dernière question."""
+    question = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+    return f'Réponse de test à : {question[:200]}'
+
+
+def stub_completion(messages):
+    """Réponse au format chat/completions."""
+    content = stub_answer(messages)
+    return {
+        'id': 'stub',
+        'object': 'chat.completion',
+        'model': 'stub',
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': sum(len(m.get('content', '')) // 4 for m in messages), 'completion_tokens': len(content) // 4},
+    }
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # beaucoup de connexions simultanées
+
+    def __init__(self, address, latency=3.0, jitter=0.0, ttft=0.3):
+        super().__init__(address, StubLLMHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.ttft = ttft
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.served = 0
+        self.lock = threading.Lock()
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                payload = {}
+            latency = max(0.0, server.latency + random.uniform(-server.jitter, server.jitter))
+            if payload.get('stream'):
+                usage = (payload.get('stream_options') or {}).get('include_usage')
+                self.stream_answer(payload.get('messages') or [], latency, usage)
+                return
+            time.sleep(latency)
+            body = json.dumps(stub_completion(payload.get('messages') or [])).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+                server.served += 1
+
+    def write_chunk(self, data):
+        # Transfer-Encoding: chunked
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def stream_answer(self, messages, latency, usage=False):
+        """Réponse en flux SSE, un fragment par mot (puis la consommation en jetons si demandée)."""
+        ttft = min(self.server.ttft, latency)
+        words = stub_answer(messages).split(' ')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        time.sleep(ttft)
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep((latency - ttft) / len(words))
+                chunk = {'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word}}]}
+                self.write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            if usage:
+                chunk = {'choices': [], 'usage': stub_completion(messages)['usage']}
+                self.write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            self.write_chunk(b'data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti avant la fin du flux
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Lance un serveur LLM factice pour tester l\'assistant hors ligne'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=3.0, help='Durée de chaque réponse (s)')
+        parser.add_argument('--jitter', type=float, default=0.5, help='Variation aléatoire de la durée (s)')
+        parser.add_argument('--ttft', type=float, default=0.3, help='Délai du premier fragment en mode flux (s)')
+
+    def handle(self, *args, **options):
+        server = StubLLMServer((options['host'], options['port']), options['latency'], options['jitter'], options['ttft'])
+        self.stdout.write(
+            f'LLM factice sur http://{options["host"]}:{options["port"]}/v1/chat/completions '
+            f'(latence {options["latency"]} s). Ctrl+C pour arrêter.'
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(self.style.SUCCESS(
+                f'[OK] {server.served} réponse(s), {server.max_in_flight} requête(s) simultanée(s) au maximum'
+            ))
@@ -0,0 +1,113 @@
+"""
+Test de charge de l'assistant : envoie des questions simultanées à /api/assistant/ et mesure
+débit et latences. À lancer contre le site servi en WSGI puis en ASGI, avec llm_stub comme modèle.
+Avec --stream, mesure aussi le délai avant le premier fragment de réponse (time-to-first-token).
+
+Limites du site : chaque requête vient d'un visiteur distinct (--visitors), annoncé par l'en-tête d'adresse
+réelle (CLIENT_IP_HEADER, lu car le test tourne depuis un proxy de confiance, TRUSTED_PROXIES), pour que la
+limite par visiteur (ASSISTANT_RATE_LIMIT_PER_MINUTE) ne change pas la mesure en 429. Le nombre d'appels
+simultanés au modèle (ASSISTANT_MAX_IN_FLIGHT, par processus) se règle côté serveur : le relever pour la durée
+du test, sinon les requêtes en trop reçoivent 503. Les réponses sont comptées par code HTTP.
+Usage: python manage.py loadtest_assistant [--base-url http://127.0.0.1:8000] [--concurrency 200] [--requests 400]
+       [--visitors 0] [--stream]
+"""
+import asyncio
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def visitor_ip(i):
+    """Adresse (réseau de test 198.18.0.0/15) du visiteur n° i."""
+    return f'198.{18 + i // 65536 % 2}.{i // 256 % 256}.{i % 256}'
+
+
+async def run_load(base_url, concurrency, total, stream=False, visitors=0, ip_header='X-Real-IP'):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        # Jeton CSRF : cookie posé par la page d'accueil
+        home = await client.get('/')
+        csrf = home.cookies.get('csrftoken') or client.cookies.get('csrftoken') or ''
+        headers = {'X-CSRFToken': csrf, 'Referer': base_url + '/'}
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, first_chunks, statuses = [], [], Counter()
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                body = {'message': f'Question de test {i}', 'stream': stream}
+                request_headers = headers
+                if ip_header:
+                    request_headers = {**headers, ip_header: visitor_ip(i % visitors if visitors else i)}
+                first = None
+                try:
+                    async with client.stream('POST', '/api/assistant/', json=body, headers=request_headers) as r:
+                        status = r.status_code
+                        async for _ in r.aiter_lines():
+                            if first is None:
+                                first = time.perf_counter() - start
+                except Exception:
+                    status = 'exception'
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                    if stream and first is not None:
+                        first_chunks.append(first)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return time.perf_counter() - start, latencies, first_chunks, statuses
+
+
+class Command(BaseCommand):
+    help = 'Test de charge de l\'assistant (requêtes simultanées)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--stream', action='store_true', help='Réponses en flux (NDJSON)')
+        parser.add_argument('--visitors', type=int, default=0,
+                            help='Nombre de visiteurs distincts (0 = un par requête)')
+        parser.add_argument('--ip-header', default=getattr(settings, 'CLIENT_IP_HEADER', 'X-Real-IP'),
+                            help='En-tête portant l\'adresse du visiteur (vide = toutes les requêtes depuis la même IP)')
+
+    def handle(self, *args, **options):
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            raise CommandError('httpx est requis : pip install httpx')
+        elapsed, latencies, first_chunks, statuses = asyncio.run(run_load(
+            options['base_url'].rstrip('/'), options['concurrency'], options['requests'], options['stream'],
+            options['visitors'], options['ip_header'],
+        ))
+        errors = sum(statuses.values()) - statuses[200]
+        self.stdout.write(f'{len(latencies)} réponse(s), {errors} erreur(s) en {elapsed:.1f} s '
+                          f'({len(latencies) / elapsed:.1f} req/s)')
+        if errors:
+            self.stdout.write('Erreurs : ' + ', '.join(
+                f'{status} × {count}' for status, count in sorted(statuses.items(), key=str) if status != 200))
+        if statuses[429]:
+            self.stdout.write(self.style.WARNING(
+                '429 : limite par visiteur atteinte. Plus de visiteurs (--visitors), et le serveur doit lire '
+                '--ip-header (CLIENT_IP_HEADER, client dans TRUSTED_PROXIES).'))
+        if statuses[503]:
+            self.stdout.write(self.style.WARNING(
+                '503 : appels simultanés au modèle limités par processus (ASSISTANT_MAX_IN_FLIGHT) ou disjoncteur '
+                f'ouvert. Pour le test, relancer le serveur avec ASSISTANT_MAX_IN_FLIGHT={options["concurrency"]}.'))
+        self.stdout.write(f'Latence p50 {percentile(latencies, 0.5):.2f} s, p95 {percentile(latencies, 0.95):.2f} s, '
+                          f'max {max(latencies, default=0):.2f} s')
+        if first_chunks:
+            self.stdout.write(f'Premier fragment p50 {percentile(first_chunks, 0.5):.2f} s, '
+                              f'p95 {percentile(first_chunks, 0.95):.2f} s')
@@ -0,0 +1,32 @@
+"""
+Commande Django pour recalculer les cumuls quotidiens des visites (DailyPageViewStat) et les esquisses
+des visiteurs uniques (DailyVisitorSketch) depuis PageView.
+En mode 'buffered', les cumuls sont tenus à jour au vidage du tampon ; cette commande sert au rattrapage
+(import, réglage PAGEVIEW_ROLLUP_ON_WRITE désactivé). En mode 'sync', elle seule les tient à jour :
+à lancer en tâche planifiée (ex. toutes les 5 minutes : python manage.py rollup_pageviews --days 1).
+Usage: python manage.py rollup_pageviews [--days 2] [--all]
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.stats import rebuild_daily_stats, rebuild_visitor_sketches
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les cumuls quotidiens des visites du tableau de bord'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Nombre de jours à recalculer (aujourd\'hui inclus)')
+        parser.add_argument('--all', action='store_true', help='Recalculer tout l\'historique')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            start_date = None
+        else:
+            start_date = timezone.localdate() - timedelta(days=max(options['days'], 1) - 1)
+        written = rebuild_daily_stats(start_date)
+        sketches = rebuild_visitor_sketches(start_date)
+        since = 'tout l\'historique' if start_date is None else f'depuis le {start_date:%d/%m/%Y}'
+        self.stdout.write(self.style.SUCCESS(f'[OK] {written} cumul(s) et {sketches} esquisse(s) recalculé(s), {since}'))
@@ -0,0 +1,54 @@
+"""
+Commande Django pour préchauffer le cache de pages (après un déploiement ou un vidage du cache) :
+chaque URL du sitemap (StaticSitemap, ServiceSitemap, BlogSitemap) est rendue en interne, comme pour un
+visiteur anonyme, et mise en cache. Affiche la durée de rendu de chaque page.
+Usage: python manage.py warm_cache [--concurrency 4] [--top 10]
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import sitemap_paths, top_paths, warm_paths
+
+
+class Command(BaseCommand):
+    help = 'Préchauffe le cache de pages avec les URL du sitemap'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'WARM_CACHE_CONCURRENCY', 4),
+                            help='Pages rendues en parallèle')
+        parser.add_argument('--top', type=int, default=0,
+                            help='Seulement les N pages les plus visitées (7 derniers jours), en plus de l\'accueil')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+            raise CommandError('Cache de pages désactivé (PAGE_CACHE_ENABLED)')
+        paths = sitemap_paths()
+        if options['top'] > 0:
+            visited = set(top_paths(options['top']))
+            paths = [path for path in paths if path == '/' or path in visited]
+
+        start = time.perf_counter()
+        results = warm_paths(paths, max(options['concurrency'], 1))
+        elapsed = time.perf_counter() - start
+
+        for result in results:
+            state = 'déjà en cache' if result.hit else ('rendue' if result.status == 200 else 'non mise en cache')
+            if result.error:
+                state = f'erreur : {result.error}'
+            line = f'{result.status} {result.duration_ms:8.1f} ms  {result.path}  ({state})'
+            if result.error:
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line if result.status == 200 else self.style.WARNING(line))
+
+        rendered = sum(1 for result in results if result.status == 200 and not result.hit)
+        errors = sum(1 for result in results if result.status != 200)
+        slowest = max(results, key=lambda result: result.duration_ms, default=None)
+        summary = f'[OK] {len(results)} page(s) en {elapsed:.1f} s : {rendered} rendue(s), {len(results) - rendered - errors} déjà en cache'
+        if slowest is not None:
+            summary += f' ; la plus lente : {slowest.path} ({slowest.duration_ms:.0f} ms)'
+        self.stdout.write(self.style.SUCCESS(summary))
+        if errors:
+            self.stdout.write(self.style.WARNING(f'[ERREUR] {errors} page(s) sans réponse 200'))
@@ -2,13 +2,40 @@
 Middleware pour tracker les visites sur le site.
 Une même page vue par la même session (ou la même IP si pas de session) dans les 24 h
 ne compte qu'une seule fois, pour éviter de compter chaque rechargement ou changement de page.
-Géolocalisation par IP via ip-api.com (gratuit, cache 24h).
+La déduplication se fait sans requête en base (cache Django ou filtre de Bloom, voir core.dedup).
+Géolocalisation par IP hors ligne (base de plages locale, voir core.geoip), complétée
+en arrière-plan via ip-api.com si GEOIP_HTTP_ENRICHMENT est actif.
+
+Deux modes d'écriture (réglage PAGEVIEW_TRACKING_MODE) :
+- 'sync' : la visite est enregistrée pendant la requête ;
+- 'buffered' : le middleware dépose seulement un enregistrement compact dans un tampon
+  en mémoire, vidé en arrière-plan par lots (bulk_create). Déduplication, géolocalisation
+  et insertion sortent alors du temps de réponse.
+Le middleware fonctionne en WSGI comme en ASGI (vues asynchrones non bloquées).
 """
-import re
+import threading
+import time
+from collections import namedtuple
 from datetime import timedelta
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import OperationalError, transaction
 from django.utils import timezone
-from django.core.cache import cache
+from .buffers import BufferedWriter
+from .clientip import client_ip
+from .dedup import get_visit_dedup
+from .geoip import get_geo_resolver, schedule_http_enrichment
+from .live import publish_visits
 from .models import PageView
+from .stats import record_daily_stats, record_visitor_sketches
+from .useragent import BOT_PATTERNS, classify_user_agent
+
+# Base verrouillée par un autre worker (SQLite) : nouvelles tentatives du lot
+SAVE_ATTEMPTS = 3
+
+
+# Enregistrement compact déposé par le middleware (aucun accès base pendant la requête)
+VisitRecord = namedtuple('VisitRecord', 'path ip_address session_key user_agent referer is_bot')
 
 
 def get_device_type(user_agent):
@@ -16,31 +43,121 @@ def get_device_type(user_agent):
     Détermine le type d'appareil à partir du User-Agent.
     Ordre : tablette → mobile → desktop → other.
     """
-    if not user_agent:
-        return PageView.DEVICE_OTHER
-    ua = user_agent.lower()
-    # Tablettes (avant mobile car iPad contient "mobile")
-    if any(x in ua for x in ('ipad', 'tablet', 'playbook', 'silk/', 'kftt', 'kindle', 'gt-p', 'sm-t', 'tab')):
-        return PageView.DEVICE_TABLET
-    # Mobile
-    if any(x in ua for x in ('mobile', 'android', 'iphone', 'ipod', 'webos', 'blackberry', 'opera mini', 'iemobile', 'windows phone')):
-        return PageView.DEVICE_MOBILE
-    # Desktop (navigateurs classiques)
-    if any(x in ua for x in ('windows', 'macintosh', 'linux', 'x11', 'cros', 'openbsd')):
-        return PageView.DEVICE_DESKTOP
-    return PageView.DEVICE_OTHER
+    return classify_user_agent(user_agent)[1]
+
+
+def get_country_from_ip(ip_address):
+    """Pays, code pays et ville de l'IP via le résolveur configuré (voir core.geoip)."""
+    return get_geo_resolver().lookup(ip_address)
+
+
+def save_visits(records, rollup=True):
+    """
+    Enregistre un lot de visites (VisitRecord) en une seule insertion.
+    Une même page par même visiteur (session ou IP) ne compte qu'une fois sur 24 h,
+    y compris à l'intérieur du lot. Avec le backend de déduplication 'db', la fenêtre
+    de 24 h est vérifiée ici en base ; sinon le middleware l'a déjà fait.
+    rollup : cumuls et esquisses du lot mis à jour (si PAGEVIEW_ROLLUP_ON_WRITE) ; False pour une visite
+    enregistrée pendant la requête (mode 'sync'), laissée à la commande rollup_pageviews.
+    """
+    check_db = get_visit_dedup() is None
+    # Géolocalisation différée : laissée à la commande enrich_pageviews
+    deferred_geo = getattr(settings, 'PAGEVIEW_DEFERRED_GEO', False)
+    cutoff = timezone.now() - timedelta(hours=24)
+    seen = set()
+    rows = []
+    for record in records:
+        already = False
+        if record.session_key:
+            dedup_key = (record.path, 's', record.session_key)
+            if check_db:
+                already = PageView.objects.filter(
+                    path=record.path,
+                    session_key=record.session_key,
+                    created_at__gte=cutoff,
+                ).exists()
+        else:
+            dedup_key = (record.path, 'ip', record.ip_address)
+            if check_db:
+                already = PageView.objects.filter(
+                    path=record.path,
+                    ip_address=record.ip_address,
+                    created_at__gte=cutoff,
+                ).exists()
+        if already or dedup_key in seen:
+            continue
+        seen.add(dedup_key)
+
+        if deferred_geo:
+            country, country_code, city = '', '', ''
+        else:
+            country, country_code, city = get_country_from_ip(record.ip_address)
+        rows.append(PageView(
+            path=record.path,
+            ip_address=record.ip_address,
+            session_key=record.session_key,
+            device_type=get_device_type(record.user_agent),
+            country=country or '',
+            country_code=country_code or '',
+            city=city or '',
+            user_agent=record.user_agent,
+            referer=record.referer,
+            is_bot=record.is_bot,
+        ))
+    if rows:
+        _write_visits(rows, rollup and getattr(settings, 'PAGEVIEW_ROLLUP_ON_WRITE', False))
+        publish_visits(rows)
+        if not deferred_geo:
+            schedule_http_enrichment(row.ip_address for row in rows if not row.country_code)
+    return rows
+
+
+def _write_visits(rows, rollup):
+    """
+    Visites et cumuls dans une même transaction : un échec des cumuls ne laisse pas de visites non comptées.
+    Base verrouillée : le lot entier est rejoué (jusqu'à SAVE_ATTEMPTS fois) plutôt que perdu.
+    """
+    for attempt in range(1, SAVE_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                PageView.objects.bulk_create(rows)
+                if rollup:
+                    record_daily_stats(rows)
+                    record_visitor_sketches(rows)
+            return
+        except OperationalError:
+            if attempt == SAVE_ATTEMPTS:
+                raise
+            for row in rows:
+                row.pk = None
+            time.sleep(0.1 * attempt)
+
+
+_visit_buffer = None
+_visit_buffer_lock = threading.Lock()
+
+
+def get_visit_buffer():
+    """Tampon des visites du processus (créé au premier appel, réglages PAGEVIEW_BUFFER_*)."""
+    global _visit_buffer
+    if _visit_buffer is None:
+        with _visit_buffer_lock:
+            if _visit_buffer is None:
+                _visit_buffer = BufferedWriter(
+                    save_visits,
+                    max_size=getattr(settings, 'PAGEVIEW_BUFFER_MAX_SIZE', 10000),
+                    batch_size=getattr(settings, 'PAGEVIEW_BUFFER_BATCH_SIZE', 100),
+                    interval_ms=getattr(settings, 'PAGEVIEW_BUFFER_FLUSH_INTERVAL_MS', 1000),
+                    name='pageview-buffer',
+                )
+    return _visit_buffer
 
 
 class PageViewTrackingMiddleware:
     """Middleware pour tracker les visites."""
     
-    # Patterns pour détecter les bots
-    BOT_PATTERNS = [
-        r'bot', r'crawler', r'spider', r'scraper',
-        r'facebookexternalhit', r'twitterbot', r'linkedinbot',
-        r'whatsapp', r'telegram', r'skype', r'googlebot',
-        r'bingbot', r'yandex', r'baiduspider', r'duckduckbot'
-    ]
+    # Patterns pour détecter les bots (voir core.useragent)
+    BOT_PATTERNS = BOT_PATTERNS
     
     # Chemins à ignorer
     IGNORE_PATHS = [
@@ -49,24 +166,34 @@ class PageViewTrackingMiddleware:
         '/media/',
         '/favicon.ico',
         '/robots.txt',
+        '/statistiques/api/',  # sondage du tableau de bord
     ]
     
+    sync_capable = True
+    async_capable = True
+    
     def __init__(self, get_response):
         self.get_response = get_response
+        self.buffered = getattr(settings, 'PAGEVIEW_TRACKING_MODE', 'sync') == 'buffered'
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
     
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         # Tracker la visite avant la réponse
         self.track_page_view(request)
         
         response = self.get_response(request)
         return response
     
+    async def __acall__(self, request):
+        await sync_to_async(self.track_page_view)(request)
+        return await self.get_response(request)
+    
     def is_bot(self, user_agent):
         """Vérifier si le user agent est un bot."""
-        if not user_agent:
-            return False
-        user_agent_lower = user_agent.lower()
-        return any(re.search(pattern, user_agent_lower) for pattern in self.BOT_PATTERNS)
+        return classify_user_agent(user_agent)[0]
     
     def should_track(self, request):
         """Déterminer si on doit tracker cette visite."""
@@ -85,89 +212,50 @@ class PageViewTrackingMiddleware:
         return True
     
     def get_country_from_ip(self, ip_address):
-        """
-        Obtenir pays, code pays et ville depuis l'IP via ip-api.com.
-        Résultat mis en cache 24h par IP pour respecter la limite (45 req/min).
-        """
-        if not ip_address or ip_address in ('127.0.0.1', '::1'):
-            return None, None, None
-        # IPs privées : pas d'appel API
-        if ip_address.startswith(('10.', '172.16.', '172.17.', '172.18.', '172.19.', '172.20.', '172.21.', '172.22.', '172.23.', '172.24.', '172.25.', '172.26.', '172.27.', '172.28.', '172.29.', '172.30.', '172.31.', '192.168.')):
-            return None, None, None
-        cache_key = f"geo_ip_{ip_address}"
-        cached = cache.get(cache_key)
-        if cached is not None:
-            return cached
-        try:
-            import urllib.request
-            url = f"http://ip-api.com/json/{ip_address}?fields=status,country,countryCode,city"
-            req = urllib.request.Request(url, headers={'User-Agent': 'FasowebStats/1.0'})
-            with urllib.request.urlopen(req, timeout=2) as resp:
-                data = resp.read().decode()
-            import json
-            info = json.loads(data)
-            if info.get('status') == 'success':
-                result = (info.get('country') or '', (info.get('countryCode') or '')[:2], info.get('city') or '')
-                cache.set(cache_key, result, 86400)  # 24h
-                return result
-        except Exception:
-            pass
-        cache.set(cache_key, (None, None, None), 300)  # 5 min en cas d'échec pour ne pas surcharger
-        return None, None, None
+        """Obtenir pays, code pays et ville depuis l'IP (voir get_country_from_ip)."""
+        return get_country_from_ip(ip_address)
+    
+    def build_visit(self, request):
+        """Construit l'enregistrement compact de la visite, ou None si rien à enregistrer."""
+        ip_address = client_ip(request)
+        if not ip_address:
+            return None
+        
+        # Utiliser la session si disponible pour dédupliquer (une visite par page par session sur 24 h)
+        session_key = ''
+        if hasattr(request, 'session') and request.session.session_key:
+            session_key = request.session.session_key
+        
+        return VisitRecord(
+            path=request.path[:500],
+            ip_address=ip_address,
+            session_key=session_key,
+            user_agent=(request.META.get('HTTP_USER_AGENT') or '')[:500],
+            referer=(request.META.get('HTTP_REFERER') or '')[:2000],
+            is_bot=self.is_bot(request.META.get('HTTP_USER_AGENT', '')),
+        )
     
     def track_page_view(self, request):
         """
         Enregistre une visite de page.
         Une même page par même visiteur (session ou IP) ne compte qu'une fois sur 24 h.
+        En mode 'buffered', la visite est seulement mise en file (aucun accès base ici).
         """
         if not self.should_track(request):
             return
         
         try:
-            ip_address = request.META.get('REMOTE_ADDR', '')
-            if not ip_address:
+            record = self.build_visit(request)
+            if record is None:
                 return
-            
-            path = request.path[:500]
-            cutoff = timezone.now() - timedelta(hours=24)
-            
-            # Utiliser la session si disponible pour dédupliquer (une visite par page par session sur 24 h)
-            session_key = ''
-            if hasattr(request, 'session') and request.session.session_key:
-                session_key = request.session.session_key
-            
-            if session_key:
-                already = PageView.objects.filter(
-                    path=path,
-                    session_key=session_key,
-                    created_at__gte=cutoff,
-                ).exists()
-            else:
-                already = PageView.objects.filter(
-                    path=path,
-                    ip_address=ip_address,
-                    created_at__gte=cutoff,
-                ).exists()
-            
-            if already:
+            dedup = get_visit_dedup()
+            visitor = f's:{record.session_key}' if record.session_key else f'ip:{record.ip_address}'
+            if dedup is not None and dedup.seen(record.path, visitor):
                 return
-            
-            country, country_code, city = self.get_country_from_ip(ip_address)
-            referer = (request.META.get('HTTP_REFERER') or '')[:2000]
-            user_agent = (request.META.get('HTTP_USER_AGENT') or '')[:500]
-            device_type = get_device_type(user_agent)
-            
-            PageView.objects.create(
-                path=path,
-                ip_address=ip_address,
-                session_key=session_key,
-                device_type=device_type,
-                country=country or '',
-                country_code=country_code or '',
-                city=city or '',
-                user_agent=user_agent,
-                referer=referer,
-                is_bot=self.is_bot(request.META.get('HTTP_USER_AGENT', '')),
-            )
+            if self.buffered:
+                get_visit_buffer().put(record)
+            else:
+                # Cumuls hors de la requête : rollup_pageviews (une seule insertion ici)
+                save_visits([record], rollup=False)
         except Exception:
             pass
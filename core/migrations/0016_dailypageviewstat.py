@@ -0,0 +1,104 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:16
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    """Calcule les cumuls quotidiens à partir des visites déjà enregistrées."""
+    PageView = apps.get_model("core", "PageView")
+    DailyPageViewStat = apps.get_model("core", "DailyPageViewStat")
+    rows = (
+        PageView.objects.filter(is_bot=False)
+        .annotate(day=TruncDate("created_at"))
+        .values("day", "path", "country_code", "device_type")
+        .annotate(total=Count("id"), country_name=Max("country"))
+        .order_by()
+    )
+    DailyPageViewStat.objects.bulk_create(
+        (
+            DailyPageViewStat(
+                date=row["day"],
+                path=row["path"],
+                country_code=row["country_code"],
+                country=row["country_name"] or "",
+                device_type=row["device_type"],
+                count=row["total"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_processingcheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyPageViewStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Date")),
+                (
+                    "path",
+                    models.CharField(max_length=500, verbose_name="Chemin de la page"),
+                ),
+                (
+                    "country_code",
+                    models.CharField(
+                        blank=True, max_length=2, verbose_name="Code pays"
+                    ),
+                ),
+                (
+                    "country",
+                    models.CharField(blank=True, max_length=100, verbose_name="Pays"),
+                ),
+                (
+                    "device_type",
+                    models.CharField(
+                        choices=[
+                            ("desktop", "Ordinateur"),
+                            ("mobile", "Mobile"),
+                            ("tablet", "Tablette"),
+                            ("other", "Autre"),
+                        ],
+                        default="other",
+                        max_length=20,
+                        verbose_name="Type d'appareil",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(default=0, verbose_name="Visites"),
+                ),
+            ],
+            options={
+                "verbose_name": "Cumul quotidien des visites",
+                "verbose_name_plural": "Cumuls quotidiens des visites",
+                "ordering": ["-date"],
+                "indexes": [
+                    models.Index(fields=["date"], name="core_dailyp_date_5e2f01_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "path", "country_code", "device_type"),
+                        name="unique_daily_pageview_stat",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:19
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+from core.hyperloglog import HyperLogLog
+
+
+def backfill_visitor_sketches(apps, schema_editor):
+    """Construit les esquisses quotidiennes à partir des visites déjà enregistrées."""
+    PageView = apps.get_model("core", "PageView")
+    DailyVisitorSketch = apps.get_model("core", "DailyVisitorSketch")
+    sketches = {}
+    rows = (
+        PageView.objects.filter(is_bot=False)
+        .annotate(day=TruncDate("created_at"))
+        .values_list("day", "session_key", "ip_address")
+    )
+    for day, session_key, ip_address in rows.iterator():
+        sketch = sketches.setdefault(day, HyperLogLog())
+        sketch.add(f"s:{session_key}" if session_key else f"ip:{ip_address}")
+    DailyVisitorSketch.objects.bulk_create(
+        [
+            DailyVisitorSketch(date=day, registers=sketch.to_bytes())
+            for day, sketch in sketches.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_dailypageviewstat"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyVisitorSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True, verbose_name="Date")),
+                ("registers", models.BinaryField(verbose_name="Registres HyperLogLog")),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Date de mise à jour"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Esquisse des visiteurs uniques",
+                "verbose_name_plural": "Esquisses des visiteurs uniques",
+                "ordering": ["-date"],
+            },
+        ),
+        migrations.RunPython(backfill_visitor_sketches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_dailyvisitorsketch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assistantquestion",
+            name="answer",
+            field=models.TextField(blank=True, default="", verbose_name="Réponse"),
+        ),
+        migrations.AddField(
+            model_name="assistantquestion",
+            name="approved",
+            field=models.BooleanField(
+                default=False,
+                help_text="Réutilisée telle quelle par l'assistant pour les questions similaires",
+                verbose_name="Réponse validée",
+            ),
+        ),
+        migrations.AddField(
+            model_name="assistantquestion",
+            name="source",
+            field=models.CharField(
+                choices=[
+                    ("llm", "Modèle (DeepSeek)"),
+                    ("faq", "FAQ"),
+                    ("approved", "Réponse validée"),
+                ],
+                default="llm",
+                max_length=10,
+                verbose_name="Source de la réponse",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_assistant_answers"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="assistantquestion",
+            name="source",
+            field=models.CharField(
+                choices=[
+                    ("llm", "Modèle (DeepSeek)"),
+                    ("faq", "FAQ"),
+                    ("approved", "Réponse validée"),
+                    ("cache", "Cache (conversation déjà vue)"),
+                ],
+                default="llm",
+                max_length=10,
+                verbose_name="Source de la réponse",
+            ),
+        ),
+    ]
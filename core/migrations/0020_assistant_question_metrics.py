@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_assistant_cache_source"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assistantquestion",
+            name="cache_hit",
+            field=models.BooleanField(default=False, verbose_name="Réponse du cache"),
+        ),
+        migrations.AddField(
+            model_name="assistantquestion",
+            name="completion_tokens",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Jetons générés"
+            ),
+        ),
+        migrations.AddField(
+            model_name="assistantquestion",
+            name="latency_ms",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Durée de l'appel au modèle (ms)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="assistantquestion",
+            name="prompt_tokens",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Jetons envoyés"
+            ),
+        ),
+    ]
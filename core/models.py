@@ -417,7 +417,28 @@ class PageView(models.Model):
 
 class AssistantQuestion(models.Model):
     """Questions posées par les visiteurs à l'assistant (chat) sur le site."""
+    SOURCE_LLM = 'llm'
+    SOURCE_FAQ = 'faq'
+    SOURCE_APPROVED = 'approved'
+    SOURCE_CACHE = 'cache'
+    SOURCE_CHOICES = [
+        (SOURCE_LLM, 'Modèle (DeepSeek)'),
+        (SOURCE_FAQ, 'FAQ'),
+        (SOURCE_APPROVED, 'Réponse validée'),
+        (SOURCE_CACHE, 'Cache (conversation déjà vue)'),
+    ]
+
     content = models.TextField(verbose_name="Question")
+    answer = models.TextField(blank=True, default='', verbose_name="Réponse")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_LLM, verbose_name="Source de la réponse")
+    approved = models.BooleanField(
+        default=False, verbose_name="Réponse validée",
+        help_text="Réutilisée telle quelle par l'assistant pour les questions similaires",
+    )
+    cache_hit = models.BooleanField(default=False, verbose_name="Réponse du cache")
+    latency_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name="Durée de l'appel au modèle (ms)")
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True, verbose_name="Jetons envoyés")
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True, verbose_name="Jetons générés")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date")
 
     class Meta:
@@ -452,3 +473,72 @@ class PageBanner(models.Model):
 
     def __str__(self):
         return f"{self.get_page_display()} #{self.order}"
+
+
+class ProcessingCheckpoint(models.Model):
+    """Point de reprise d'un traitement par lots : plus grand id déjà traité (ex. géolocalisation différée)."""
+    name = models.CharField(max_length=50, unique=True, verbose_name="Traitement")
+    last_id = models.BigIntegerField(default=0, verbose_name="Dernier id traité")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
+
+    class Meta:
+        verbose_name = "Point de reprise"
+        verbose_name_plural = "Points de reprise"
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} : {self.last_id}"
+
+
+class DailyPageViewStat(models.Model):
+    """
+    Cumul quotidien des visites (hors bots) par page, pays et type d'appareil.
+    Alimenté à l'écriture des visites et par la commande rollup_pageviews ; le tableau de bord
+    lit ces cumuls au lieu de compter la table PageView.
+    """
+    date = models.DateField(verbose_name="Date")
+    path = models.CharField(max_length=500, verbose_name="Chemin de la page")
+    country_code = models.CharField(max_length=2, blank=True, verbose_name="Code pays")
+    country = models.CharField(max_length=100, blank=True, verbose_name="Pays")
+    device_type = models.CharField(
+        max_length=20,
+        choices=PageView.DEVICE_CHOICES,
+        default=PageView.DEVICE_OTHER,
+        verbose_name="Type d'appareil",
+    )
+    count = models.PositiveIntegerField(default=0, verbose_name="Visites")
+
+    class Meta:
+        verbose_name = "Cumul quotidien des visites"
+        verbose_name_plural = "Cumuls quotidiens des visites"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'path', 'country_code', 'device_type'],
+                name='unique_daily_pageview_stat',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.path} ({self.country_code or '—'}, {self.device_type}) : {self.count}"
+
+
+class DailyVisitorSketch(models.Model):
+    """
+    Esquisse HyperLogLog des visiteurs (session ou IP) d'une journée : quelques Ko par jour,
+    fusionnable pour estimer les visiteurs uniques d'une semaine ou d'un mois (voir core.hyperloglog).
+    """
+    date = models.DateField(unique=True, verbose_name="Date")
+    registers = models.BinaryField(verbose_name="Registres HyperLogLog")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
+
+    class Meta:
+        verbose_name = "Esquisse des visiteurs uniques"
+        verbose_name_plural = "Esquisses des visiteurs uniques"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Visiteurs du {self.date}"
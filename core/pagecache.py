@@ -0,0 +1,192 @@
+"""
+Cache de pages complètes pour les visiteurs anonymes (PageCacheMiddleware).
+Les pages publiques sont identiques pour tous les visiteurs anonymes : le HTML rendu est gardé dans le cache
+Django, indexé par URL complète (schéma, hôte, chemin, chaîne de requête : lien canonique et og:url en dépendent). Seul le jeton CSRF diffère d'un visiteur à l'autre : il est
+remplacé par un marqueur à l'écriture et par le jeton du visiteur à la lecture.
+Pas de cache pour les utilisateurs connectés, les requêtes autres que GET/HEAD ni quand des messages
+(django.contrib.messages) sont en attente.
+
+Invalidation par le registre des dépendances (core.cache_registry) : une entrée garde les versions des modèles
+que sa page affiche ; si l'un d'eux a changé depuis, l'entrée est ignorée et la page recalculée.
+
+GET conditionnel : ces mêmes versions donnent l'ETag et le Last-Modified de la page ; une requête
+If-None-Match / If-Modified-Since encore valide reçoit un 304 avant toute lecture d'entrée ou tout rendu.
+
+Déploiement : gabarits et fichiers statiques changent sans qu'aucun modèle ne soit modifié. L'identifiant du
+déploiement (CACHE_BUILD_ID, sinon empreinte du manifeste staticfiles.json écrit par collectstatic) entre dans la
+clé des entrées et dans l'ETag, et la date du manifeste borne le Last-Modified : l'ancien HTML n'est plus servi.
+"""
+import hashlib
+import os
+import re
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import cache_registry
+
+CACHED_PAGES = (
+    'home', 'services_list', 'service_detail', 'maintenance_page', 'about', 'team',
+    'blog_list', 'blog_detail', 'blog_category', 'blog_tag',
+    'seo_ouagadougou', 'seo_bobo', 'legal', 'privacy',
+)
+
+CSRF_PLACEHOLDER = b'__CSRF_TOKEN_PLACEHOLDER__'
+_CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+@lru_cache(maxsize=4)
+def _manifest_build(path):
+    """(empreinte, date) du manifeste des fichiers statiques ; ('', 0) sans collectstatic (développement)."""
+    try:
+        with open(path, 'rb') as manifest:
+            content = manifest.read()
+            built_at = os.fstat(manifest.fileno()).st_mtime
+    except OSError:
+        return '', 0
+    return hashlib.blake2b(content, digest_size=8).hexdigest(), int(built_at)
+
+
+def build_id():
+    """(identifiant, date en secondes) du déploiement courant."""
+    static_root = getattr(settings, 'STATIC_ROOT', None)
+    manifest_id, built_at = _manifest_build(os.path.join(static_root, 'staticfiles.json')) if static_root else ('', 0)
+    return getattr(settings, 'CACHE_BUILD_ID', '') or manifest_id, built_at
+
+
+def page_key(request):
+    raw = f'{build_id()[0]}:{request.build_absolute_uri()}'.encode('utf-8')
+    return f'page:{hashlib.blake2b(raw, digest_size=16).hexdigest()}'
+
+
+def get_cached_page(request, url_name):
+    """
+    Entrée en cache de la page (ou None) et versions courantes de ses dépendances,
+    lues en un seul aller-retour avec l'entrée.
+    """
+    key = page_key(request)
+    found = cache.get_many([key] + cache_registry.version_keys(url_name))
+    versions = cache_registry.versions(url_name, found)
+    entry = found.get(key)
+    if entry is None or entry[0] != url_name or entry[1] != versions:
+        return None, versions
+    return entry, versions
+
+
+def store_page(request, url_name, versions, response):
+    content = _CSRF_INPUT_RE.sub(rb'\1' + CSRF_PLACEHOLDER + rb'\2', response.content)
+    entry = (url_name, versions, response.get('Content-Type'), content)
+    cache.set(page_key(request), entry, getattr(settings, 'PAGE_CACHE_TIMEOUT', 600))
+
+
+def page_validators(request, url_name, versions):
+    """(ETag, Last-Modified en secondes) de la page, d'après les versions de ses dépendances et le déploiement."""
+    build, built_at = build_id()
+    raw = f'{build}:{url_name}:{request.build_absolute_uri()}:{":".join(map(str, versions))}'.encode('utf-8')
+    last_modified = max(int(cache_registry.last_modified(versions)), built_at)
+    return f'"{hashlib.blake2b(raw, digest_size=12).hexdigest()}"', last_modified
+
+
+def set_validators(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    if not response.has_header('Cache-Control'):
+        # Le navigateur revalide à chaque fois (réponse 304 si rien n'a changé)
+        patch_cache_control(response, no_cache=True)
+
+
+def render_cached_page(request, entry):
+    content = entry[3]
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode('ascii'))
+    response = HttpResponse(content, content_type=entry[2])
+    response['X-Page-Cache'] = 'hit'
+    return response
+
+
+def is_anonymous(request):
+    """Visiteur anonyme ? Sans cookie de session, la session n'est même pas chargée."""
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    user = getattr(request, 'user', None)
+    return user is None or not user.is_authenticated
+
+
+def has_pending_messages(request):
+    """Messages en attente (cookie ou session) : la page les affiche, elle ne doit être ni servie ni gardée."""
+    if getattr(settings, 'MESSAGE_COOKIE_NAME', 'messages') in request.COOKIES:
+        return True
+    # Messages gardés en session (stockage de repli quand le cookie déborde)
+    session = getattr(request, 'session', None)
+    return settings.SESSION_COOKIE_NAME in request.COOKIES and session is not None and '_messages' in session
+
+
+def is_cacheable_request(request):
+    if not getattr(settings, 'PAGE_CACHE_ENABLED', True) or request.method not in ('GET', 'HEAD'):
+        return False
+    return is_anonymous(request) and not has_pending_messages(request)
+
+
+def is_cacheable_response(response):
+    if response.status_code != 200 or response.streaming:
+        return False
+    # Réponse qui pose des cookies (session, messages) : propre à ce visiteur. Le cookie CSRF est reposé à la lecture.
+    return set(response.cookies) <= {settings.CSRF_COOKIE_NAME}
+
+
+class PageCacheMiddleware:
+    """
+    Sert les pages publiques depuis le cache pour les visiteurs anonymes.
+    À placer après PageViewTrackingMiddleware : la visite est enregistrée avant la lecture du cache.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.store(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if getattr(request, '_page_cache', None) is not None:
+            await sync_to_async(self.store)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match is None or match.url_name not in CACHED_PAGES or not is_cacheable_request(request):
+            return None
+        entry, versions = get_cached_page(request, match.url_name)
+        validators = page_validators(request, match.url_name, versions)
+        not_modified = get_conditional_response(request, etag=validators[0], last_modified=validators[1])
+        if not_modified is None and entry is not None:
+            response = render_cached_page(request, entry)
+        else:
+            response = not_modified
+        if response is not None:
+            set_validators(response, validators)
+            return response
+        request._page_cache = (match.url_name, versions, validators)
+        return None
+
+    def store(self, request, response):
+        pending = getattr(request, '_page_cache', None)
+        if pending is not None and is_cacheable_response(response):
+            store_page(request, pending[0], pending[1], response)
+            set_validators(response, pending[2])
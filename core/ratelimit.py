@@ -0,0 +1,110 @@
+"""
+Limitation du nombre d'appels par visiteur (session ou IP), par minute et par jour.
+Seau à jetons (algorithme GCRA) : une limite de n appels par fenêtre rend un jeton toutes les fenêtre / n
+secondes, jusqu'à n jetons (rafale). L'état d'un visiteur tient dans une seule clé du cache (heure théorique
+d'arrivée pour chaque fenêtre), lue et réécrite en une seule opération atomique :
+- Redis : script Lua, un seul aller-retour ;
+- cache en mémoire du processus (développement, un seul worker) : verrou du processus ;
+- table en base (DatabaseCache) : transaction, atomique sous SQLite grâce aux transactions IMMEDIATE (DATABASES).
+Les autres backends (memcached, DatabaseCache hors SQLite) n'ont pas d'opération atomique : avertissement
+core.W001 au démarrage (core.checks). Le cache doit être partagé entre workers pour limiter le site entier.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import connections, router, transaction
+
+WINDOWS = (('minute', 60), ('day', 86400))
+
+# KEYS[1] : état du visiteur ; ARGV : maintenant, durée de vie de la clé, puis (fenêtre, limite) par fenêtre
+REDIS_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tats = {}
+local state = redis.call('GET', KEYS[1])
+if state then
+    for value in string.gmatch(state, '[^,]+') do tats[#tats + 1] = tonumber(value) end
+end
+local new_tats = {}
+local retry_after = 0
+for i = 1, (#ARGV - 2) / 2 do
+    local window = tonumber(ARGV[1 + 2 * i])
+    local limit = tonumber(ARGV[2 + 2 * i])
+    local tat = tats[i] or 0
+    if limit > 0 then
+        tat = math.max(tat, now) + window / limit
+        if tat - now > window then retry_after = math.max(retry_after, tat - now - window) end
+    end
+    new_tats[i] = string.format('%.3f', tat)
+end
+if retry_after > 0 then return math.max(1, math.ceil(retry_after)) end
+redis.call('SET', KEYS[1], table.concat(new_tats, ','), 'EX', ARGV[2])
+return 0
+"""
+
+_local_lock = threading.Lock()
+
+
+def has_atomic_backend(backend):
+    """Le limiteur peut-il mettre à jour un seau en une opération atomique avec ce cache ?"""
+    if isinstance(backend, (RedisCache, LocMemCache)):
+        return True
+    if isinstance(backend, DatabaseCache):
+        connection = connections[router.db_for_write(backend.cache_model_class)]
+        return connection.vendor == 'sqlite' and connection.settings_dict.get(
+            'OPTIONS', {}).get('transaction_mode') in ('IMMEDIATE', 'EXCLUSIVE')
+    return False
+
+
+def take_token(state, now, buckets):
+    """
+    Nouvel état du seau après un appel ; buckets : [(fenêtre, limite)], limite 0 = pas de limite.
+    Retourne (nouvel état, 0) si l'appel est permis, sinon (None, secondes avant le prochain jeton).
+    Même calcul que REDIS_SCRIPT.
+    """
+    tats = [float(value) for value in state.split(',')] if state else []
+    new_tats = []
+    retry_after = 0
+    for i, (window, limit) in enumerate(buckets):
+        tat = tats[i] if i < len(tats) else 0
+        if limit > 0:
+            tat = max(tat, now) + window / limit
+            if tat - now > window:
+                retry_after = max(retry_after, tat - now - window)
+        new_tats.append(f'{tat:.3f}')
+    if retry_after > 0:
+        return None, max(1, math.ceil(retry_after))
+    return ','.join(new_tats), 0
+
+
+def hit_rate_limit(scope, identity, limits, now=None):
+    """
+    Compte un appel de identity ; limits : {'minute': n, 'day': n} (0 ou absent = pas de limite).
+    Retourne 0 si l'appel est autorisé (un jeton pris dans chaque seau), sinon le nombre de secondes
+    avant qu'un jeton soit disponible. Un appel refusé ne consomme rien.
+    """
+    now = time.time() if now is None else now
+    digest = hashlib.blake2b(identity.encode('utf-8'), digest_size=12).hexdigest()
+    key = f'rl:{scope}:{digest}'
+    buckets = [(window, limits.get(name) or 0) for name, window in WINDOWS]
+    # Seaux pleins au plus tard une fenêtre après le dernier appel : la clé peut alors disparaître
+    ttl = max(window for _, window in WINDOWS)
+    backend = caches['default']
+    if isinstance(backend, RedisCache):
+        args = [arg for bucket in buckets for arg in bucket]
+        client = backend._cache.get_client(key, write=True)
+        return int(client.eval(REDIS_SCRIPT, 1, backend.make_and_validate_key(key), now, ttl, *args))
+    if isinstance(backend, DatabaseCache):
+        lock = transaction.atomic(using=router.db_for_write(backend.cache_model_class))
+    else:
+        lock = _local_lock
+    with lock:
+        state, retry_after = take_token(backend.get(key), now, buckets)
+        if state is not None:
+            backend.set(key, state, ttl)
+    return retry_after
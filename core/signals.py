@@ -0,0 +1,32 @@
+"""
+Signaux de l'application : invalidation des index et caches dérivés des contenus.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache_registry, httpcache, warmup
+from .faq_index import invalidate_index
+from .models import FAQ, AssistantQuestion
+
+
+@receiver([post_save, post_delete], sender=FAQ)
+def faq_changed(sender, **kwargs):
+    invalidate_index()
+
+
+@receiver([post_save, post_delete], sender=AssistantQuestion)
+def assistant_question_changed(sender, instance, created=False, **kwargs):
+    # Seules les réponses validées sont indexées ; une question tout juste posée ne l'est jamais,
+    # une modification (validation, retrait, correction) peut l'être
+    if not created or instance.approved:
+        invalidate_index()
+
+
+# Versions des modèles lus par les vues et fragments en cache (pages, navigation)
+cache_registry.connect_signals()
+
+# Purge du proxy placé devant le site (CACHE_PURGE_URL)
+cache_registry.content_changed.connect(httpcache.queue_purge, dispatch_uid='httpcache_purge')
+
+# Préchauffage des pages les plus visitées touchées par la modification
+cache_registry.content_changed.connect(warmup.queue_warm, dispatch_uid='warmup_warm')
@@ -0,0 +1,372 @@
+"""
+Calculs du tableau de bord des statistiques.
+Les compteurs sont lus dans les cumuls quotidiens (DailyPageViewStat), tenus à jour à l'écriture
+des visites (record_daily_stats) et recalculables depuis PageView (rebuild_daily_stats,
+commande rollup_pageviews). Le coût du tableau de bord ne dépend plus du nombre de visites stockées.
+Les visiteurs uniques sont estimés par des esquisses HyperLogLog quotidiennes (DailyVisitorSketch),
+fusionnées pour les semaines et les mois.
+Le résultat est en plus mis en cache (get_dashboard_snapshot) : servi tel quel pendant
+STATISTICS_CACHE_TTL secondes, puis servi périmé pendant qu'une seule requête le recalcule en arrière-plan.
+"""
+import threading
+import time
+from collections import Counter
+from datetime import date as date_cls, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncYear
+from django.utils import timezone
+
+from .hyperloglog import HyperLogLog
+from .models import AssistantQuestion, DailyPageViewStat, DailyVisitorSketch, PageView
+
+
+def record_daily_stats(pageviews):
+    """Ajoute des visites qui viennent d'être insérées aux cumuls quotidiens."""
+    counts = Counter()
+    countries = {}
+    for pv in pageviews:
+        if pv.is_bot:
+            continue
+        key = (timezone.localdate(pv.created_at), pv.path, pv.country_code, pv.device_type)
+        counts[key] += 1
+        countries[key] = pv.country
+    for (date, path, country_code, device_type), n in counts.items():
+        lookup = dict(date=date, path=path, country_code=country_code, device_type=device_type)
+        if DailyPageViewStat.objects.filter(**lookup).update(count=F('count') + n):
+            continue
+        try:
+            with transaction.atomic():
+                DailyPageViewStat.objects.create(count=n, country=countries[(date, path, country_code, device_type)], **lookup)
+        except IntegrityError:
+            # Créé entre-temps par un autre worker
+            DailyPageViewStat.objects.filter(**lookup).update(count=F('count') + n)
+
+
+def rebuild_daily_stats(start_date=None, end_date=None, paths=None):
+    """
+    Recalcule les cumuls quotidiens depuis PageView entre deux dates incluses
+    (toutes les dates si non précisées), éventuellement pour certaines pages seulement.
+    Retourne le nombre de cumuls écrits.
+    """
+    views = PageView.objects.filter(is_bot=False)
+    stats = DailyPageViewStat.objects.all()
+    if paths is not None:
+        views = views.filter(path__in=paths)
+        stats = stats.filter(path__in=paths)
+    if start_date:
+        views = views.filter(created_at__date__gte=start_date)
+        stats = stats.filter(date__gte=start_date)
+    if end_date:
+        views = views.filter(created_at__date__lte=end_date)
+        stats = stats.filter(date__lte=end_date)
+    rows = (
+        views.annotate(day=TruncDate('created_at'))
+        .values('day', 'path', 'country_code', 'device_type')
+        .annotate(total=Count('id'), country_name=Max('country'))
+        .order_by()
+    )
+    with transaction.atomic():
+        stats.delete()
+        created = DailyPageViewStat.objects.bulk_create(
+            [
+                DailyPageViewStat(
+                    date=row['day'],
+                    path=row['path'],
+                    country_code=row['country_code'],
+                    country=row['country_name'] or '',
+                    device_type=row['device_type'],
+                    count=row['total'],
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def rebuild_daily_stats_for(pageview_ids):
+    """Recalcule les seuls cumuls (jour, page) des visites données, après une mise à jour (pays complété)."""
+    by_day = {}
+    for created_at, path in PageView.objects.filter(pk__in=pageview_ids, is_bot=False).values_list('created_at', 'path'):
+        by_day.setdefault(timezone.localdate(created_at), set()).add(path)
+    for day, paths in by_day.items():
+        rebuild_daily_stats(day, day, paths)
+    return len(by_day)
+
+
+def visitor_identity(session_key, ip_address):
+    """Identité d'un visiteur pour le comptage des uniques (même règle que la déduplication)."""
+    return f's:{session_key}' if session_key else f'ip:{ip_address}'
+
+
+def record_visitor_sketches(pageviews):
+    """
+    Ajoute les visiteurs d'un lot de visites qui viennent d'être insérées aux esquisses quotidiennes : identités
+    fusionnées en mémoire, puis une seule réécriture par jour et par lot. Appelée au vidage du tampon des visites,
+    jamais pendant une requête (mode 'sync' : rebuild_visitor_sketches via rollup_pageviews).
+    Lecture, fusion et écriture dans une transaction : select_for_update verrouille la ligne (PostgreSQL, MySQL) ;
+    sous SQLite, où il est sans effet, les transactions IMMEDIATE (réglage DATABASES) sérialisent les workers.
+    """
+    by_day = {}
+    for pv in pageviews:
+        if pv.is_bot:
+            continue
+        by_day.setdefault(timezone.localdate(pv.created_at), set()).add(visitor_identity(pv.session_key, pv.ip_address))
+    for date, identities in by_day.items():
+        with transaction.atomic():
+            row = DailyVisitorSketch.objects.select_for_update().filter(date=date).first()
+            sketch = HyperLogLog.from_bytes(bytes(row.registers)) if row else HyperLogLog()
+            for identity in identities:
+                sketch.add(identity)
+            if row:
+                row.registers = sketch.to_bytes()
+                row.save(update_fields=['registers', 'updated_at'])
+                continue
+            try:
+                with transaction.atomic():
+                    DailyVisitorSketch.objects.create(date=date, registers=sketch.to_bytes())
+            except IntegrityError:
+                # Créée entre-temps par un autre worker : fusionner
+                row = DailyVisitorSketch.objects.select_for_update().get(date=date)
+                row.registers = sketch.merge(HyperLogLog.from_bytes(bytes(row.registers))).to_bytes()
+                row.save(update_fields=['registers', 'updated_at'])
+
+
+def rebuild_visitor_sketches(start_date=None, end_date=None):
+    """Recalcule les esquisses des visiteurs depuis PageView entre deux dates incluses. Retourne le nombre de jours."""
+    views = PageView.objects.filter(is_bot=False)
+    sketches_qs = DailyVisitorSketch.objects.all()
+    if start_date:
+        views = views.filter(created_at__date__gte=start_date)
+        sketches_qs = sketches_qs.filter(date__gte=start_date)
+    if end_date:
+        views = views.filter(created_at__date__lte=end_date)
+        sketches_qs = sketches_qs.filter(date__lte=end_date)
+    sketches = {}
+    rows = views.annotate(day=TruncDate('created_at')).values_list('day', 'session_key', 'ip_address')
+    for day, session_key, ip_address in rows.iterator():
+        sketches.setdefault(day, HyperLogLog()).add(visitor_identity(session_key, ip_address))
+    with transaction.atomic():
+        sketches_qs.delete()
+        DailyVisitorSketch.objects.bulk_create(
+            [DailyVisitorSketch(date=day, registers=sketch.to_bytes()) for day, sketch in sketches.items()],
+            batch_size=500,
+        )
+    return len(sketches)
+
+
+def _unique_visitors(sketches, start, end):
+    """Visiteurs uniques estimés entre deux dates incluses (fusion des esquisses quotidiennes)."""
+    union = HyperLogLog()
+    for date, sketch in sketches.items():
+        if start <= date <= end:
+            union.merge(sketch)
+    return union.count()
+
+
+def _variation(current, previous):
+    if previous > 0:
+        return ((current - previous) / previous) * 100
+    return 100 if current > 0 else 0
+
+
+def _month_bounds(day):
+    month_start = day.replace(day=1)
+    if month_start.month == 12:
+        month_end = month_start.replace(year=month_start.year + 1, month=1, day=1) - timedelta(days=1)
+    else:
+        month_end = month_start.replace(month=month_start.month + 1, day=1) - timedelta(days=1)
+    return month_start, month_end
+
+
+def dashboard_stats(today=None):
+    """
+    Compteurs, séries temporelles et répartitions du tableau de bord (hors bots).
+    Une requête groupée par granularité, les périodes sans visite étant complétées en Python.
+    """
+    today = today or timezone.localdate()
+    stats = DailyPageViewStat.objects.all()
+
+    def window(**filters):
+        return Sum('count', filter=Q(**filters), default=0)
+
+    # Statistiques générales et périodes de comparaison, en une requête
+    yesterday = today - timedelta(days=1)
+    headline = stats.aggregate(
+        total_views=Sum('count', default=0),
+        views_today=window(date=today),
+        views_this_week=window(date__gte=today - timedelta(days=7)),
+        views_this_month=window(date__gte=today - timedelta(days=30)),
+        views_this_year=window(date__gte=today - timedelta(days=365)),
+        views_yesterday=window(date=yesterday),
+        views_last_week=window(date__gte=today - timedelta(days=14), date__lt=today - timedelta(days=7)),
+        views_last_month=window(date__gte=today - timedelta(days=60), date__lt=today - timedelta(days=30)),
+    )
+
+    # Semaines affichées (12 dernières) : de mardi à lundi, la dernière finissant le lundi courant
+    days_since_monday = today.weekday()  # 0 = lundi, 6 = dimanche
+    weeks = []
+    for i in range(11, -1, -1):
+        week_end = today - timedelta(days=days_since_monday) - timedelta(days=i * 7)
+        weeks.append((week_end - timedelta(days=6), week_end))
+
+    # Visites par jour : une requête couvrant les 30 derniers jours et les 12 semaines
+    first_day = min(today - timedelta(days=29), weeks[0][0])
+    per_day = dict(
+        stats.filter(date__gte=first_day, date__lte=today)
+        .values('date').annotate(count=Sum('count')).values_list('date', 'count')
+    )
+
+    daily_views = []
+    for i in range(29, -1, -1):
+        date = today - timedelta(days=i)
+        daily_views.append({
+            'date': date.strftime('%Y-%m-%d'),
+            'label': date.strftime('%d/%m'),
+            'count': per_day.get(date, 0),
+        })
+
+    weekly_views = []
+    for week_start, week_end in weeks:
+        weekly_views.append({
+            'week': f'Sem {week_start.strftime("%d/%m")}',
+            'count': sum(n for d, n in per_day.items() if week_start <= d <= week_end),
+        })
+
+    # Visites par mois (12 derniers mois, par pas de 30 jours comme l'affichage historique)
+    months = [_month_bounds(today - timedelta(days=30 * i)) for i in range(11, -1, -1)]
+    per_month = dict(
+        stats.filter(date__gte=months[0][0], date__lte=months[-1][1])
+        .annotate(month=TruncMonth('date')).values('month')
+        .annotate(count=Sum('count')).values_list('month', 'count')
+    )
+    monthly_views = [
+        {'month': month_start.strftime('%b %Y'), 'count': per_month.get(month_start, 0)}
+        for month_start, _ in months
+    ]
+
+    # Visites par année
+    years = range(today.year - 4, today.year + 1)
+    per_year = dict(
+        stats.filter(date__year__gte=years[0])
+        .annotate(year=TruncYear('date')).values('year')
+        .annotate(count=Sum('count')).values_list('year', 'count')
+    )
+    yearly_views = [
+        {'year': str(year), 'count': per_year.get(date_cls(year, 1, 1), 0)}
+        for year in years
+    ]
+
+    # Visiteurs uniques (esquisses HyperLogLog) : une requête, coût proportionnel au nombre de jours
+    first_sketch_day = min(first_day, months[0][0], today - timedelta(days=30))
+    sketches = {
+        date: HyperLogLog.from_bytes(bytes(registers))
+        for date, registers in DailyVisitorSketch.objects.filter(
+            date__gte=first_sketch_day, date__lte=today,
+        ).values_list('date', 'registers')
+    }
+    daily_visitors = []
+    for i in range(29, -1, -1):
+        date = today - timedelta(days=i)
+        daily_visitors.append({
+            'date': date.strftime('%Y-%m-%d'),
+            'label': date.strftime('%d/%m'),
+            'count': sketches[date].count() if date in sketches else 0,
+        })
+    weekly_visitors = [
+        {'week': f'Sem {week_start.strftime("%d/%m")}', 'count': _unique_visitors(sketches, week_start, week_end)}
+        for week_start, week_end in weeks
+    ]
+    monthly_visitors = [
+        {'month': month_start.strftime('%b %Y'), 'count': _unique_visitors(sketches, month_start, month_end)}
+        for month_start, month_end in months
+    ]
+
+    # Répartition par pays
+    country_stats = stats.exclude(country_code='').values('country_code').annotate(
+        count=Sum('count'), country_name=Max('country'),
+    ).order_by('-count')[:20]
+    country_data = [{'country': item['country_name'] or 'Inconnu', 'code': item['country_code'], 'count': item['count']}
+                    for item in country_stats]
+
+    # Répartition par type d'appareil (pour camembert)
+    device_stats = stats.values('device_type').annotate(count=Sum('count')).order_by('-count')
+    device_labels = dict(PageView.DEVICE_CHOICES)
+    device_data = [{'label': device_labels.get(item['device_type'], item['device_type']), 'count': item['count']}
+                   for item in device_stats]
+
+    # Pages les plus visitées
+    top_pages = list(stats.values('path').annotate(count=Sum('count')).order_by('-count')[:10])
+
+    # Assistant : part des questions traitées localement (FAQ, réponses validées) sur 30 jours
+    assistant = AssistantQuestion.objects.filter(created_at__date__gte=today - timedelta(days=30)).aggregate(
+        total=Count('id'),
+        local=Count('id', filter=~Q(source=AssistantQuestion.SOURCE_LLM)),
+    )
+
+    return {
+        'total_views': headline['total_views'],
+        'views_today': headline['views_today'],
+        'views_this_week': headline['views_this_week'],
+        'views_this_month': headline['views_this_month'],
+        'views_this_year': headline['views_this_year'],
+        'today_variation': round(_variation(headline['views_today'], headline['views_yesterday']), 2),
+        'week_variation': round(_variation(headline['views_this_week'], headline['views_last_week']), 2),
+        'month_variation': round(_variation(headline['views_this_month'], headline['views_last_month']), 2),
+        'visitors_today': daily_visitors[-1]['count'],
+        'visitors_this_week': _unique_visitors(sketches, today - timedelta(days=7), today),
+        'visitors_this_month': _unique_visitors(sketches, today - timedelta(days=30), today),
+        'daily_views': daily_views,
+        'weekly_views': weekly_views,
+        'monthly_views': monthly_views,
+        'yearly_views': yearly_views,
+        'daily_visitors': daily_visitors,
+        'weekly_visitors': weekly_visitors,
+        'monthly_visitors': monthly_visitors,
+        'country_data': country_data,
+        'device_data': device_data,
+        'top_pages': top_pages,
+        'assistant_questions_30d': assistant['total'],
+        'assistant_local_answers_30d': assistant['local'],
+        'assistant_local_rate': round(assistant['local'] * 100 / assistant['total'], 1) if assistant['total'] else 0,
+    }
+
+
+DASHBOARD_SNAPSHOT_KEY = 'dashboard_snapshot'
+DASHBOARD_LOCK_KEY = 'dashboard_snapshot_lock'
+
+
+def build_dashboard_snapshot():
+    """Calcule le tableau de bord et le met en cache avec sa date de calcul."""
+    snapshot = {'built_at': time.time(), 'data': dashboard_stats()}
+    # Conservé bien au-delà du TTL pour pouvoir être servi périmé pendant le recalcul
+    cache.set(DASHBOARD_SNAPSHOT_KEY, snapshot, getattr(settings, 'STATISTICS_CACHE_TTL', 60) * 60)
+    return snapshot
+
+
+def _refresh_in_background():
+    def run():
+        try:
+            build_dashboard_snapshot()
+        finally:
+            cache.delete(DASHBOARD_LOCK_KEY)
+            close_old_connections()
+    threading.Thread(target=run, name='dashboard-refresh', daemon=True).start()
+
+
+def get_dashboard_snapshot():
+    """
+    Tableau de bord en cache : {'built_at': timestamp, 'data': ...}.
+    Périmé : servi quand même, une seule requête (verrou cache.add) lance le recalcul.
+    """
+    snapshot = cache.get(DASHBOARD_SNAPSHOT_KEY)
+    if snapshot is None:
+        return build_dashboard_snapshot()
+    if time.time() - snapshot['built_at'] > getattr(settings, 'STATISTICS_CACHE_TTL', 60):
+        if cache.add(DASHBOARD_LOCK_KEY, 1, 60):
+            _refresh_in_background()
+    return snapshot
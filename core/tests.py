@@ -1,7 +1,45 @@
-from django.test import TestCase, Client
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import timedelta
+import tempfile
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection
+from django.test import AsyncRequestFactory, TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 from django.contrib.auth.models import User
-from .models import Article, Category, Service, ContactMessage
+from . import middleware, views
+from . import assistant_log
+from .assistant import ResponseCache, SUMMARY_PREFIX, build_messages, conversation_key, get_response_cache, payload_size
+from .management.commands.llm_stub import StubLLMServer
+from .buffers import BufferedWriter
+from .circuit import CircuitBreaker
+from . import checks, ratelimit
+from .ratelimit import hit_rate_limit
+from .dedup import BloomVisitDedup, CacheVisitDedup, get_visit_dedup
+from .geoip import HttpGeoResolver, LocalGeoResolver, enrich_ips
+from . import cache_registry, httpcache, warmup
+from .context_processors import get_navigation, navigation
+from .faq_index import find_local_answer, invalidate_index
+from .hyperloglog import HyperLogLog
+from .live import VisitBroker, visit_stream
+from .pagecache import CACHED_PAGES
+from .useragent import classify_user_agent
+from .models import Article, Category, Service, Tag, ContactMessage, PageView, ProcessingCheckpoint, DailyPageViewStat, AssistantQuestion, FAQ
+from . import stats as stats_module
+from .stats import dashboard_stats, get_dashboard_snapshot, rebuild_daily_stats, rebuild_visitor_sketches
 
 
 class CoreViewsTestCase(TestCase):
@@ -10,6 +48,7 @@ class CoreViewsTestCase(TestCase):
     def setUp(self):
         """Configuration initiale pour les tests."""
         self.client = Client()
+        cache.clear()
         
     def test_home_page(self):
         """Test que la page d'accueil se charge correctement."""
@@ -68,6 +107,23 @@ class CoreViewsTestCase(TestCase):
         self.assertIn('User-agent', response.content.decode())
         self.assertIn('Sitemap', response.content.decode())
 
+    def test_navigation_cached(self):
+        """Navigation gardée en mémoire : aucune requête tant que Service / WhatsAppConfig ne changent pas."""
+        cache_registry.bump('Service')
+        self.assertEqual(get_navigation(), (None, []))
+        with CaptureQueriesContext(connection) as queries:
+            navigation(None)
+        self.assertEqual(len(queries), 0)
+        service = Service.objects.create(name='seo', short_description='SEO', full_description='SEO', active=True)
+        self.assertEqual(get_navigation()[1], [service])
+        service.delete()
+        self.assertEqual(get_navigation()[1], [])
+        # Modification sans changement de version (bulk_create, sans signal) : relue après NAVIGATION_MAX_AGE
+        Service.objects.bulk_create([Service(name='vitrine', short_description='Site', full_description='Site', active=True)])
+        self.assertEqual(get_navigation()[1], [])
+        with mock.patch('core.context_processors.time.monotonic', return_value=time.monotonic() + 301):
+            self.assertEqual([s.name for s in get_navigation()[1]], ['vitrine'])
+
 
 class CoreModelsTestCase(TestCase):
     """Tests pour les modèles."""
@@ -106,3 +162,1096 @@ class CoreModelsTestCase(TestCase):
             message='Test message'
         )
         self.assertEqual(str(message), 'Test User - test@example.com')
+
+
+class PageViewTrackingTestCase(TestCase):
+    """Tests du suivi des visites (modes synchrone et tampon)."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sync_mode_counts_page_once(self):
+        """Une même page par même visiteur ne compte qu'une fois."""
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(PageView.objects.filter(path='/').count(), 1)
+
+    @override_settings(PAGEVIEW_TRACKING_MODE='buffered')
+    def test_buffered_mode_defers_write(self):
+        """En mode tampon, la requête n'écrit rien : l'insertion se fait au vidage."""
+        buffer = BufferedWriter(middleware.save_visits, batch_size=1000, interval_ms=60000)
+        self.addCleanup(buffer.close)
+        with mock.patch.object(middleware, '_visit_buffer', buffer):
+            self.client.get(reverse('home'))
+            self.client.get(reverse('about'))
+            self.client.get(reverse('home'))
+            self.assertEqual(PageView.objects.count(), 0)
+            buffer.flush()
+        self.assertEqual(PageView.objects.filter(path='/').count(), 1)
+        self.assertEqual(PageView.objects.count(), 2)
+
+    def test_buffer_drops_when_full(self):
+        """File pleine : l'enregistrement est abandonné et compté, sans bloquer."""
+        batches = []
+        buffer = BufferedWriter(batches.append, max_size=2, batch_size=10, interval_ms=60000)
+        self.addCleanup(buffer.close)
+        self.assertTrue(buffer.put(1))
+        self.assertTrue(buffer.put(2))
+        self.assertFalse(buffer.put(3))
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        buffer.close()
+        self.assertEqual(batches, [[1, 2]])
+        self.assertEqual(buffer.stats()['flushed'], 2)
+
+    @override_settings(PAGEVIEW_DEDUP_BACKEND='db')
+    def test_db_dedup_backend(self):
+        """Le backend 'db' garde l'ancienne vérification en base."""
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(PageView.objects.filter(path='/').count(), 1)
+
+
+class VisitDedupTestCase(TestCase):
+    """Tests des backends de déduplication sur 24 h."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bloom_window_rollover(self):
+        """Revue dans les 24 h : dédupliquée ; après la fenêtre : recomptée."""
+        dedup = BloomVisitDedup(capacity=1000)
+        t0 = 1_700_000_000
+        self.assertFalse(dedup.seen('/', 'ip:1.2.3.4', now=t0))
+        self.assertTrue(dedup.seen('/', 'ip:1.2.3.4', now=t0 + 3600))
+        self.assertTrue(dedup.seen('/', 'ip:1.2.3.4', now=t0 + 22 * 3600))
+        self.assertFalse(dedup.seen('/blog/', 'ip:1.2.3.4', now=t0 + 3600))
+        self.assertFalse(dedup.seen('/', 'ip:1.2.3.4', now=t0 + 24 * 3600 + 1))
+        self.assertTrue(dedup.seen('/', 'ip:1.2.3.4', now=t0 + 25 * 3600))
+
+    def test_cache_window_rollover(self):
+        """Le TTL de la clé de cache suit la fenêtre de 24 h."""
+        dedup = CacheVisitDedup()
+        t0 = 1_700_000_000
+        with mock.patch('time.time', return_value=t0):
+            self.assertFalse(dedup.seen('/', 's:abc'))
+        with mock.patch('time.time', return_value=t0 + 23 * 3600):
+            self.assertTrue(dedup.seen('/', 's:abc'))
+            self.assertFalse(dedup.seen('/', 's:other'))
+        with mock.patch('time.time', return_value=t0 + 24 * 3600 + 1):
+            self.assertFalse(dedup.seen('/', 's:abc'))
+
+    @override_settings(PAGEVIEW_DEDUP_BACKEND='')
+    def test_default_backend_follows_cache(self):
+        """Par défaut : cache Django seulement s'il est partagé entre workers, sinon vérification en base."""
+        self.assertIsNone(get_visit_dedup())
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache',
+        }}):
+            self.assertIsInstance(get_visit_dedup(), CacheVisitDedup)
+
+
+class GeoIPTestCase(TestCase):
+    """Tests de la géolocalisation hors ligne."""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write('ip_start,ip_end,country_code,country,city\n')
+            f.write('41.138.96.0,41.138.127.255,BF,Burkina Faso,Ouagadougou\n')
+            f.write('2.0.0.0,2.15.255.255,FR,France,\n')
+            f.write('2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,US,États-Unis,\n')
+        self.addCleanup(os.remove, self.path)
+
+    def test_local_range_lookup(self):
+        """Recherche dichotomique dans les plages, IPv4 et IPv6."""
+        resolver = LocalGeoResolver(self.path)
+        self.assertEqual(resolver.lookup('41.138.100.7'), ('Burkina Faso', 'BF', 'Ouagadougou'))
+        self.assertEqual(resolver.lookup('2.3.4.5'), ('France', 'FR', ''))
+        self.assertEqual(resolver.lookup('2001:4860:4860::8888'), ('États-Unis', 'US', ''))
+        self.assertEqual(resolver.lookup('41.138.128.1'), (None, None, None))
+        self.assertEqual(resolver.lookup('192.168.1.10'), (None, None, None))
+
+    def test_missing_database_check(self):
+        """Base locale absente (non livrée avec le projet) : signalée par manage.py check."""
+        with override_settings(GEOIP_BACKEND='local', GEOIP_DATABASE_PATH=self.path + '.absent'):
+            self.assertEqual([w.id for w in checks.check_geoip_database(None)], ['core.W002'])
+        with override_settings(GEOIP_BACKEND='local', GEOIP_DATABASE_PATH=self.path):
+            self.assertEqual(checks.check_geoip_database(None), [])
+        with override_settings(GEOIP_BACKEND='none', GEOIP_DATABASE_PATH=''):
+            self.assertEqual(checks.check_geoip_database(None), [])
+
+    def test_tracking_uses_local_resolver(self):
+        """La visite est géolocalisée sans appel réseau ; les IP inconnues partent en enrichissement."""
+        resolver = LocalGeoResolver(self.path)
+        with mock.patch.object(middleware, 'get_geo_resolver', return_value=resolver), \
+                mock.patch.object(middleware, 'schedule_http_enrichment') as schedule:
+            middleware.save_visits([
+                middleware.VisitRecord('/', '41.138.100.7', '', '', '', False),
+                middleware.VisitRecord('/', '8.8.8.8', '', '', '', False),
+            ])
+        self.assertEqual(PageView.objects.get(ip_address='41.138.100.7').country_code, 'BF')
+        self.assertEqual(list(schedule.call_args[0][0]), ['8.8.8.8'])
+
+    def test_http_enrichment_batched_and_throttled(self):
+        """ip-api.com : 100 IP par requête batch, attente quand la limite par minute est atteinte."""
+        cache.clear()
+        ips = [f'2.{i // 250}.{i % 250}.1' for i in range(250)]
+        for ip in ips[:3]:
+            PageView.objects.create(path='/', ip_address=ip)
+        rebuild_daily_stats()
+        # Cumul d'une autre page : non touché
+        other = DailyPageViewStat.objects.create(date=timezone.localdate(), path='/blog/', count=4)
+
+        def urlopen(request, timeout):
+            batch = json.loads(request.data)
+            response = mock.MagicMock()
+            response.__enter__.return_value.read.return_value = json.dumps([
+                {'status': 'success', 'country': 'France', 'countryCode': 'FR', 'city': 'Paris', 'query': ip}
+                for ip in batch
+            ]).encode()
+            return response
+
+        with mock.patch('urllib.request.urlopen', side_effect=urlopen) as opened, \
+                mock.patch('core.geoip.hit_rate_limit', side_effect=[0, 0, 30, 0]), \
+                mock.patch('core.geoip.time.sleep') as sleep:
+            self.assertEqual(enrich_ips(ips), 3)
+            self.assertEqual([len(json.loads(c[0][0].data)) for c in opened.call_args_list], [100, 100, 50])
+            sleep.assert_called_once_with(30)
+            # Résultats en cache : pas de nouvelle requête
+            self.assertEqual(HttpGeoResolver().lookup_many(ips[:5])[ips[0]], ('France', 'FR', 'Paris'))
+            self.assertEqual(opened.call_count, 3)
+        self.assertEqual(PageView.objects.filter(country_code='FR').count(), 3)
+        # Cumuls quotidiens recalculés avec le pays
+        self.assertEqual(list(DailyPageViewStat.objects.filter(path='/').values_list('country_code', 'count')), [('FR', 3)])
+        self.assertTrue(DailyPageViewStat.objects.filter(pk=other.pk, count=4).exists())
+
+    def test_enrich_pageviews_command(self):
+        """La commande complète les visites par lot et reprend au dernier id traité."""
+        resolver = LocalGeoResolver(self.path)
+        first = PageView.objects.create(path='/', ip_address='41.138.100.7')
+        PageView.objects.create(path='/blog/', ip_address='41.138.100.7')
+        PageView.objects.create(path='/', ip_address='8.8.8.8')
+        with mock.patch('core.geoip.get_geo_resolver', return_value=resolver):
+            call_command('enrich_pageviews', '--no-http', '--batch-size', '2', stdout=StringIO())
+            self.assertEqual(PageView.objects.filter(country_code='BF').count(), 2)
+            checkpoint = ProcessingCheckpoint.objects.get(name='pageview_geo')
+            self.assertEqual(checkpoint.last_id, PageView.objects.latest('pk').pk)
+            # Une nouvelle visite : seule elle est examinée au passage suivant (les anciennes ne sont pas relues)
+            PageView.objects.filter(pk=first.pk).update(country_code='', created_at=timezone.now() - timedelta(days=1))
+            new = PageView.objects.create(path='/contact/', ip_address='41.138.100.8')
+            # Visite validée après le passage précédent avec un id déjà dépassé (transaction plus lente)
+            PageView.objects.filter(pk=first.pk + 1).delete()
+            late = PageView.objects.create(pk=first.pk + 1, path='/blog/', ip_address='41.138.100.9')
+            call_command('enrich_pageviews', '--no-http', stdout=StringIO())
+        self.assertEqual(PageView.objects.get(pk=new.pk).city, 'Ouagadougou')
+        self.assertEqual(PageView.objects.get(pk=late.pk).country_code, 'BF')
+        self.assertEqual(PageView.objects.get(pk=first.pk).country_code, '')
+
+
+class UserAgentTestCase(TestCase):
+    """Tests du classifieur de User-Agent."""
+
+    def test_matches_legacy_classification(self):
+        """Même résultat que l'ancienne détection sur le corpus du benchmark."""
+        from .management.commands.benchmark_useragent import UA_CORPUS, legacy_device_type, legacy_is_bot
+        for ua, _ in UA_CORPUS + [('', 0)]:
+            self.assertEqual(classify_user_agent(ua), (legacy_is_bot(ua), legacy_device_type(ua)), ua)
+
+    def test_bots_are_not_tracked(self):
+        """Les bots ne sont pas enregistrés."""
+        cache.clear()
+        self.client.get(reverse('home'), HTTP_USER_AGENT='Mozilla/5.0 (compatible; Googlebot/2.1)')
+        self.assertFalse(PageView.objects.exists())
+
+
+class PageCacheTestCase(TestCase):
+    """Cache de pages pour les anonymes : lecture, jeton CSRF, invalidation par les signaux, contournements."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_cached(self):
+        """Deuxième visite anonyme servie depuis le cache, avec un jeton CSRF propre au visiteur."""
+        first = self.client.get(reverse('about'))
+        self.assertNotIn('X-Page-Cache', first)
+        other = Client(enforce_csrf_checks=True, REMOTE_ADDR='10.0.0.9')
+        with CaptureQueriesContext(connection) as queries:
+            second = other.get(reverse('about'))
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        # Seule l'écriture de la visite touche la base ; elle est bien enregistrée
+        tables = set(re.findall(r'"(core_\w+|auth_\w+|django_\w+)"', ' '.join(q['sql'] for q in queries.captured_queries)))
+        self.assertLessEqual(tables, {'core_pageview', 'core_dailypageviewstat', 'core_dailyvisitorsketch'})
+        self.assertTrue(PageView.objects.filter(ip_address='10.0.0.9', path='/agence/').exists())
+        # Jeton CSRF propre au visiteur, accepté par le formulaire de devis
+        self.assertNotIn(b'__CSRF_TOKEN_PLACEHOLDER__', second.content)
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', second.content).group(1).decode()
+        self.assertIn('csrftoken', second.cookies)
+        response = other.post(reverse('contact'), {'csrfmiddlewaretoken': token})
+        self.assertNotEqual(response.status_code, 403)
+        # Chaîne de requête distincte : entrée distincte
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('about') + '?utm_source=x'))
+
+    def test_host_and_scheme_in_key(self):
+        """Le lien canonique dépend du schéma et de l'hôte : une entrée (et un ETag) par URL complète."""
+        www = self.client.get(reverse('about'), HTTP_HOST='www.example.com')
+        bare = self.client.get(reverse('about'), HTTP_HOST='example.com')
+        self.assertNotIn('X-Page-Cache', bare)
+        self.assertContains(bare, 'http://example.com/agence/')
+        self.assertNotContains(bare, 'www.example.com')
+        self.assertNotEqual(www['ETag'], bare['ETag'])
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('about'), HTTP_HOST='example.com', secure=True))
+        self.assertEqual(self.client.get(reverse('about'), HTTP_HOST='www.example.com')['X-Page-Cache'], 'hit')
+
+    def test_signal_invalidation(self):
+        """Une écriture ne périme que les pages qui lisent le modèle (menu compris)."""
+        category = Category.objects.create(name='SEO', slug='seo')
+        self.client.get(reverse('blog_list'))
+        self.client.get(reverse('home'))
+        Article.objects.create(title='Nouvel article', slug='nouvel-article', excerpt='Résumé', content='Contenu',
+                               category=category, published=True, published_at=timezone.now())
+        response = self.client.get(reverse('blog_list'))
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Nouvel article')
+        self.assertEqual(self.client.get(reverse('home'))['X-Page-Cache'], 'hit')
+        # Les services figurent dans le menu de toutes les pages
+        Service.objects.create(name='seo', short_description='SEO', full_description='SEO', active=True)
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('home')))
+
+    def test_dependency_registry(self):
+        """Une écriture change la seule version de son modèle ; seules les vues qui le lisent sont périmées."""
+        self.assertEqual(cache_registry.models_for('team'), ('Service', 'TeamMember', 'WhatsAppConfig'))
+        self.assertIn('model:testimonial', cache_registry.tags_for('home'))
+        for name in CACHED_PAGES:
+            self.assertIn(name, cache_registry.DEPENDENCIES)
+        home, blog = cache_registry.versions('home'), cache_registry.versions('blog_detail')
+        category = Category.objects.create(name='Web', slug='web')
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            article = Article.objects.create(title='A', slug='a', excerpt='e', content='c', category=category)
+        cache_set.assert_called_once_with('cache_version:model:article', mock.ANY, None)
+        self.assertEqual(cache_registry.versions('home'), home)
+        blog = cache_registry.versions('blog_detail')
+        # Tags ajoutés après l'enregistrement (admin) : l'article change aussi
+        article.tags.add(Tag.objects.create(name='SEO', slug='seo'))
+        self.assertNotEqual(cache_registry.versions('blog_detail'), blog)
+
+    def test_conditional_get(self):
+        """ETag / Last-Modified issus des versions : 304 sans rendu tant que rien n'a changé."""
+        category = Category.objects.create(name='SEO', slug='seo')
+        article = Article.objects.create(title='Référencement', slug='referencement', excerpt='Résumé',
+                                         content='Contenu', category=category, published=True,
+                                         published_at=timezone.now())
+        url = reverse('blog_detail', args=[article.slug])
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('max-age=0', first['Cache-Control'])
+        etag, last_modified = first['ETag'], first['Last-Modified']
+        with mock.patch('core.views.render') as render:
+            response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(Client().get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        render.assert_not_called()
+        # Une autre page n'a pas le même ETag
+        self.assertNotEqual(self.client.get(reverse('blog_list'))['ETag'], etag)
+        # Modification : nouveaux validateurs, page complète
+        article.title = 'Référencement local'
+        article.save()
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Référencement local')
+        # Cache vidé (redémarrage) : les anciens validateurs ne sont plus acceptés
+        cache.clear()
+        self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        # Utilisateur connecté : ni validateurs ni 304
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_deploy_invalidation(self):
+        """Nouveau déploiement (CACHE_BUILD_ID, manifeste de collectstatic) : ni 304 ni ancien HTML servis."""
+        url = reverse('about')
+        first = self.client.get(url)
+        self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        with override_settings(CACHE_BUILD_ID='v2'):
+            response = Client().get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Page-Cache', response)
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+        with tempfile.TemporaryDirectory() as static_root:
+            manifest = os.path.join(static_root, 'staticfiles.json')
+            with open(manifest, 'w') as f:
+                f.write('{"paths": {}}')
+            os.utime(manifest, (2000000000, 2000000000))
+            with override_settings(STATIC_ROOT=static_root):
+                response = Client().get(url, HTTP_IF_NONE_MATCH=first['ETag'],
+                                        HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('X-Page-Cache', response)
+                self.assertEqual(response['Last-Modified'], http_date(2000000000))
+                self.assertEqual(Client().get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 200)
+
+    def test_bypass(self):
+        """Pas de cache pour les messages en attente, les utilisateurs connectés et les pages hors liste."""
+        self.client.get(reverse('team'))
+        self.client.cookies['messages'] = 'x'
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('team')))
+        del self.client.cookies['messages']
+        self.client.force_login(User.objects.create_user('staff', password='x'))
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('team')))
+        self.client.logout()
+        self.assertEqual(Client().get(reverse('team'))['X-Page-Cache'], 'hit')
+        # Pages hors liste (contact) jamais en cache
+        self.client.get(reverse('contact'))
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('contact')))
+
+
+class CacheControlTestCase(TestCase):
+    """Politique Cache-Control par vue et purge du proxy."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_policies(self):
+        """« public » et tags de purge sans jeton CSRF ; « private » dès que la page en contient un."""
+        # Sitemap sans jeton CSRF : partageable par le proxy, avec ses tags de purge
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        cache_control = response['Cache-Control']
+        for directive in ('public', 'max-age=3600', 's-maxage=3600', 'stale-while-revalidate=600'):
+            self.assertIn(directive, cache_control)
+        self.assertEqual(response['Cache-Tag'], 'model:article model:service')
+        # Pages avec le formulaire de devis (jeton CSRF) : navigateur seulement, servies ou non depuis le cache
+        for _ in range(2):
+            response = self.client.get(reverse('blog_list'))
+            self.assertEqual(response['Cache-Control'], 'max-age=0, private')
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertNotIn('Cache-Tag', response)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        response = Client().get(reverse('blog_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_private_pages(self):
+        """Tableau de bord, formulaires et utilisateurs connectés : toujours « private »."""
+        self.assertEqual(self.client.get(reverse('statistics'))['Cache-Control'], 'private')
+        self.assertEqual(self.client.get(reverse('contact'))['Cache-Control'], 'private')
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        self.assertIn('private', self.client.get(reverse('statistics_realtime'))['Cache-Control'])
+        response = self.client.get('/sitemap.xml')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('s-maxage', response['Cache-Control'])
+
+    @override_settings(CACHE_PURGE_URL='http://127.0.0.1:6081/purge', WARM_CACHE_ON_CHANGE=False)
+    def test_purge_on_change(self):
+        """Une modification envoie le tag du modèle au proxy, une seule fois par tag et par lot."""
+        category = Category.objects.create(name='SEO', slug='seo')
+        with mock.patch.object(httpcache, 'get_purge_buffer') as buffer:
+            with self.captureOnCommitCallbacks(execute=True):
+                Article.objects.create(title='A', slug='a', excerpt='e', content='c', category=category)
+        buffer.return_value.put.assert_called_once_with('model:article')
+        with mock.patch('urllib.request.urlopen') as urlopen:
+            httpcache.purge_tags(['model:article', 'model:service', 'model:article'])
+        request = urlopen.call_args[0][0]
+        self.assertEqual((request.method, request.full_url), ('PURGE', 'http://127.0.0.1:6081/purge'))
+        self.assertEqual(request.get_header('Cache-tag'), 'model:article model:service')
+
+
+@override_settings(SITE_DOMAIN='http://testserver')
+class WarmCacheTestCase(TestCase):
+    """Préchauffage du cache de pages : commande warm_cache et rafraîchissement après modification."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='SEO', slug='seo')
+        self.article = Article.objects.create(title='Référencement', slug='referencement', excerpt='Résumé',
+                                              content='Contenu', category=category, published=True,
+                                              published_at=timezone.now())
+
+    def test_warm_cache_command(self):
+        """Les pages du sitemap gardées par le cache sont rendues une fois, sans compter de visite."""
+        out = StringIO()
+        call_command('warm_cache', concurrency=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn('/blog/referencement/', output)
+        self.assertIn('/agence/equipe/', output)
+        self.assertRegex(output, r'200 +[\d.]+ ms  /agence/ ')
+        self.assertNotIn('/contact/', output)
+        # Requêtes du préchauffage non comptées comme des visites
+        self.assertFalse(PageView.objects.exists())
+        self.assertEqual(Client().get(reverse('blog_detail', args=['referencement']))['X-Page-Cache'], 'hit')
+        out = StringIO()
+        call_command('warm_cache', concurrency=1, stdout=out)
+        self.assertIn('0 rendue(s)', out.getvalue())
+
+    def test_warm_cache_reports_failures(self):
+        """Une page en erreur est signalée avec son exception ; les autres sont préchauffées."""
+        original = views.get_object_or_404
+
+        def failing_get(model, **kwargs):
+            if kwargs.get('slug') == 'referencement':
+                raise RuntimeError('base indisponible')
+            return original(model, **kwargs)
+
+        out = StringIO()
+        with mock.patch.object(views, 'get_object_or_404', side_effect=failing_get), \
+                self.assertLogs('django.request', 'ERROR'):
+            call_command('warm_cache', concurrency=1, stdout=out)
+        output = out.getvalue()
+        self.assertRegex(output, r"500 +[\d.]+ ms  /blog/referencement/  \(erreur : RuntimeError\('base indisponible'\)\)")
+        self.assertRegex(output, r'200 +[\d.]+ ms  /agence/ ')
+        self.assertIn('[ERREUR] 1 page(s) sans réponse 200', output)
+
+    def test_warm_after_change(self):
+        """Après une modification : seules les pages les plus visitées qui dépendent du modèle sont rendues."""
+        today = timezone.localdate()
+        for path, count in (('/blog/', 50), ('/agence/equipe/', 40), ('/contact/', 30)):
+            DailyPageViewStat.objects.create(date=today, path=path, count=count)
+        self.assertEqual(warmup.top_paths(2), ['/blog/', '/agence/equipe/'])
+        with mock.patch.object(warmup, 'get_warm_buffer') as buffer:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.article.title = 'Référencement local'
+                self.article.save()
+        buffer.return_value.put.assert_called_once_with('Article')
+        # Seules les pages les plus visitées qui dépendent du modèle sont rendues
+        warmup.warm_after_change(['Article'])
+        self.assertEqual(Client().get(reverse('blog_list'))['X-Page-Cache'], 'hit')
+        self.assertNotIn('X-Page-Cache', Client().get(reverse('team')))
+
+
+@override_settings(PAGEVIEW_ROLLUP_ON_WRITE=True)
+class StatisticsTestCase(TestCase):
+    """Tests du tableau de bord des statistiques (visites écrites comme au vidage du tampon)."""
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        middleware.save_visits([
+            middleware.VisitRecord('/', '41.138.100.7', 'a', 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4)', '', False),
+            middleware.VisitRecord('/', '41.138.100.8', 'b', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)', '', False),
+            middleware.VisitRecord('/blog/', '41.138.100.7', 'a', 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4)', '', False),
+        ])
+
+    def test_rollups_follow_writes(self):
+        """Les cumuls quotidiens suivent les écritures et correspondent à un recalcul complet."""
+        incremental = sorted(DailyPageViewStat.objects.values_list('date', 'path', 'device_type', 'count'))
+        self.assertEqual(sum(row[3] for row in incremental), 3)
+        rebuild_daily_stats()
+        self.assertEqual(sorted(DailyPageViewStat.objects.values_list('date', 'path', 'device_type', 'count')), incremental)
+
+    def test_sync_request_skips_rollups(self):
+        """Mode 'sync' : la requête n'écrit que la visite ; cumuls et esquisses via rollup_pageviews."""
+        before = list(DailyPageViewStat.objects.values_list('path', 'count'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('about'))
+        self.assertTrue(PageView.objects.filter(path='/agence/').exists())
+        self.assertEqual(list(DailyPageViewStat.objects.values_list('path', 'count')), before)
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertNotIn('core_dailyvisitorsketch', sql)
+        call_command('rollup_pageviews', stdout=StringIO())
+        self.assertTrue(DailyPageViewStat.objects.filter(path='/agence/').exists())
+
+    def test_sketch_written_once_per_batch(self):
+        """Vidage du tampon : identités du lot fusionnées en mémoire, une seule réécriture de l'esquisse du jour."""
+        records = [middleware.VisitRecord('/', f'41.138.101.{i}', f'v{i}', '', '', False) for i in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            middleware.save_visits(records)
+        writes = [q['sql'] for q in queries.captured_queries
+                  if q['sql'].startswith('UPDATE "core_dailyvisitorsketch"')]
+        self.assertEqual(len(writes), 1)
+        self.assertAlmostEqual(dashboard_stats()['visitors_this_week'], 52, delta=2)
+
+    def test_visits_and_rollups_atomic(self):
+        """Échec des cumuls : les visites du lot ne sont pas enregistrées non plus."""
+        with mock.patch.object(middleware, 'record_visitor_sketches', side_effect=DatabaseError('verrou')):
+            with self.assertRaises(DatabaseError):
+                middleware.save_visits([middleware.VisitRecord('/contact/', '41.138.100.9', 'c', '', '', False)])
+        self.assertFalse(PageView.objects.filter(path='/contact/').exists())
+        self.assertFalse(DailyPageViewStat.objects.filter(path='/contact/').exists())
+
+    def test_locked_database_retried(self):
+        """Base verrouillée par un autre worker : le lot est rejoué en entier, sans double comptage."""
+        with mock.patch.object(middleware, 'record_visitor_sketches',
+                               side_effect=[OperationalError('database is locked'), None]), \
+                mock.patch.object(middleware.time, 'sleep'):
+            middleware.save_visits([middleware.VisitRecord('/contact/', '41.138.100.9', 'c', '', '', False)])
+        self.assertEqual(PageView.objects.filter(path='/contact/').count(), 1)
+        self.assertEqual(DailyPageViewStat.objects.get(path='/contact/').count, 1)
+
+    def test_dashboard_reads_rollups(self):
+        """Le tableau de bord compte à partir des cumuls."""
+        stats = dashboard_stats()
+        self.assertEqual(stats['total_views'], 3)
+        self.assertEqual(stats['views_today'], 3)
+        self.assertEqual(stats['daily_views'][-1]['count'], 3)
+        self.assertEqual(stats['top_pages'][0], {'path': '/', 'count': 2})
+        self.assertEqual({d['label']: d['count'] for d in stats['device_data']}, {'Mobile': 2, 'Ordinateur': 1})
+
+    def test_statistics_page(self):
+        """La page est réservée aux staff et s'affiche avec les cumuls."""
+        self.assertEqual(self.client.get(reverse('statistics')).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('statistics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn({'path': '/', 'count': 2}, json.loads(response.context['top_pages']))
+
+    def test_dashboard_matches_legacy_series(self):
+        """Les séries groupées sont identiques à l'ancien calcul, une requête par jour/semaine/mois/année."""
+        now = timezone.now()
+        for i, days_ago in enumerate([0, 1, 2, 6, 8, 13, 29, 31, 45, 61, 90, 200, 330, 364, 400, 800]):
+            pv = PageView.objects.create(path=f'/p{i}/', ip_address='41.138.100.7')
+            PageView.objects.filter(pk=pv.pk).update(created_at=now - timedelta(days=days_ago, hours=1))
+        rebuild_daily_stats()
+        stats = dashboard_stats()
+
+        views = PageView.objects.filter(is_bot=False)
+        today = timezone.localdate()
+        legacy_daily = []
+        for i in range(29, -1, -1):
+            date = today - timedelta(days=i)
+            legacy_daily.append({'date': date.strftime('%Y-%m-%d'), 'label': date.strftime('%d/%m'),
+                                 'count': views.filter(created_at__date=date).count()})
+        legacy_weekly = []
+        for i in range(11, -1, -1):
+            week_end = today - timedelta(days=today.weekday()) - timedelta(days=i * 7)
+            week_start = week_end - timedelta(days=6)
+            legacy_weekly.append({'week': f'Sem {week_start.strftime("%d/%m")}',
+                                  'count': views.filter(created_at__date__gte=week_start, created_at__date__lte=week_end).count()})
+        legacy_monthly = []
+        for i in range(11, -1, -1):
+            month_start = (today - timedelta(days=30 * i)).replace(day=1)
+            if month_start.month == 12:
+                month_end = month_start.replace(year=month_start.year + 1, month=1, day=1) - timedelta(days=1)
+            else:
+                month_end = month_start.replace(month=month_start.month + 1, day=1) - timedelta(days=1)
+            legacy_monthly.append({'month': month_start.strftime('%b %Y'),
+                                   'count': views.filter(created_at__date__gte=month_start, created_at__date__lte=month_end).count()})
+        legacy_yearly = [{'year': str(year), 'count': views.filter(created_at__year=year).count()}
+                         for year in range(today.year - 4, today.year + 1)]
+
+        self.assertEqual(stats['daily_views'], legacy_daily)
+        self.assertEqual(stats['weekly_views'], legacy_weekly)
+        self.assertEqual(stats['monthly_views'], legacy_monthly)
+        self.assertEqual(stats['yearly_views'], legacy_yearly)
+        self.assertEqual(stats['total_views'], views.count())
+        self.assertEqual(stats['views_this_month'], views.filter(created_at__gte=today - timedelta(days=30)).count())
+
+    def test_unique_visitors(self):
+        """Visiteurs uniques : esquisses tenues à l'écriture, identiques après recalcul."""
+        stats = dashboard_stats()
+        self.assertEqual(stats['visitors_today'], 2)
+        self.assertEqual(stats['visitors_this_month'], 2)
+        self.assertEqual(stats['monthly_visitors'][-1]['count'], 2)
+        rebuild_visitor_sketches()
+        self.assertEqual(dashboard_stats()['visitors_this_week'], 2)
+
+    def test_hyperloglog_accuracy(self):
+        """L'estimation HyperLogLog reste à moins de 2 % du compte exact, fusion comprise."""
+        days = [HyperLogLog() for _ in range(3)]
+        exact = set()
+        for i in range(30000):
+            visitor = f'ip:10.{i % 251}.{i // 251}.{i % 7}'
+            days[i % 3].add(visitor)
+            exact.add(visitor)
+        union = HyperLogLog.from_bytes(days[0].to_bytes()).merge(days[1]).merge(days[2])
+        self.assertLess(abs(union.count() - len(exact)) / len(exact), 0.02)
+        self.assertEqual(len(days[0].to_bytes()), 4096)
+
+    def test_realtime_delta_and_etag(self):
+        """Temps réel : curseur pour n'envoyer que les nouvelles visites, 304 si rien n'a changé."""
+        url = reverse('statistics_realtime')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.staff)
+        full = self.client.get(url)
+        cursor, geo = full.json()['cursor'], full.json()['geo_version']
+        self.assertEqual(len(full.json()['last_visits']), 3)
+        self.assertIn('country_data', full.json())
+
+        unchanged = self.client.get(url, {'since': cursor, 'geo': geo}, HTTP_IF_NONE_MATCH=full['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+
+        PageView.objects.create(path='/contact/', ip_address='41.138.100.9', country='Burkina Faso', country_code='BF')
+        delta = self.client.get(url, {'since': cursor, 'geo': geo}, HTTP_IF_NONE_MATCH=full['ETag'])
+        self.assertEqual(delta.status_code, 200)
+        data = delta.json()
+        self.assertEqual([v['path'] for v in data['last_visits']], ['/contact/'])
+        self.assertEqual(data['country_deltas'], [{'country': 'Burkina Faso', 'code': 'BF', 'count': 1}])
+        self.assertGreater(data['cursor'], cursor)
+
+        # Visites déjà envoyées géolocalisées après coup : nouvel ETag et réponse complète
+        PageView.objects.create(path='/blog/', ip_address='8.8.8.8')
+        current = self.client.get(url, {'since': data['cursor'], 'geo': geo})
+        with mock.patch.object(HttpGeoResolver, 'lookup_many', return_value={'8.8.8.8': ('États-Unis', 'US', '')}):
+            self.assertEqual(enrich_ips(['8.8.8.8']), 1)
+        enriched = self.client.get(url, {'since': current.json()['cursor'], 'geo': geo},
+                                   HTTP_IF_NONE_MATCH=current['ETag'])
+        self.assertEqual(enriched.status_code, 200)
+        self.assertIn({'country': 'États-Unis', 'code': 'US', 'count': 1}, enriched.json()['country_data'])
+        self.assertNotEqual(enriched.json()['geo_version'], geo)
+
+    def test_live_broker_replay(self):
+        """Courtier en mémoire : reprise après un id, rattrapage signalé si le tampon a débordé."""
+        broker = VisitBroker(buffer_size=3)
+        broker.publish([(i, {'id': i}) for i in range(1, 4)])
+        self.assertEqual([e[0] for e in broker.events_after(1)], [2, 3])
+        self.assertEqual(broker.wait(3, timeout=0.01), [])
+        broker.publish([(4, {'id': 4})])
+        self.assertIsNone(broker.events_after(0))
+        self.assertEqual([e[0] for e in broker.wait(3, timeout=0.01)], [4])
+
+    def test_live_stream(self):
+        """Flux SSE : visites publiées à l'écriture, reprise via Last-Event-ID, battement de cœur."""
+        url = reverse('statistics_live')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.staff)
+        first_id = PageView.objects.order_by('id').first().id
+        # Workers synchrones : pas de flux, le tableau de bord sonde
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(SERVER_ASGI=True):
+            with mock.patch.object(views, 'avisit_stream', return_value=iter([])):
+                response = self.client.get(url, HTTP_LAST_EVENT_ID=str(first_id))
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            response.close()
+
+        with mock.patch('core.live._broker', VisitBroker()) as broker:
+            # Visites absentes du courtier (autre processus) : rattrapées en base au battement de cœur
+            chunks = list(visit_stream(last_id=first_id, heartbeat=0.01, max_duration=0.05))
+            self.assertTrue(chunks[0].startswith('retry:'))
+            events = [c for c in chunks if c.startswith('id:')]
+            self.assertEqual(len(events), 2)
+            self.assertIn('"path": "/blog/"', events[-1])
+            self.assertIn(': heartbeat\n\n', chunks)
+
+            rows = middleware.save_visits([
+                middleware.VisitRecord('/contact/', '41.138.100.9', 'c', 'Mozilla/5.0 (X11; Linux x86_64)', '', False),
+            ])
+            self.assertEqual([e[0] for e in broker.events_after(first_id)], [rows[0].id])
+
+        # Le tableau de bord n'ouvre le flux qu'en ASGI
+        self.assertNotContains(self.client.get(reverse('statistics')), url)
+        with override_settings(SERVER_ASGI=True):
+            self.assertContains(self.client.get(reverse('statistics')), url)
+
+    @override_settings(PAGEVIEW_DEDUP_BACKEND='cache')
+    def test_dashboard_query_budget(self):
+        """Le nombre de requêtes du tableau de bord reste borné, quel que soit l'historique."""
+        with CaptureQueriesContext(connection) as ctx:
+            dashboard_stats()
+        self.assertLessEqual(len(ctx.captured_queries), 9)
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('statistics'))
+        self.assertLessEqual(len(ctx.captured_queries), 20)
+
+    def test_dashboard_snapshot_stale_while_revalidate(self):
+        """Instantané périmé : servi tel quel, un seul recalcul lancé malgré plusieurs requêtes."""
+        snapshot = get_dashboard_snapshot()
+        self.assertEqual(snapshot['data']['total_views'], 3)
+        self.assertEqual(get_dashboard_snapshot()['built_at'], snapshot['built_at'])
+        snapshot['built_at'] -= 3600
+        cache.set(stats_module.DASHBOARD_SNAPSHOT_KEY, snapshot)
+        with mock.patch.object(stats_module, '_refresh_in_background') as refresh:
+            self.assertEqual(get_dashboard_snapshot()['built_at'], snapshot['built_at'])
+            get_dashboard_snapshot()
+        refresh.assert_called_once()
+
+
+class AssistantTestCase(TestCase):
+    """Tests de l'assistant contre le serveur LLM factice."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.llm = StubLLMServer(('127.0.0.1', 0), latency=0.2, ttft=0.02)
+        threading.Thread(target=cls.llm.serve_forever, daemon=True).start()
+        cls.api_url = f'http://127.0.0.1:{cls.llm.server_address[1]}/v1/chat/completions'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.llm.shutdown()
+        cls.llm.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        settings_override = override_settings(
+            DEEPSEEK_API_KEY='stub', DEEPSEEK_API_URL=self.api_url,
+            ASSISTANT_RATE_LIMIT_PER_MINUTE=0, ASSISTANT_RATE_LIMIT_PER_DAY=0, ASSISTANT_LOG_MODE='sync',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # L'index et le cache des réponses sont gardés en mémoire : rien ne doit passer d'un test à l'autre
+        invalidate_index()
+        get_response_cache().clear()
+        for patcher in (mock.patch('core.assistant._breaker', None), mock.patch('core.assistant._slots', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_sync_chat(self):
+        """Vue synchrone : réponse du modèle, question enregistrée, erreurs de requête."""
+        response = self.client.post(reverse('assistant_chat'), {'message': 'Prix d\'un site vitrine ?'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Prix d\'un site vitrine ?', response.json()['content'])
+        self.assertTrue(AssistantQuestion.objects.filter(content='Prix d\'un site vitrine ?').exists())
+        response = self.client.post(reverse('assistant_chat'), {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_async_chat_concurrency(self):
+        """Vue asynchrone : les appels au modèle se chevauchent au lieu de s'enchaîner."""
+        factory = AsyncRequestFactory()
+
+        async def chat_many(n):
+            chat_requests = [
+                factory.post('/api/assistant/', {'message': f'Question {i}'}, content_type='application/json')
+                for i in range(n)
+            ]
+            return await asyncio.gather(*(views.assistant_chat_async(r) for r in chat_requests))
+
+        start = time.perf_counter()
+        responses = async_to_sync(chat_many)(20)
+        elapsed = time.perf_counter() - start
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertIn('Question 7', json.loads(responses[7].content)['content'])
+        # 20 appels de 0,2 s : bien moins que 4 s en série
+        self.assertLess(elapsed, 2.0)
+        self.assertGreaterEqual(self.llm.max_in_flight, 10)
+        self.assertEqual(AssistantQuestion.objects.filter(content__startswith='Question ').count(), 20)
+
+    def test_streaming_chat(self):
+        """Mode flux : fragments relayés en NDJSON, le premier bien avant la fin de la réponse."""
+        self.llm.latency = 0.6
+        self.addCleanup(setattr, self.llm, 'latency', 0.2)
+        start = time.perf_counter()
+        response = self.client.post(reverse('assistant_chat'), {'message': 'Délai pour un site ?', 'stream': True},
+                                    content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        chunks = iter(response.streaming_content)
+        first = json.loads(next(chunks))
+        time_to_first = time.perf_counter() - start
+        events = [first] + [json.loads(line) for line in chunks]
+        self.assertLess(time_to_first, 0.3)
+        self.assertEqual(events[-1], {'done': True})
+        self.assertEqual(''.join(e.get('delta', '') for e in events), 'Réponse de test à : Délai pour un site ?')
+
+    def test_async_streaming_chat(self):
+        """Mode flux de la vue asynchrone."""
+        request = AsyncRequestFactory().post('/api/assistant/', {'message': 'Bonjour', 'stream': True},
+                                             content_type='application/json')
+
+        async def collect():
+            response = await views.assistant_chat_async(request)
+            return [json.loads(line) async for line in response.streaming_content]
+
+        events = async_to_sync(collect)()
+        self.assertEqual(''.join(e.get('delta', '') for e in events), 'Réponse de test à : Bonjour')
+        self.assertEqual(events[-1], {'done': True})
+
+    def test_local_faq_answer(self):
+        """Question proche d'une FAQ : réponse locale sans appel au modèle, comptée dans le taux."""
+        FAQ.objects.create(question='Quels sont vos tarifs ?', answer='Un site vitrine coûte entre 200 000 et 800 000 FCFA.')
+        FAQ.objects.create(question='Combien de temps faut-il pour créer un site web ?', answer='Deux à six semaines.')
+        self.assertIsNone(find_local_answer('Faites-vous des logos ?'))
+        served = self.llm.served
+        with override_settings(DEEPSEEK_API_KEY=''):
+            response = self.client.post(reverse('assistant_chat'), {'message': 'Quel est le prix d\'un site ?'},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['content'].startswith('Un site vitrine coûte'))
+        self.assertEqual(self.llm.served, served)
+        self.assertEqual(AssistantQuestion.objects.get().source, AssistantQuestion.SOURCE_FAQ)
+
+        self.client.post(reverse('assistant_chat'), {'message': 'Faites-vous des logos ?'}, content_type='application/json')
+        question = AssistantQuestion.objects.get(source=AssistantQuestion.SOURCE_LLM)
+        self.assertIn('logos', question.answer)
+        stats = dashboard_stats()
+        self.assertEqual((stats['assistant_local_answers_30d'], stats['assistant_questions_30d']), (1, 2))
+        self.assertEqual(stats['assistant_local_rate'], 50.0)
+
+    def test_local_answer_false_positives(self):
+        """FAQ réelles (faqs_backup.json) : les questions voisines mais différentes vont au modèle."""
+        with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'faqs_backup.json'), encoding='utf-8') as f:
+            for faq in json.load(f):
+                FAQ.objects.create(question=faq['question'], answer=faq['answer'], active=faq['active'])
+        for question in ('Faites-vous des applications mobiles ?', 'Mon site mobile est lent',
+                         'Combien coûte une application mobile ?', 'Combien coûte l\'hébergement ?',
+                         'Quel est le coût de la maintenance ?', 'Mon téléphone ne charge pas le site',
+                         'Le chargement est trop long'):
+            self.assertIsNone(find_local_answer(question), question)
+        self.assertTrue(find_local_answer('Quel est le prix d\'un site ?')[0].startswith('Nos tarifs'))
+        self.assertIsNotNone(find_local_answer('Mon site sera-t-il compatible mobile ?'))
+        # Relance : la question seule ressemble à une FAQ, mais dépend de la conversation
+        served = self.llm.served
+        history = [{'role': 'user', 'content': 'Faites-vous des applications mobiles ?'},
+                   {'role': 'assistant', 'content': 'Oui, sur Android et iOS.'},
+                   {'role': 'user', 'content': 'Quels sont vos tarifs ?'}]
+        response = self.client.post(reverse('assistant_chat'), {'messages': history}, content_type='application/json')
+        self.assertEqual(response.json()['content'], 'Réponse de test à : Quels sont vos tarifs ?')
+        self.assertEqual(self.llm.served, served + 1)
+
+    def test_approved_answer_reused(self):
+        """Une réponse validée dans l'admin est réutilisée ; l'index suit les modifications."""
+        question = AssistantQuestion.objects.create(content='Créez-vous des logos ?', answer='Oui, nous créons des logos.')
+        self.assertIsNone(find_local_answer('Créez-vous des logos ?'))
+        question.approved = True
+        question.save()
+        self.assertEqual(find_local_answer('Vous créez des logos ?')[:2], ('Oui, nous créons des logos.', 'approved'))
+        question.delete()
+        self.assertIsNone(find_local_answer('Vous créez des logos ?'))
+
+    def test_response_cache(self):
+        """Conversation déjà vue (à la casse, aux accents et aux espaces près) : réponse du cache, sans appel au modèle."""
+        url = reverse('assistant_chat')
+        first = self.client.post(url, {'message': 'Réalisez-vous des applications mobiles ?'}, content_type='application/json')
+        served = self.llm.served
+        start = time.perf_counter()
+        again = self.client.post(url, {'message': '  realisez-vous des APPLICATIONS   mobiles?'}, content_type='application/json')
+        elapsed = time.perf_counter() - start
+        self.assertEqual(again.json(), {'content': first.json()['content'], 'source': 'cache'})
+        self.assertEqual(self.llm.served, served)
+        self.assertLess(elapsed, 0.05)
+        self.assertEqual(AssistantQuestion.objects.filter(source=AssistantQuestion.SOURCE_CACHE).count(), 1)
+        # Un historique différent n'est pas la même conversation
+        self.client.post(url, {'messages': [
+            {'role': 'user', 'content': 'Bonjour'}, {'role': 'assistant', 'content': 'Bonjour !'},
+            {'role': 'user', 'content': 'Réalisez-vous des applications mobiles ?'},
+        ]}, content_type='application/json')
+        self.assertEqual(self.llm.served, served + 1)
+        # Réponse en flux mise en cache une fois terminée
+        response = self.client.post(url, {'message': 'Et le SEO ?', 'stream': True}, content_type='application/json')
+        list(response.streaming_content)
+        response = self.client.post(url, {'message': 'et le seo', 'stream': True}, content_type='application/json')
+        self.assertEqual(self.llm.served, served + 2)
+        self.assertEqual(json.loads(list(response.streaming_content)[0])['delta'], 'Réponse de test à : Et le SEO ?')
+
+    def test_circuit_breaker_states(self):
+        """Fermé → ouvert après N échecs (ou appels lents) → semi-ouvert : un seul essai → fermé ou rouvert."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, slow_call=1)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_success(duration=5)  # trop lent : compte comme un échec
+        self.assertFalse(breaker.allow())
+        later = time.monotonic() + 11
+        with mock.patch('core.circuit.time.monotonic', return_value=later):
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())  # essai déjà en cours
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+        with mock.patch('core.circuit.time.monotonic', return_value=later + 11):
+            self.assertTrue(breaker.allow())
+            breaker.record_success(duration=0.1)
+            self.assertEqual(breaker.stats(), {'state': 'closed', 'failures': 0})
+            self.assertTrue(breaker.allow())
+
+    @override_settings(ASSISTANT_BREAKER_FAILURES=2, ASSISTANT_BREAKER_RESET=60)
+    def test_upstream_failures_fail_fast(self):
+        """Modèle injoignable : après 2 échecs, réponse immédiate « indisponible » sans appel."""
+        url = reverse('assistant_chat')
+        with override_settings(DEEPSEEK_API_URL='http://127.0.0.1:9/v1/chat/completions'):
+            for i in range(2):
+                response = self.client.post(url, {'message': f'Panne {i}'}, content_type='application/json')
+                self.assertEqual(response.status_code, 502)
+        served = self.llm.served
+        start = time.perf_counter()
+        response = self.client.post(url, {'message': 'Encore là ?'}, content_type='application/json')
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['error'], 'Service temporairement indisponible. Vous pouvez nous contacter directement.')
+        self.assertEqual(self.llm.served, served)
+
+    @override_settings(ASSISTANT_MAX_IN_FLIGHT=3)
+    def test_in_flight_limit(self):
+        """Au-delà de ASSISTANT_MAX_IN_FLIGHT appels en cours, les suivants sont refusés aussitôt ; flux compris."""
+        factory = AsyncRequestFactory()
+
+        async def chat_many(n):
+            chat_requests = [
+                factory.post('/api/assistant/', {'message': f'Limite {i}'}, content_type='application/json')
+                for i in range(n)
+            ]
+            return await asyncio.gather(*(views.assistant_chat_async(r) for r in chat_requests))
+
+        responses = async_to_sync(chat_many)(6)
+        self.assertEqual(sorted(r.status_code for r in responses), [200] * 3 + [503] * 3)
+        # Places rendues à la fin des flux, même non lus jusqu'au bout
+        for i in range(5):
+            response = self.client.post(reverse('assistant_chat'), {'message': f'Flux {i}', 'stream': True},
+                                        content_type='application/json')
+            next(iter(response.streaming_content))
+            response.close()
+        response = self.client.post(reverse('assistant_chat'), {'message': 'Après les flux'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_loadtest_visitors(self):
+        """Test de charge : un visiteur par requête (en-tête d'adresse réelle), 429 et 503 comptés à part."""
+        import httpx
+
+        seen = []
+
+        def handler(request):
+            if request.method == 'GET':
+                return httpx.Response(200, headers={'Set-Cookie': 'csrftoken=abc; Path=/'})
+            seen.append(request.headers.get('X-Real-IP'))
+            return httpx.Response({1: 429, 2: 503}.get(len(seen), 200), text='{}')
+
+        client_class = httpx.AsyncClient
+        out = StringIO()
+        with mock.patch.object(httpx, 'AsyncClient',
+                               side_effect=lambda **kw: client_class(transport=httpx.MockTransport(handler), **kw)):
+            call_command('loadtest_assistant', '--concurrency', '1', '--requests', '4', stdout=out)
+        self.assertEqual(len(set(seen)), 4)
+        self.assertIn('2 erreur(s)', out.getvalue())
+        self.assertIn('429 × 1, 503 × 1', out.getvalue())
+        self.assertIn('ASSISTANT_MAX_IN_FLIGHT=1', out.getvalue())
+
+    @override_settings(ASSISTANT_LOG_MODE='buffered')
+    def test_buffered_question_log(self):
+        """Questions journalisées par lots après la réponse, avec durée, jetons et indicateur de cache."""
+        buffer = BufferedWriter(assistant_log.save_questions, batch_size=1000, interval_ms=60000)
+        self.addCleanup(buffer.close)
+        url = reverse('assistant_chat')
+        with mock.patch.object(assistant_log, '_question_buffer', buffer):
+            self.client.post(url, {'message': 'Faites-vous des logos ?'}, content_type='application/json')
+            response = self.client.post(url, {'message': 'Et des flyers ?', 'stream': True}, content_type='application/json')
+            list(response.streaming_content)
+            self.client.post(url, {'message': 'faites-vous des logos'}, content_type='application/json')
+            self.assertEqual(AssistantQuestion.objects.count(), 0)
+            self.assertEqual(buffer.flush(), 3)
+        logos, flyers = (AssistantQuestion.objects.get(content=c) for c in ('Faites-vous des logos ?', 'Et des flyers ?'))
+        self.assertEqual(logos.answer, 'Réponse de test à : Faites-vous des logos ?')
+        self.assertFalse(logos.cache_hit)
+        self.assertGreaterEqual(logos.latency_ms, 200)
+        self.assertGreater(logos.prompt_tokens, 0)
+        self.assertGreater(logos.completion_tokens, 0)
+        self.assertEqual(flyers.answer, 'Réponse de test à : Et des flyers ?')
+        self.assertGreater(flyers.completion_tokens, 0)
+        self.assertIsNotNone(flyers.latency_ms)
+        cached = AssistantQuestion.objects.get(content='faites-vous des logos')
+        self.assertTrue(cached.cache_hit)
+        self.assertIsNone(cached.latency_ms)
+
+    def test_rate_limit(self):
+        """Limite par visiteur : 429 avec Retry-After, fenêtres par minute et par jour, visiteurs distincts."""
+        cache.clear()
+        url = reverse('assistant_chat')
+        # Horloge du limiteur figée : le test ne doit pas chevaucher deux fenêtres d'une minute
+        clock = mock.patch('core.ratelimit.time', **{'time.return_value': time.time() // 60 * 60 + 1})
+        with clock, override_settings(ASSISTANT_RATE_LIMIT_PER_MINUTE=3, ASSISTANT_RATE_LIMIT_PER_DAY=100):
+            codes = [self.client.post(url, {'message': f'Limite {i}'}, content_type='application/json').status_code
+                     for i in range(3)]
+            response = self.client.post(url, {'message': 'Une de trop'}, content_type='application/json')
+            other = self.client.post(url, {'message': 'Autre visiteur'}, content_type='application/json',
+                                     REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(codes, [200] * 3)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
+        self.assertEqual(other.status_code, 200)
+        self.assertFalse(AssistantQuestion.objects.filter(content='Une de trop').exists())
+        # Réponses locales (cache des réponses) comptées aussi : une question répétée finit en 429, sans journal
+        with override_settings(ASSISTANT_RATE_LIMIT_PER_MINUTE=2, ASSISTANT_RATE_LIMIT_PER_DAY=100), clock:
+            codes = [self.client.post(url, {'message': 'Limite 0'}, content_type='application/json',
+                                      REMOTE_ADDR='10.0.0.3').status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
+        self.assertEqual(AssistantQuestion.objects.filter(content='Limite 0', cache_hit=True).count(), 2)
+
+        # Seau à jetons : rafale de 5, puis un jeton toutes les 12 s ; le seau du jour (6) prend le relais
+        limits = {'minute': 5, 'day': 6}
+        now = 1_000_000 * 86400 + 3600
+        self.assertEqual([hit_rate_limit('test', 'ip:x', limits, now) for _ in range(5)], [0] * 5)
+        self.assertEqual(hit_rate_limit('test', 'ip:x', limits, now), 12)
+        self.assertEqual(hit_rate_limit('test', 'ip:x', limits, now + 12), 0)
+        # Seau du jour vide (6 appels) : prochain jeton 4 h après le sixième
+        self.assertEqual(hit_rate_limit('test', 'ip:x', limits, now + 24), 14400 - 24)
+
+    def test_rate_limit_backends(self):
+        """Seau dans une seule clé, mis à jour atomiquement : transaction (table en base), script Lua (Redis)."""
+        call_command('createcachetable', 'django_cache', stdout=StringIO())
+        db_cache = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}}
+        with override_settings(CACHES=db_cache):
+            self.assertEqual([hit_rate_limit('test', 'ip:y', {'minute': 2}, 1000.0) for _ in range(3)], [0, 0, 30])
+            self.assertEqual(caches['default'].get(f"rl:test:{hashlib.blake2b(b'ip:y', digest_size=12).hexdigest()}"),
+                             '1060.000,0.000')
+        redis = mock.Mock(spec=RedisCache)
+        client = redis._cache.get_client.return_value
+        client.eval.return_value = 30
+        with mock.patch.object(ratelimit, 'caches', {'default': redis}):
+            self.assertEqual(hit_rate_limit('test', 'ip:y', {'minute': 2, 'day': 100}, 1000.0), 30)
+        client.eval.assert_called_once_with(ratelimit.REDIS_SCRIPT, 1, redis.make_and_validate_key.return_value,
+                                            1000.0, 86400, 60, 2, 86400, 100)
+        # Même calcul que le script
+        self.assertEqual(ratelimit.take_token('1060.000,0.000', 1000.0, [(60, 2), (86400, 0)]), (None, 30))
+        # Cache sans opération atomique (fichiers) : signalé par manage.py check
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                  'LOCATION': tempfile.gettempdir()}}
+        with override_settings(CACHES=file_cache):
+            self.assertEqual([w.id for w in checks.check_rate_limit_cache(None)], ['core.W001'])
+        self.assertEqual(checks.check_rate_limit_cache(None), [])
+
+    @override_settings(ASSISTANT_RATE_LIMIT_PER_MINUTE=2, ASSISTANT_RATE_LIMIT_PER_DAY=100,
+                       CLIENT_IP_HEADER='X-Real-IP', TRUSTED_PROXIES=['127.0.0.1'])
+    def test_rate_limit_behind_proxy(self):
+        """Derrière Nginx (même REMOTE_ADDR pour tous) : limite par adresse réelle, en-tête ignoré hors proxy."""
+        cache.clear()
+        url = reverse('assistant_chat')
+
+        sent = iter(range(100))
+
+        def post(ip, **extra):
+            # Messages tous différents : pas de réponse servie par le cache
+            return self.client.post(url, {'message': f'Question {next(sent)}'}, content_type='application/json',
+                                    HTTP_X_REAL_IP=ip, **extra).status_code
+
+        with mock.patch('core.ratelimit.time', **{'time.return_value': time.time() // 60 * 60 + 1}):
+            self.assertEqual([post(f'41.138.100.{i}') for i in range(1, 13)], [200] * 12)
+            self.assertEqual([post('41.138.100.1') for _ in range(2)], [200, 429])
+            # En-tête forgé par un client qui ne passe pas par le proxy : ignoré
+            self.assertEqual([post(f'41.138.101.{i}', REMOTE_ADDR='10.0.0.5') for i in range(3)], [200, 200, 429])
+
+    @override_settings(ASSISTANT_HISTORY_TURNS=4, ASSISTANT_MAX_MESSAGE_CHARS=500, ASSISTANT_HISTORY_MAX_TOKENS=1500)
+    def test_history_budget(self):
+        """Historique compacté : derniers échanges gardés, anciens résumés, messages tronqués, budget respecté."""
+        history = []
+        for i in range(30):
+            history += [{'role': 'user', 'content': f'Question {i} ' + 'x' * 1000},
+                        {'role': 'assistant', 'content': f'Réponse {i} ' + 'y' * 1000}]
+        history.append({'role': 'user', 'content': 'Dernière question'})
+        messages = build_messages({'messages': history})
+        self.assertEqual(messages[-1], {'role': 'user', 'content': 'Dernière question'})
+        self.assertEqual(messages[0]['role'], 'system')
+        self.assertTrue(all(len(m['content']) <= 505 for m in messages[1:]))
+        size, tokens = payload_size(messages)
+        self.assertLessEqual(tokens, 1500)
+        self.assertLessEqual(len(messages), 6)
+        # Budget large : les anciens échanges sont résumés plutôt qu'envoyés tels quels
+        with override_settings(ASSISTANT_HISTORY_MAX_TOKENS=100000, ASSISTANT_HISTORY_MAX_BYTES=10 ** 6):
+            messages = build_messages({'messages': history})
+        self.assertTrue(messages[1]['content'].startswith(SUMMARY_PREFIX))
+        self.assertIn('Question 0', messages[1]['content'])
+        self.assertEqual([m['role'] for m in messages[2:]], ['user', 'assistant', 'user'])
+
+        # Corps trop volumineux refusé ; en DEBUG, taille de la requête au modèle indiquée
+        url = reverse('assistant_chat')
+        response = self.client.post(url, {'message': 'z' * 100000}, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+        with override_settings(DEBUG=True):
+            response = self.client.post(url, {'messages': history}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        debug = response.json()['debug']
+        self.assertLessEqual(debug['payload_tokens'], 1500)
+        self.assertIn(f'bytes={debug["payload_bytes"]}', response['X-Assistant-Payload'])
+
+    def test_response_cache_lru_and_ttl(self):
+        """Cache borné (entrée la moins récemment lue évincée), entrées expirées, clé liée au prompt système."""
+        response_cache = ResponseCache(max_size=2, ttl=60)
+        response_cache.set('a', 1)
+        response_cache.set('b', 2)
+        response_cache.get('a')
+        response_cache.set('c', 3)
+        self.assertEqual((response_cache.get('a'), response_cache.get('b'), response_cache.get('c')), (1, None, 3))
+        with mock.patch('core.assistant.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(response_cache.get('a'))
+        self.assertEqual(len(response_cache), 1)
+        key = conversation_key([{'role': 'user', 'content': 'Bonjour'}])
+        with mock.patch('core.assistant.PROMPT_VERSION', 'autre'):
+            self.assertNotEqual(conversation_key([{'role': 'user', 'content': 'Bonjour'}]), key)
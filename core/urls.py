@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -28,11 +29,13 @@ urlpatterns = [
     # Tableau de bord
     path('statistiques/', views.statistics, name='statistics'),
     path('statistiques/api/realtime/', views.statistics_realtime, name='statistics_realtime'),
+    path('statistiques/api/live/', views.statistics_live, name='statistics_live'),
     path('statistiques/messages/', views.dashboard_messages, name='dashboard_messages'),
     
     # Robots.txt
     path('robots.txt', views.robots_txt, name='robots_txt'),
 
     # Assistant conversationnel (DeepSeek)
-    path('api/assistant/', views.assistant_chat, name='assistant_chat'),
+    # Vue asynchrone quand le site est servi en ASGI (siraweb.asgi)
+    path('api/assistant/', views.assistant_chat_async if getattr(settings, 'SERVER_ASGI', False) else views.assistant_chat, name='assistant_chat'),
 ]
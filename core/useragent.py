@@ -0,0 +1,48 @@
+"""
+Classification des User-Agent : bot ou non, et type d'appareil, en un seul appel.
+Chaque famille de motifs est compilée en une seule alternance ; les résultats sont mémorisés
+dans un LRU borné, la plupart du trafic venant de quelques centaines de User-Agent.
+"""
+import re
+from functools import lru_cache
+
+from .models import PageView
+
+# Motifs pour détecter les bots
+BOT_PATTERNS = [
+    r'bot', r'crawler', r'spider', r'scraper',
+    r'facebookexternalhit', r'twitterbot', r'linkedinbot',
+    r'whatsapp', r'telegram', r'skype', r'googlebot',
+    r'bingbot', r'yandex', r'baiduspider', r'duckduckbot'
+]
+
+# Tablettes (testées avant mobile car iPad contient "mobile")
+TABLET_TOKENS = ('ipad', 'tablet', 'playbook', 'silk/', 'kftt', 'kindle', 'gt-p', 'sm-t', 'tab')
+MOBILE_TOKENS = ('mobile', 'android', 'iphone', 'ipod', 'webos', 'blackberry', 'opera mini', 'iemobile', 'windows phone')
+# Desktop (navigateurs classiques)
+DESKTOP_TOKENS = ('windows', 'macintosh', 'linux', 'x11', 'cros', 'openbsd')
+
+_BOT_RE = re.compile('|'.join(BOT_PATTERNS))
+_DEVICE_RES = [
+    (PageView.DEVICE_TABLET, re.compile('|'.join(map(re.escape, TABLET_TOKENS)))),
+    (PageView.DEVICE_MOBILE, re.compile('|'.join(map(re.escape, MOBILE_TOKENS)))),
+    (PageView.DEVICE_DESKTOP, re.compile('|'.join(map(re.escape, DESKTOP_TOKENS)))),
+]
+
+UA_CACHE_SIZE = 2048
+
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def classify_user_agent(user_agent):
+    """
+    Retourne (is_bot, device_type) pour un User-Agent.
+    Ordre des appareils : tablette → mobile → desktop → other.
+    """
+    if not user_agent:
+        return False, PageView.DEVICE_OTHER
+    ua = user_agent.lower()
+    is_bot = _BOT_RE.search(ua) is not None
+    for device_type, pattern in _DEVICE_RES:
+        if pattern.search(ua):
+            return is_bot, device_type
+    return is_bot, PageView.DEVICE_OTHER
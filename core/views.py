@@ -1,25 +1,27 @@
 import json
-import requests
+import time
+from datetime import datetime, timezone as dt_timezone
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
-from django.http import HttpResponse, Http404, JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_http_methods
 from django.core.paginator import Paginator
 from .models import Article, Category, Tag, Service, TeamMember, Testimonial, Partner, Portfolio, Technology, AnonymousCTA, FAQ, CompanyStats, PageView, AssistantQuestion, ContactMessage, PageBanner
 from .forms import ContactForm
-
-# Prompt système pour l'assistant FASOWEB (DeepSeek) - orienté conversion
-ASSISTANT_SYSTEM_PROMPT = """Tu es l'assistant commercial de FASOWEB, agence web au Burkina Faso (Ouagadougou, Bobo-Dioulasso). Ton objectif : aider au maximum ET convertir les visiteurs en clients.
-
-Ton rôle :
-- Répondre à toutes les questions : sites vitrine, e-commerce, SEO, refonte, maintenance, tarifs, délais, processus.
-- Donner des fourchettes de prix indicatives quand on te demande : site vitrine (souvent entre 200 000 et 800 000 FCFA selon la complexité), e-commerce (à partir d’environ 500 000 FCFA), SEO / accompagnement (forfaits selon objectifs). Toujours préciser que ces montants sont indicatifs et qu’un devis gratuit permet un chiffrage précis.
-- Rappeler que l’accompagnement FASOWEB est continu et illimité après livraison : support, conseils, évolutions, pas de limite dans le temps pour nos clients.
-- Inciter à nous contacter pour un devis personnalisé : formulaire sur le site, WhatsApp, email, téléphone. Proposer d’ouvrir le formulaire de devis ou de discuter sur WhatsApp pour aller plus loin.
-
-Règles : Réponds en français, concis et chaleureux. À la fin de CHAQUE réponse, invite à cliquer sur « Demander un devis gratuit » ou « Écrire sur WhatsApp » en bas du chat. Chaque réponse doit aider ET inciter à passer à l'action."""
+from .assistant import (
+    AssistantError, acomplete, aopen_stream, build_messages, cache_response, cached_response, complete,
+    last_user_message, ndjson_line, open_stream, payload_size,
+)
+from .assistant_log import alog_question, log_question
+from .faq_index import find_local_answer
+from .clientip import client_ip
+from .geoip import enrichment_version
+from .ratelimit import hit_rate_limit
+from .live import avisit_stream, serialize_visit
+from .stats import get_dashboard_snapshot, visitor_identity
 
 
 def home(request):
@@ -323,182 +325,139 @@ def handler500(request):
 
 
 def statistics(request):
-    """Page de statistiques du site."""
-    from django.db.models import Count, Q
-    from django.utils import timezone
-    from datetime import timedelta
-    from collections import defaultdict
-    
+    """Page de statistiques du site (instantané en cache des cumuls quotidiens, voir core.stats)."""
     # Vérifier que l'utilisateur est admin
     if not request.user.is_authenticated or not request.user.is_staff:
-        from django.contrib.auth.decorators import login_required
-        from django.shortcuts import redirect
         return redirect('admin:login')
     
-    # Filtrer les visites (exclure les bots)
-    views = PageView.objects.filter(is_bot=False)
-    
-    # Statistiques générales
-    total_views = views.count()
-    today = timezone.now().date()
-    views_today = views.filter(created_at__date=today).count()
-    views_this_week = views.filter(created_at__gte=today - timedelta(days=7)).count()
-    views_this_month = views.filter(created_at__gte=today - timedelta(days=30)).count()
-    views_this_year = views.filter(created_at__gte=today - timedelta(days=365)).count()
-    
-    # Calculer les variations en pourcentage
-    yesterday = today - timedelta(days=1)
-    views_yesterday = views.filter(created_at__date=yesterday).count()
-    views_last_week = views.filter(created_at__gte=today - timedelta(days=14), created_at__lt=today - timedelta(days=7)).count()
-    views_last_month = views.filter(created_at__gte=today - timedelta(days=60), created_at__lt=today - timedelta(days=30)).count()
-    
-    # Calculer les pourcentages de variation
-    if views_yesterday > 0:
-        today_variation = ((views_today - views_yesterday) / views_yesterday) * 100
-    else:
-        today_variation = 100 if views_today > 0 else 0
-    
-    if views_last_week > 0:
-        week_variation = ((views_this_week - views_last_week) / views_last_week) * 100
-    else:
-        week_variation = 100 if views_this_week > 0 else 0
-    
-    if views_last_month > 0:
-        month_variation = ((views_this_month - views_last_month) / views_last_month) * 100
-    else:
-        month_variation = 100 if views_this_month > 0 else 0
-    
-    # Visites par jour (30 derniers jours)
-    daily_views = []
-    for i in range(29, -1, -1):
-        date = today - timedelta(days=i)
-        count = views.filter(created_at__date=date).count()
-        daily_views.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'label': date.strftime('%d/%m'),
-            'count': count
-        })
-    
-    # Visites par semaine (12 dernières semaines)
-    weekly_views = []
-    for i in range(11, -1, -1):
-        # Calculer le début et la fin de la semaine (lundi à dimanche)
-        days_since_monday = today.weekday()  # 0 = lundi, 6 = dimanche
-        week_end = today - timedelta(days=days_since_monday) - timedelta(days=i * 7)
-        week_start = week_end - timedelta(days=6)
-        count = views.filter(created_at__date__gte=week_start, created_at__date__lte=week_end).count()
-        weekly_views.append({
-            'week': f'Sem {week_start.strftime("%d/%m")}',
-            'count': count
-        })
-    
-    # Visites par mois (12 derniers mois)
-    monthly_views = []
-    for i in range(11, -1, -1):
-        # Calculer le début et la fin du mois correctement
-        target_date = today - timedelta(days=30 * i)
-        month_start = target_date.replace(day=1)
-        # Calculer le dernier jour du mois
-        if month_start.month == 12:
-            month_end = month_start.replace(year=month_start.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = month_start.replace(month=month_start.month + 1, day=1) - timedelta(days=1)
-        count = views.filter(created_at__date__gte=month_start, created_at__date__lte=month_end).count()
-        monthly_views.append({
-            'month': month_start.strftime('%b %Y'),
-            'count': count
-        })
-    
-    # Visites par année
-    yearly_views = []
-    current_year = today.year
-    for year in range(current_year - 4, current_year + 1):
-        count = views.filter(created_at__year=year).count()
-        yearly_views.append({
-            'year': str(year),
-            'count': count
-        })
-    
-    # Répartition par pays
-    country_stats = views.exclude(country_code='').values('country', 'country_code').annotate(
-        count=Count('id')
-    ).order_by('-count')[:20]
-    
-    country_data = [{'country': item['country'] or 'Inconnu', 'code': item['country_code'], 'count': item['count']} 
-                    for item in country_stats]
-    
-    # Répartition par type d'appareil (pour camembert)
-    device_stats = views.values('device_type').annotate(count=Count('id')).order_by('-count')
-    device_labels = dict(PageView.DEVICE_CHOICES)
-    device_data = [{'label': device_labels.get(item['device_type'], item['device_type']), 'count': item['count']} 
-                   for item in device_stats]
-    
-    # Pages les plus visitées
-    top_pages = list(views.values('path').annotate(count=Count('id')).order_by('-count')[:10])
+    snapshot = get_dashboard_snapshot()
+    stats = snapshot['data']
 
     # Dernières questions posées à l'assistant (tableau de bord)
     assistant_questions = AssistantQuestion.objects.all().order_by('-created_at')[:100]
     
     # Dernières visites (date/heure, page, provenance, pays/ville)
-    last_visits = views.order_by('-created_at')[:100]
+    last_visits = PageView.objects.filter(is_bot=False).order_by('-created_at')[:100]
     
     # Convertir en JSON pour le template
-    import json
     context = {
         'meta_title': 'Statistiques du site | FASOWEB',
         'meta_description': 'Tableau de bord des statistiques de visite du site.',
-        'total_views': total_views,
-        'views_today': views_today,
-        'views_this_week': views_this_week,
-        'views_this_month': views_this_month,
-        'views_this_year': views_this_year,
-        'today_variation': round(today_variation, 2),
-        'week_variation': round(week_variation, 2),
-        'month_variation': round(month_variation, 2),
-        'daily_views': json.dumps(daily_views),
-        'weekly_views': json.dumps(weekly_views),
-        'monthly_views': json.dumps(monthly_views),
-        'yearly_views': json.dumps(yearly_views),
-        'country_data': json.dumps(country_data),
-        'device_data': json.dumps(device_data),
-        'top_pages': json.dumps(top_pages),
+        'total_views': stats['total_views'],
+        'views_today': stats['views_today'],
+        'views_this_week': stats['views_this_week'],
+        'views_this_month': stats['views_this_month'],
+        'views_this_year': stats['views_this_year'],
+        'today_variation': stats['today_variation'],
+        'week_variation': stats['week_variation'],
+        'month_variation': stats['month_variation'],
+        'visitors_today': stats['visitors_today'],
+        'visitors_this_week': stats['visitors_this_week'],
+        'visitors_this_month': stats['visitors_this_month'],
+        'daily_views': json.dumps(stats['daily_views']),
+        'weekly_views': json.dumps(stats['weekly_views']),
+        'monthly_views': json.dumps(stats['monthly_views']),
+        'yearly_views': json.dumps(stats['yearly_views']),
+        'monthly_visitors': json.dumps(stats['monthly_visitors']),
+        'country_data': json.dumps(stats['country_data']),
+        'device_data': json.dumps(stats['device_data']),
+        'top_pages': json.dumps(stats['top_pages']),
+        'assistant_questions_30d': stats['assistant_questions_30d'],
+        'assistant_local_answers_30d': stats['assistant_local_answers_30d'],
+        'assistant_local_rate': stats['assistant_local_rate'],
+        'stats_built_at': datetime.fromtimestamp(snapshot['built_at'], tz=dt_timezone.utc),
+        'stats_age': int(time.time() - snapshot['built_at']),
         'assistant_questions': assistant_questions,
         'last_visits': last_visits,
+        # Flux SSE seulement en ASGI : en WSGI chaque onglet ouvert occuperait un worker (sondage à la place)
+        'live_stats_enabled': getattr(settings, 'SERVER_ASGI', False),
     }
     return render(request, 'core/statistics.html', context)
 
 
+def _realtime_etag(request):
+    """
+    ETag du temps réel : id de la dernière visite (hors bots), qui sert aussi de curseur, et version de
+    la géolocalisation après coup (pays complétés sur des visites déjà envoyées).
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return None
+    latest = PageView.objects.filter(is_bot=False).order_by('-id').values_list('id', flat=True).first() or 0
+    request.realtime_latest_id = latest
+    request.realtime_geo_version = enrichment_version()
+    return f'pv-{latest}-g{request.realtime_geo_version}'
+
+
+@condition(etag_func=_realtime_etag)
 def statistics_realtime(request):
     """
-    API JSON pour le rafraîchissement temps réel du tableau de bord :
-    dernières visites et données pays (carte). Réservé aux staff.
+    API JSON pour le rafraîchissement temps réel du tableau de bord. Réservé aux staff.
+    Sans paramètre : dernières visites (100) et données pays (carte), plus un curseur.
+    Avec ?since=<curseur>&geo=<version> : uniquement les visites postérieures et les deltas par pays ;
+    réponse complète si des visites ont été géolocalisées depuis (version différente).
+    Répond 304 (If-None-Match) tant qu'aucune visite n'a été enregistrée ni géolocalisée.
     """
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'error': 'Unauthorized'}, status=401)
     from django.db.models import Count
     views = PageView.objects.filter(is_bot=False)
-    # Dernières visites (100)
-    last = views.order_by('-created_at')[:100]
-    last_visits = [
-        {
-            'created_at': v.created_at.strftime('%d/%m/%Y %H:%M'),
-            'path': v.path[:50] + ('…' if len(v.path) > 50 else ''),
-            'referer': v.referer or '',
-            'country': v.country or '',
-            'city': v.city or '',
-            'device': v.get_device_type_display(),
-        }
-        for v in last
-    ]
-    # Répartition par pays (carte)
-    country_stats = views.exclude(country_code='').values('country', 'country_code').annotate(
-        count=Count('id')
-    ).order_by('-count')[:20]
-    country_data = [
-        {'country': item['country'] or 'Inconnu', 'code': item['country_code'], 'count': item['count']}
-        for item in country_stats
-    ]
-    return JsonResponse({'last_visits': last_visits, 'country_data': country_data})
+    cursor = request.realtime_latest_id
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        since = None
+    geo_version = request.realtime_geo_version
+    if request.GET.get('geo') != str(geo_version):
+        # Pays complétés depuis le dernier envoi : les deltas ne suffisent plus
+        since = None
+
+    if since is not None:
+        new_views = views.filter(id__gt=since, id__lte=cursor)
+        last_visits = [serialize_visit(v) for v in new_views.order_by('-id')[:100]]
+        country_deltas = [
+            {'country': item['country'] or 'Inconnu', 'code': item['country_code'], 'count': item['count']}
+            for item in new_views.exclude(country_code='').values('country', 'country_code').annotate(count=Count('id'))
+        ]
+        response = JsonResponse({'cursor': cursor, 'geo_version': geo_version, 'last_visits': last_visits,
+                                 'country_deltas': country_deltas})
+    else:
+        # Dernières visites (100)
+        last = views.filter(id__lte=cursor).order_by('-created_at')[:100]
+        last_visits = [serialize_visit(v) for v in last]
+        # Répartition par pays (carte)
+        country_stats = views.filter(id__lte=cursor).exclude(country_code='').values('country', 'country_code').annotate(
+            count=Count('id')
+        ).order_by('-count')[:20]
+        country_data = [
+            {'country': item['country'] or 'Inconnu', 'code': item['country_code'], 'count': item['count']}
+            for item in country_stats
+        ]
+        response = JsonResponse({'cursor': cursor, 'geo_version': geo_version, 'last_visits': last_visits,
+                                 'country_data': country_data})
+    # Toujours revalider : le client renvoie lui-même l'ETag (If-None-Match)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def statistics_live(request):
+    """
+    Flux SSE des nouvelles visites pour le tableau de bord (événements « visit »). Réservé aux staff.
+    Reprise après coupure via l'en-tête Last-Event-ID (ou ?last_event_id=).
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+    if not getattr(settings, 'SERVER_ASGI', False):
+        # Workers synchrones : une connexion longue bloquerait un worker entier (le tableau de bord sonde)
+        return JsonResponse({'error': 'Flux en direct disponible seulement en ASGI'}, status=404)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    response = StreamingHttpResponse(avisit_stream(last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx : pas de mise en tampon du flux
+    return response
 
 
 def dashboard_messages(request):
@@ -512,96 +471,212 @@ def dashboard_messages(request):
     return render(request, 'core/dashboard_messages.html', context)
 
 
-@require_http_methods(['POST'])
-def assistant_chat(request):
-    """
-    Endpoint API pour le chat de l'assistant FASOWEB (DeepSeek).
-    Body JSON : { "message": "..." } ou { "messages": [ { "role": "user", "content": "..." } ] }.
-    Si "message" est fourni, on l'ajoute à l'historique ; "messages" permet d'envoyer tout l'historique.
-    """
+def _parse_chat_request(request):
+    """Lit le corps JSON ; retourne (messages, mode flux) ou lève AssistantError."""
+    if len(request.body) > getattr(settings, 'ASSISTANT_MAX_REQUEST_BYTES', 65536):
+        raise AssistantError('Conversation trop longue. Rechargez la page pour en commencer une nouvelle.', status=413)
+    try:
+        body = json.loads(request.body.decode('utf-8'))
+    except (json.JSONDecodeError, ValueError):
+        raise AssistantError('Requête invalide.', status=400)
+    return build_messages(body), bool(body.get('stream'))
+
+
+def _check_rate_limit(request):
+    """Limite de messages par visiteur (session ou IP) ; lève AssistantError 429 si elle est atteinte."""
+    limits = {
+        'minute': getattr(settings, 'ASSISTANT_RATE_LIMIT_PER_MINUTE', 10),
+        'day': getattr(settings, 'ASSISTANT_RATE_LIMIT_PER_DAY', 200),
+    }
+    session = getattr(request, 'session', None)
+    identity = visitor_identity(session.session_key if session is not None else '', client_ip(request))
+    retry_after = hit_rate_limit('assistant', identity, limits)
+    if retry_after:
+        raise AssistantError(
+            'Vous avez envoyé beaucoup de messages. Patientez un peu ou contactez-nous directement.',
+            status=429, retry_after=retry_after,
+        )
+
+
+def _error_response(e):
+    response = JsonResponse({'error': e.message}, status=e.status)
+    if e.retry_after:
+        response['Retry-After'] = str(e.retry_after)
+    return response
+
+
+def _api_key():
     api_key = getattr(settings, 'DEEPSEEK_API_KEY', None)
     if not api_key:
-        return JsonResponse(
-            {'error': 'L’assistant n’est pas configuré pour le moment. Contactez-nous par le formulaire ou WhatsApp.'},
-            status=503
+        raise AssistantError(
+            'L’assistant n’est pas configuré pour le moment. Contactez-nous par le formulaire ou WhatsApp.',
+            status=503,
         )
+    return api_key
+
 
+def _log_question(messages, answer='', source=AssistantQuestion.SOURCE_LLM, meta=None):
+    # Enregistrer la dernière question utilisateur pour le tableau de bord (voir core.assistant_log)
     try:
-        body = json.loads(request.body.decode('utf-8'))
-    except (json.JSONDecodeError, ValueError):
-        return JsonResponse({'error': 'Requête invalide.'}, status=400)
+        log_question(last_user_message(messages), answer, source, meta)
+    except Exception:
+        pass
 
-    # Construire la liste des messages pour DeepSeek
-    messages_for_api = [{'role': 'system', 'content': ASSISTANT_SYSTEM_PROMPT}]
 
-    if 'messages' in body and isinstance(body['messages'], list):
-        for m in body['messages']:
-            if isinstance(m, dict) and m.get('role') in ('user', 'assistant') and m.get('content'):
-                messages_for_api.append({'role': m['role'], 'content': m['content']})
-    elif body.get('message'):
-        messages_for_api.append({'role': 'user', 'content': str(body['message']).strip()})
-    else:
-        return JsonResponse({'error': 'Message manquant.'}, status=400)
+async def _alog_question(messages, answer='', source=AssistantQuestion.SOURCE_LLM, meta=None):
+    try:
+        await alog_question(last_user_message(messages), answer, source, meta)
+    except Exception:
+        pass
 
-    if not any(m.get('role') == 'user' for m in messages_for_api[1:]):
-        return JsonResponse({'error': 'Aucun message utilisateur.'}, status=400)
 
-    # Enregistrer la dernière question utilisateur pour le tableau de bord
+def _local_answer(messages):
+    """
+    Réponse sans appel au modèle : conversation déjà vue (cache des réponses), puis FAQ et réponses validées
+    si la question est assez proche. La question est alors enregistrée ; retourne (réponse, source) ou None.
+    """
+    answer = cached_response(messages)
+    if answer is not None:
+        _log_question(messages, answer, AssistantQuestion.SOURCE_CACHE)
+        return answer, AssistantQuestion.SOURCE_CACHE
+    # Relance dans une conversation : seule la dernière question serait comparée, sans son contexte
+    if len(messages) > 2:  # au-delà de l'invite système et de la question
+        return None
     try:
-        last_user_msg = next((m.get('content', '') for m in reversed(messages_for_api[1:]) if m.get('role') == 'user'), '')
-        if last_user_msg and last_user_msg.strip():
-            AssistantQuestion.objects.create(content=last_user_msg.strip())
+        match = find_local_answer(last_user_message(messages))
     except Exception:
-        pass
+        return None
+    if match is None:
+        return None
+    answer, source, _ = match
+    _log_question(messages, answer, source)
+    return answer, source
 
-    payload = {
-        'model': 'deepseek-chat',
-        'messages': messages_for_api,
-        'max_tokens': 1024,
-        'temperature': 0.7,
-    }
 
+def _answer_from_lines(lines):
+    return ''.join(json.loads(line).get('delta', '') for line in lines)
+
+
+def _finish_stream(messages, meta, sent):
+    answer = _answer_from_lines(sent)
+    _log_question(messages, answer, meta=meta)
+    # Seules les réponses arrivées jusqu'au bout ({"done": true}) sont mises en cache
+    if sent and json.loads(sent[-1]).get('done'):
+        cache_response(messages, answer)
+
+
+def _recording_stream(lines, messages, meta):
+    """Relaie le flux NDJSON puis enregistre la réponse complète."""
+    sent = []
     try:
-        api_url = getattr(settings, 'DEEPSEEK_API_URL', 'https://api.deepseek.com/v1/chat/completions')
-        r = requests.post(
-            api_url,
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json',
-            },
-            json=payload,
-            timeout=60,
-        )
-        r.raise_for_status()
-        data = r.json()
-    except requests.HTTPError as e:
-        # Erreur HTTP (401, 429, 500...) : récupérer le détail si possible
+        for line in lines:
+            sent.append(line)
+            yield line
+    finally:
+        _finish_stream(messages, meta, sent)
+
+
+async def _arecording_stream(lines, messages, meta):
+    sent = []
+    try:
+        async for line in lines:
+            sent.append(line)
+            yield line
+    finally:
+        await sync_to_async(_finish_stream)(messages, meta, sent)
+
+
+def _local_response(local, stream):
+    answer, source = local
+    if stream:
+        return _ndjson_response(iter([ndjson_line(delta=answer), ndjson_line(done=True)]))
+    return JsonResponse({'content': answer, 'source': source})
+
+
+def _with_debug(response, messages):
+    """En DEBUG, indique la taille de la requête envoyée au modèle après compactage de l'historique."""
+    if settings.DEBUG:
+        size, tokens = payload_size(messages)
+        debug = {'payload_bytes': size, 'payload_tokens': tokens, 'messages': len(messages)}
+        response['X-Assistant-Payload'] = f'bytes={size}; tokens={tokens}; messages={len(messages)}'
+        if isinstance(response, JsonResponse):
+            response.content = json.dumps({**json.loads(response.content), 'debug': debug})
+    return response
+
+
+def _ndjson_response(lines):
+    response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx : relayer chaque fragment sans attendre
+    return response
+
+
+@require_http_methods(['POST'])
+def assistant_chat(request):
+    """
+    Endpoint API pour le chat de l'assistant FASOWEB (DeepSeek).
+    Body JSON : { "message": "..." } ou { "messages": [ { "role": "user", "content": "..." } ] }.
+    Si "message" est fourni, on l'ajoute à l'historique ; "messages" permet d'envoyer tout l'historique.
+    Avec "stream": true, la réponse est relayée au fil de l'eau en NDJSON (voir core.assistant).
+    L'historique est compacté selon le budget ASSISTANT_HISTORY_* (taille envoyée au modèle visible en DEBUG).
+    Messages limités par visiteur (ASSISTANT_RATE_LIMIT_PER_MINUTE / _PER_DAY), réponses locales comprises :
+    429 avec Retry-After au-delà.
+    Chaque échange est journalisé à la fin (réponse, durée, jetons) via un tampon en mémoire (core.assistant_log).
+    Les questions proches d'une FAQ ou d'une réponse validée sont traitées sans appel au modèle (core.faq_index),
+    de même que les conversations déjà vues (cache des réponses, core.assistant.ResponseCache).
+    """
+    try:
+        messages_for_api, stream = _parse_chat_request(request)
+        # Devant tout le reste : chaque message consomme le quota, réponses locales comprises (journalisées)
+        _check_rate_limit(request)
+        local = _local_answer(messages_for_api)
+        if local is not None:
+            return _with_debug(_local_response(local, stream), messages_for_api)
+        api_key = _api_key()
+        meta = {}
         try:
-            err_body = e.response.json() if e.response else {}
-            err_msg = err_body.get('error', {}).get('message', str(e)) if isinstance(err_body.get('error'), dict) else str(e)
-        except Exception:
-            err_msg = str(e)
-        if settings.DEBUG:
-            return JsonResponse({
-                'error': f'Erreur API DeepSeek ({e.response.status_code if e.response else "?"}): {err_msg}. Contactez-nous si le problème persiste.'
-            }, status=502)
-        return JsonResponse(
-            {'error': 'Service temporairement indisponible. Vous pouvez nous contacter directement.'},
-            status=502
-        )
-    except requests.RequestException as e:
-        if settings.DEBUG:
-            return JsonResponse({
-                'error': f'Connexion impossible: {str(e)}. Vérifiez votre connexion ou réessayez plus tard.'
-            }, status=502)
-        return JsonResponse(
-            {'error': 'Service temporairement indisponible. Vous pouvez nous contacter directement.'},
-            status=502
-        )
+            if stream:
+                lines = open_stream(messages_for_api, api_key, meta)
+            else:
+                content = complete(messages_for_api, api_key, meta)
+        except AssistantError:
+            _log_question(messages_for_api, meta=meta)
+            raise
+        if stream:
+            return _with_debug(_ndjson_response(_recording_stream(lines, messages_for_api, meta)), messages_for_api)
+        _log_question(messages_for_api, content, meta=meta)
+        cache_response(messages_for_api, content)
+    except AssistantError as e:
+        return _error_response(e)
+    return _with_debug(JsonResponse({'content': content}), messages_for_api)
 
-    choice = (data.get('choices') or [None])[0]
-    if not choice or 'message' not in choice:
-        return JsonResponse({'error': 'Réponse invalide du service.'}, status=502)
 
-    content = (choice.get('message') or {}).get('content') or ''
-    return JsonResponse({'content': content})
+@require_http_methods(['POST'])
+async def assistant_chat_async(request):
+    """
+    Version asynchrone de assistant_chat (servie par siraweb.asgi, réglage SERVER_ASGI) :
+    l'attente de la réponse du modèle n'occupe ni worker ni thread.
+    """
+    try:
+        messages_for_api, stream = _parse_chat_request(request)
+        await sync_to_async(_check_rate_limit)(request)
+        local = await sync_to_async(_local_answer)(messages_for_api)
+        if local is not None:
+            return _with_debug(_local_response(local, stream), messages_for_api)
+        api_key = _api_key()
+        meta = {}
+        try:
+            if stream:
+                lines = await aopen_stream(messages_for_api, api_key, meta)
+            else:
+                content = await acomplete(messages_for_api, api_key, meta)
+        except AssistantError:
+            await _alog_question(messages_for_api, meta=meta)
+            raise
+        if stream:
+            return _with_debug(_ndjson_response(_arecording_stream(lines, messages_for_api, meta)), messages_for_api)
+        await _alog_question(messages_for_api, content, meta=meta)
+        cache_response(messages_for_api, content)
+    except AssistantError as e:
+        return _error_response(e)
+    return _with_debug(JsonResponse({'content': content}), messages_for_api)
@@ -0,0 +1,158 @@
+"""
+Préchauffage du cache de pages (core.pagecache) : les pages du sitemap sont demandées en interne (client de test
+Django, comme un visiteur anonyme) pour que les premiers visiteurs après un déploiement, un vidage du cache ou
+une modification de contenu ne paient pas le rendu complet.
+- commande « python manage.py warm_cache » : toutes les URL de StaticSitemap, ServiceSitemap et BlogSitemap ;
+- après une modification (signal content_changed du registre, core.cache_registry) : seules les
+  WARM_CACHE_TOP_PAGES pages les plus visitées qui dépendent du modèle modifié, en arrière-plan.
+Les requêtes portent un User-Agent de robot : elles ne sont pas comptées dans les statistiques.
+Une page en erreur est signalée (statut et exception) sans interrompre le préchauffage des autres.
+Avec plusieurs workers, le préchauffage ne profite aux autres que si le cache est partagé (Redis, memcached).
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Sum
+from django.http.request import validate_host
+from django.test import Client
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+from . import cache_registry
+from .buffers import BufferedWriter
+from .models import DailyPageViewStat
+from .pagecache import CACHED_PAGES
+from .sitemaps import BlogSitemap, ServiceSitemap, StaticSitemap
+
+WARMER_USER_AGENT = 'FasowebCacheWarmer/1.0 (bot)'
+TOP_PATHS_CACHE_KEY = 'warm_cache:top_paths'
+
+# status 0 : aucune réponse ; error : exception levée pendant le rendu, vide si aucune
+WarmResult = namedtuple('WarmResult', 'path status duration_ms hit error', defaults=('',))
+
+
+def page_name(path):
+    """Nom de la vue (url_name) si la page est gardée par le cache de pages, sinon None."""
+    try:
+        url_name = resolve(path).url_name
+    except Resolver404:
+        return None
+    return url_name if url_name in CACHED_PAGES else None
+
+
+def sitemap_paths():
+    """Chemins des pages du sitemap gardées par le cache de pages, sans doublon, dans l'ordre des sitemaps."""
+    paths = []
+    for sitemap_class in (StaticSitemap, ServiceSitemap, BlogSitemap):
+        sitemap = sitemap_class()
+        paths.extend(sitemap.location(item) for item in sitemap.items())
+    return [path for path in dict.fromkeys(paths) if page_name(path) is not None]
+
+
+def _client():
+    """Client interne adressé au domaine du site (ou au premier hôte autorisé)."""
+    host = urlsplit(getattr(settings, 'SITE_DOMAIN', '')).netloc
+    if not host or not validate_host(host.split(':')[0], settings.ALLOWED_HOSTS):
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+    # Exception dans une vue : réponse 500 (comme en production) au lieu d'une exception qui arrêterait le lot
+    return Client(raise_request_exception=False, HTTP_HOST=host, HTTP_USER_AGENT=WARMER_USER_AGENT)
+
+
+def warm_path(path, client=None):
+    """Demande une page ; retourne (chemin, statut, durée en ms, déjà en cache, erreur)."""
+    if client is None:
+        client = _client()
+    # En HTTPS si SITE_DOMAIN l'est (sinon SECURE_SSL_REDIRECT répondrait par une redirection)
+    secure = getattr(settings, 'SITE_DOMAIN', '').startswith('https://')
+    start = time.perf_counter()
+    try:
+        response = client.get(path, secure=secure)
+    except Exception as exc:
+        # Hors de la vue (middleware, client) : la page est signalée, les autres continuent
+        return WarmResult(path, 0, (time.perf_counter() - start) * 1000, False, repr(exc))
+    duration_ms = (time.perf_counter() - start) * 1000
+    error = repr(response.exc_info[1]) if getattr(response, 'exc_info', None) else ''
+    return WarmResult(path, response.status_code, duration_ms, response.get('X-Page-Cache') == 'hit', error)
+
+
+def warm_paths(paths, concurrency=1):
+    """Préchauffe des pages, concurrency à la fois (1 : dans le thread appelant). Résultats dans l'ordre des chemins."""
+    if concurrency <= 1:
+        client = _client()
+        return [warm_path(path, client) for path in paths]
+
+    local = threading.local()
+
+    def work(path):
+        if not hasattr(local, 'client'):
+            local.client = _client()
+        try:
+            return warm_path(path, local.client)
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='warm-cache') as executor:
+        return list(executor.map(work, paths))
+
+
+def top_paths(limit, days=7):
+    """Chemins les plus visités des derniers jours (cumuls du tableau de bord), gardés une heure."""
+    paths = cache.get(TOP_PATHS_CACHE_KEY)
+    if paths is None:
+        since = timezone.localdate() - timedelta(days=days)
+        paths = list(
+            DailyPageViewStat.objects.filter(date__gte=since)
+            .values('path')
+            .annotate(total=Sum('count'))
+            .order_by('-total')
+            .values_list('path', flat=True)[:50]
+        )
+        cache.set(TOP_PATHS_CACHE_KEY, paths, 3600)
+    return paths[:limit]
+
+
+def affected_paths(model_names, paths):
+    """Parmi paths, les pages en cache qui dépendent de l'un des modèles."""
+    changed = set(model_names)
+    affected = []
+    for path in paths:
+        url_name = page_name(path)
+        if url_name is not None and changed.intersection(cache_registry.models_for(url_name)):
+            affected.append(path)
+    return affected
+
+
+def warm_after_change(model_names):
+    """Vidage du tampon : préchauffe les pages les plus visitées touchées par le lot de modifications."""
+    paths = affected_paths(model_names, top_paths(getattr(settings, 'WARM_CACHE_TOP_PAGES', 5)))
+    if paths:
+        warm_paths(paths)
+
+
+_warm_buffer = None
+_warm_buffer_lock = threading.Lock()
+
+
+def get_warm_buffer():
+    """Modèles modifiés, traités par lots en arrière-plan (plusieurs écritures rapprochées : un seul passage)."""
+    global _warm_buffer
+    if _warm_buffer is None:
+        with _warm_buffer_lock:
+            if _warm_buffer is None:
+                _warm_buffer = BufferedWriter(warm_after_change, max_size=1000, batch_size=1000, interval_ms=1000,
+                                              name='warm-cache-buffer')
+    return _warm_buffer
+
+
+def queue_warm(sender, model_name, **kwargs):
+    """Receveur de cache_registry.content_changed : préchauffage après validation de la transaction."""
+    if not getattr(settings, 'WARM_CACHE_ON_CHANGE', True) or not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+        return
+    transaction.on_commit(lambda: get_warm_buffer().put(model_name))
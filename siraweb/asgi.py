@@ -0,0 +1,11 @@
+"""
+ASGI config for FASOWEB project.
+Lancement : gunicorn siraweb.asgi:application -k uvicorn.workers.UvicornWorker (avec SERVER_ASGI=True).
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'siraweb.settings')
+
+application = get_asgi_application()
@@ -38,6 +38,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.PageViewTrackingMiddleware',  # Tracking des visites
+    'core.httpcache.CacheControlMiddleware',  # Cache-Control par vue (CACHE_CONTROL_POLICIES), avant le cache de pages
+    'core.pagecache.PageCacheMiddleware',  # Pages publiques en cache pour les anonymes (après le tracking)
 ]
 
 ROOT_URLCONF = 'siraweb.urls'
@@ -60,15 +62,46 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'siraweb.wsgi.application'
+ASGI_APPLICATION = 'siraweb.asgi.application'
+
+# Site servi en ASGI (uvicorn) : assistant et flux en direct asynchrones
+SERVER_ASGI = config('SERVER_ASGI', default=False, cast=bool)
+if SERVER_ASGI:
+    # WhiteNoise n'est que synchrone : en ASGI il sérialiserait les requêtes (les statiques sont servis par Nginx)
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
 
 # Database
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Verrou d'écriture pris dès le début de chaque transaction : les lectures-modifications-écritures
+        # (esquisses des visiteurs, cumuls) de plusieurs workers s'enchaînent au lieu d'échouer en cours de route
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Cache Django partagé par tous les workers : versions du registre des dépendances (core.cache_registry), cache de
+# pages, déduplication des visites, limites de débit. 'redis' (REDIS_URL), 'db' (table django_cache, créée par
+# « python manage.py createcachetable ») ou 'locmem' (mémoire du processus : un seul worker, développement).
+# Limiteur de l'assistant (core.ratelimit) : backend à mise à jour atomique requis (avertissement core.W001 sinon)
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_BACKEND = config('CACHE_BACKEND', default='redis' if REDIS_URL else 'db')
+CACHES = {
+    'default': {
+        'redis': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL},
+        'db': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=100000, cast=int)},
+        },
+        'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }[CACHE_BACKEND],
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -129,10 +162,120 @@ if not DEBUG:
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
 
+# Adresse réelle des visiteurs derrière le proxy (core.clientip) : en-tête posé par Nginx (X-Real-IP ou
+# X-Forwarded-For), lu seulement pour les requêtes venant de TRUSTED_PROXIES (vide = toujours REMOTE_ADDR)
+CLIENT_IP_HEADER = config('CLIENT_IP_HEADER', default='X-Real-IP')
+TRUSTED_PROXIES = config('TRUSTED_PROXIES', default='127.0.0.1,::1', cast=Csv())
+
+# Suivi des visites (core.middleware.PageViewTrackingMiddleware)
+# 'sync' : écriture pendant la requête ; 'buffered' : file en mémoire vidée en arrière-plan par lots
+PAGEVIEW_TRACKING_MODE = config('PAGEVIEW_TRACKING_MODE', default='buffered')
+PAGEVIEW_BUFFER_MAX_SIZE = config('PAGEVIEW_BUFFER_MAX_SIZE', default=10000, cast=int)  # au-delà, visites abandonnées (comptées)
+PAGEVIEW_BUFFER_BATCH_SIZE = config('PAGEVIEW_BUFFER_BATCH_SIZE', default=100, cast=int)
+PAGEVIEW_BUFFER_FLUSH_INTERVAL_MS = config('PAGEVIEW_BUFFER_FLUSH_INTERVAL_MS', default=1000, cast=int)
+# Déduplication 24 h : 'cache' (cache Django), 'bloom' (mémoire du worker) ou 'db' (requête en base) ;
+# vide : 'cache' si le cache est partagé entre workers (CACHE_BACKEND redis ou db), sinon 'db'
+PAGEVIEW_DEDUP_BACKEND = config('PAGEVIEW_DEDUP_BACKEND', default='')
+PAGEVIEW_DEDUP_BLOOM_CAPACITY = config('PAGEVIEW_DEDUP_BLOOM_CAPACITY', default=20000, cast=int)  # visites par heure
+
+# Cumuls quotidiens et esquisses des visiteurs du tableau de bord mis à jour à chaque vidage du tampon
+# (mode 'buffered' seulement : jamais pendant une requête). Sinon : python manage.py rollup_pageviews en tâche planifiée
+PAGEVIEW_ROLLUP_ON_WRITE = config('PAGEVIEW_ROLLUP_ON_WRITE', default=PAGEVIEW_TRACKING_MODE == 'buffered', cast=bool)
+
+# Durée (s) pendant laquelle l'instantané du tableau de bord est servi sans recalcul
+STATISTICS_CACHE_TTL = config('STATISTICS_CACHE_TTL', default=60, cast=int)
+
+# Cache de pages pour les visiteurs anonymes (core.pagecache) : durée max (s), invalidé par les signaux des modèles
+# Avec plusieurs workers, configurer un cache partagé (Redis, memcached) pour que l'invalidation les touche tous
+PAGE_CACHE_ENABLED = config('PAGE_CACHE_ENABLED', default=True, cast=bool)
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=600, cast=int)
+# Identifiant du déploiement, dans les clés du cache de pages et les ETag (anciennes pages périmées au déploiement) ;
+# vide : empreinte de STATIC_ROOT/staticfiles.json, réécrit par collectstatic
+CACHE_BUILD_ID = config('CACHE_BUILD_ID', default='')
+# Préchauffage du cache de pages (core.warmup) : « python manage.py warm_cache » (pages rendues en parallèle) ;
+# après chaque modification de contenu, les WARM_CACHE_TOP_PAGES pages les plus visitées concernées, en arrière-plan
+WARM_CACHE_CONCURRENCY = config('WARM_CACHE_CONCURRENCY', default=4, cast=int)
+WARM_CACHE_ON_CHANGE = config('WARM_CACHE_ON_CHANGE', default=True, cast=bool)
+WARM_CACHE_TOP_PAGES = config('WARM_CACHE_TOP_PAGES', default=5, cast=int)
+
+# En-têtes Cache-Control pour un proxy ou CDN devant le site (core.httpcache) : politique par nom de vue.
+# max_age : navigateur ; s_maxage / stale_while_revalidate : proxy, seulement si la réponse est partageable
+# (anonyme, sans cookie ni jeton CSRF) ; sinon « private » avec le seul max_age
+CACHE_CONTROL_PAGE_POLICY = {
+    'max_age': 0,
+    's_maxage': config('CACHE_CONTROL_S_MAXAGE', default=600, cast=int),
+    'stale_while_revalidate': config('CACHE_CONTROL_STALE_WHILE_REVALIDATE', default=60, cast=int),
+    'vary': ['Accept-Encoding'],
+}
+CACHE_CONTROL_POLICIES = {
+    **dict.fromkeys((
+        'home', 'services_list', 'service_detail', 'maintenance_page', 'about', 'team',
+        'blog_list', 'blog_detail', 'blog_category', 'blog_tag',
+        'seo_ouagadougou', 'seo_bobo', 'legal', 'privacy',
+    ), CACHE_CONTROL_PAGE_POLICY),
+    'django.contrib.sitemaps.views.sitemap': {'max_age': 3600, 's_maxage': 3600, 'stale_while_revalidate': 600},
+}
+# Jamais en cache partagé : tableau de bord, formulaires, assistant
+CACHE_CONTROL_PRIVATE = (
+    'statistics', 'statistics_realtime', 'statistics_live', 'dashboard_messages', 'contact', 'assistant_chat',
+)
+# Purge du proxy à chaque modification de contenu (ex. http://127.0.0.1:6081/purge ; vide = désactivée) :
+# requête CACHE_PURGE_METHOD avec les tags (model:<nom>) dans l'en-tête CACHE_TAG_HEADER, posé aussi sur les réponses
+CACHE_PURGE_URL = config('CACHE_PURGE_URL', default='')
+CACHE_PURGE_METHOD = config('CACHE_PURGE_METHOD', default='PURGE')
+CACHE_TAG_HEADER = config('CACHE_TAG_HEADER', default='Cache-Tag')
+
+# Géolocalisation des visites (core.geoip) : 'local' (base hors ligne), 'http' (ip-api.com) ou 'none'
+# GEOIP_DATABASE_PATH : CSV « début,fin,code pays[,pays[,ville]] » (ex. DB-IP Lite) ou fichier .mmdb
+GEOIP_BACKEND = config('GEOIP_BACKEND', default='local')
+GEOIP_DATABASE_PATH = config('GEOIP_DATABASE_PATH', default=str(BASE_DIR / 'geoip' / 'ip_ranges.csv'))
+# Compléter en arrière-plan via ip-api.com les IP absentes de la base locale (requêtes batch, 15 par minute au plus).
+# Désactivé par défaut : sans base locale, toutes les IP publiques partiraient vers ip-api.com
+GEOIP_HTTP_ENRICHMENT = config('GEOIP_HTTP_ENRICHMENT', default=False, cast=bool)
+# Ne pas géolocaliser à l'écriture : laisser faire « python manage.py enrich_pageviews --loop »
+PAGEVIEW_DEFERRED_GEO = config('PAGEVIEW_DEFERRED_GEO', default=False, cast=bool)
+
+# Flux en direct du tableau de bord (SSE, core.live) : battement de cœur (s), durée max d'une connexion (s)
+# avant reconnexion, nombre de visites gardées en mémoire pour la reprise (Last-Event-ID)
+LIVE_STATS_HEARTBEAT = config('LIVE_STATS_HEARTBEAT', default=15, cast=int)
+LIVE_STATS_MAX_DURATION = config('LIVE_STATS_MAX_DURATION', default=300, cast=int)
+LIVE_STATS_BUFFER_SIZE = config('LIVE_STATS_BUFFER_SIZE', default=500, cast=int)
+
 # DeepSeek API (assistant conversationnel sur le site)
 # Définir DEEPSEEK_API_KEY dans .env (obtenir une clé sur https://platform.deepseek.com/)
 DEEPSEEK_API_KEY = config('DEEPSEEK_API_KEY', default='')
-DEEPSEEK_API_URL = 'https://api.deepseek.com/v1/chat/completions'
+DEEPSEEK_API_URL = config('DEEPSEEK_API_URL', default='https://api.deepseek.com/v1/chat/completions')
+# Connexions HTTP vers l'API (core.assistant) : délai (s), connexions gardées ouvertes, connexions simultanées max (ASGI)
+ASSISTANT_HTTP_TIMEOUT = config('ASSISTANT_HTTP_TIMEOUT', default=60, cast=int)
+ASSISTANT_HTTP_POOL_SIZE = config('ASSISTANT_HTTP_POOL_SIZE', default=20, cast=int)
+ASSISTANT_HTTP_MAX_CONNECTIONS = config('ASSISTANT_HTTP_MAX_CONNECTIONS', default=500, cast=int)
+# Réponses locales (FAQ, réponses validées) : similarité minimale (0-1, calibrée sur faqs_backup.json) ;
+# au-delà de 1, toujours le modèle
+ASSISTANT_LOCAL_ANSWER_THRESHOLD = config('ASSISTANT_LOCAL_ANSWER_THRESHOLD', default=0.65, cast=float)
+# Cache des réponses du modèle (conversations déjà vues) : nombre d'entrées par processus (0 = désactivé), durée (s)
+ASSISTANT_RESPONSE_CACHE_SIZE = config('ASSISTANT_RESPONSE_CACHE_SIZE', default=1000, cast=int)
+ASSISTANT_RESPONSE_CACHE_TTL = config('ASSISTANT_RESPONSE_CACHE_TTL', default=86400, cast=int)
+# Budget de l'historique envoyé au modèle : derniers messages gardés tels quels (les plus anciens sont résumés),
+# longueur max d'un message (caractères), jetons estimés et octets max par requête, taille max du corps reçu
+ASSISTANT_HISTORY_TURNS = config('ASSISTANT_HISTORY_TURNS', default=8, cast=int)
+ASSISTANT_MAX_MESSAGE_CHARS = config('ASSISTANT_MAX_MESSAGE_CHARS', default=2000, cast=int)
+ASSISTANT_HISTORY_MAX_TOKENS = config('ASSISTANT_HISTORY_MAX_TOKENS', default=3000, cast=int)
+ASSISTANT_HISTORY_MAX_BYTES = config('ASSISTANT_HISTORY_MAX_BYTES', default=32000, cast=int)
+ASSISTANT_MAX_REQUEST_BYTES = config('ASSISTANT_MAX_REQUEST_BYTES', default=65536, cast=int)
+# Protection contre un modèle lent ou en panne : appels simultanés max par processus, disjoncteur ouvert après
+# N échecs consécutifs (un appel de plus de ASSISTANT_BREAKER_SLOW_CALL s compte comme un échec), essai après RESET s
+ASSISTANT_MAX_IN_FLIGHT = config('ASSISTANT_MAX_IN_FLIGHT', default=50, cast=int)
+ASSISTANT_BREAKER_FAILURES = config('ASSISTANT_BREAKER_FAILURES', default=5, cast=int)
+ASSISTANT_BREAKER_SLOW_CALL = config('ASSISTANT_BREAKER_SLOW_CALL', default=20, cast=float)
+ASSISTANT_BREAKER_RESET = config('ASSISTANT_BREAKER_RESET', default=30, cast=float)
+# Messages à l'assistant par visiteur (session ou IP), par minute et par jour (0 = illimité)
+ASSISTANT_RATE_LIMIT_PER_MINUTE = config('ASSISTANT_RATE_LIMIT_PER_MINUTE', default=10, cast=int)
+ASSISTANT_RATE_LIMIT_PER_DAY = config('ASSISTANT_RATE_LIMIT_PER_DAY', default=200, cast=int)
+# Journal des questions (core.assistant_log) : 'buffered' (tampon vidé en arrière-plan par lots) ou 'sync'
+ASSISTANT_LOG_MODE = config('ASSISTANT_LOG_MODE', default='buffered')
+ASSISTANT_LOG_BUFFER_MAX_SIZE = config('ASSISTANT_LOG_BUFFER_MAX_SIZE', default=10000, cast=int)
+ASSISTANT_LOG_BUFFER_BATCH_SIZE = config('ASSISTANT_LOG_BUFFER_BATCH_SIZE', default=50, cast=int)
+ASSISTANT_LOG_FLUSH_INTERVAL_MS = config('ASSISTANT_LOG_FLUSH_INTERVAL_MS', default=2000, cast=int)
 
 # Site information for SEO
 SITE_NAME = 'FASOWEB'
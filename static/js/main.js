@@ -927,6 +927,46 @@
       div.appendChild(inner);
       messagesEl.appendChild(div);
       messagesEl.scrollTop = messagesEl.scrollHeight;
+      return inner;
+    }
+
+    // Réponse en flux (NDJSON) : chaque fragment est affiché dès sa réception
+    async function renderStream(res) {
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let text = '';
+      let contentEl = null;
+      let failure = null;
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let nl;
+        while ((nl = buffer.indexOf('\n')) >= 0) {
+          const line = buffer.slice(0, nl).trim();
+          buffer = buffer.slice(nl + 1);
+          if (!line) continue;
+          let event;
+          try { event = JSON.parse(line); } catch (err) { continue; }
+          if (event.delta) {
+            text += event.delta;
+            if (!contentEl) {
+              if (loader) loader.classList.remove('active');
+              contentEl = appendMessage('assistant', '');
+            }
+            contentEl.textContent = text;
+            messagesEl.scrollTop = messagesEl.scrollHeight;
+          } else if (event.error) {
+            failure = event.error;
+          }
+        }
+      }
+      if (!contentEl) {
+        appendMessage('assistant', failure || 'Pas de réponse. N\'hésitez pas à nous contacter pour un devis personnalisé.');
+      } else if (failure) {
+        contentEl.textContent = text + '\n\n' + failure;
+      }
     }
 
     function setLoading(loading) {
@@ -1000,10 +1040,14 @@
           headers: {
             'Content-Type': 'application/json',
             'X-CSRFToken': getCsrfToken(),
-            'Accept': 'application/json'
+            'Accept': 'application/x-ndjson, application/json'
           },
-          body: JSON.stringify({ messages })
+          body: JSON.stringify({ messages, stream: !!(window.TextDecoder && window.ReadableStream) })
         });
+        if (res.ok && (res.headers.get('Content-Type') || '').indexOf('application/x-ndjson') === 0) {
+          await renderStream(res);
+          return;
+        }
         const data = await res.json().catch(() => ({}));
 
         if (!res.ok) {